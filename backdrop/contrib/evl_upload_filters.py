@@ -1,6 +1,8 @@
 from datetime import datetime
 import itertools
+from backdrop.core.errors import ParseError
 from backdrop.core.timeutils import parse_time_as_utc, as_utc
+from backdrop.core.upload.utils import RowWindow
 
 
 def ceg_volumes(rows):
@@ -10,6 +12,7 @@ def ceg_volumes(rows):
 
     http://goo.gl/52VcMe
     """
+    DATE_INDEX = 3
     RELICENSING_WEB_INDEX = 5
     RELICENSING_IVR_INDEX = 6
     RELICENSING_AGENT_INDEX = 9
@@ -26,26 +29,30 @@ def ceg_volumes(rows):
     ]
 
     def ceg_rows(rows):
-        rows = list(rows)
+        window = RowWindow(rows, keep=[
+            DATE_INDEX, RELICENSING_WEB_INDEX, RELICENSING_IVR_INDEX,
+            RELICENSING_AGENT_INDEX, SORN_WEB_INDEX, SORN_IVR_INDEX,
+            SORN_AGENT_INDEX, AGENT_AUTOMATED_DUPES_INDEX,
+            CALLS_ANSWERED_BY_ADVISOR_INDEX])
         for column in itertools.count(3):
-            date = ceg_date(rows, column)
+            date = ceg_date(window, column)
             if not isinstance(date, datetime):
                 return
             yield [
                 date.isoformat(), date.date().isoformat(), "month",
-                rows[RELICENSING_WEB_INDEX][column],
-                rows[RELICENSING_IVR_INDEX][column],
-                rows[RELICENSING_AGENT_INDEX][column],
-                rows[SORN_WEB_INDEX][column],
-                rows[SORN_IVR_INDEX][column],
-                rows[SORN_AGENT_INDEX][column],
-                rows[AGENT_AUTOMATED_DUPES_INDEX][column],
-                rows[CALLS_ANSWERED_BY_ADVISOR_INDEX][column],
+                window.cell(RELICENSING_WEB_INDEX, column),
+                window.cell(RELICENSING_IVR_INDEX, column),
+                window.cell(RELICENSING_AGENT_INDEX, column),
+                window.cell(SORN_WEB_INDEX, column),
+                window.cell(SORN_IVR_INDEX, column),
+                window.cell(SORN_AGENT_INDEX, column),
+                window.cell(AGENT_AUTOMATED_DUPES_INDEX, column),
+                window.cell(CALLS_ANSWERED_BY_ADVISOR_INDEX, column),
             ]
 
-    def ceg_date(rows, column):
+    def ceg_date(window, column):
         try:
-            return parse_time_as_utc(rows[3][column])
+            return parse_time_as_utc(window.cell(DATE_INDEX, column))
         except IndexError:
             return None
 
@@ -56,21 +63,24 @@ def ceg_volumes(rows):
 
 
 def service_volumetrics(rows):
-    rows = list(rows)
+    window = RowWindow(rows)
     yield ["_timestamp", "_id", "timeSpan", "successful_tax_disc",
            "successful_sorn"]
 
-    timestamp = rows[2][1]
-    taxDiskApplications = rows[24][2]
-    sornApplications = rows[25][2]
+    timestamp = window.cell(2, 1)
+    taxDiskApplications = window.cell(24, 2)
+    sornApplications = window.cell(25, 2)
 
     yield [timestamp, parse_time_as_utc(timestamp).date().isoformat(), "day",
            taxDiskApplications, sornApplications]
 
 
 def service_failures(sheets):
-    rows = list(list(sheets)[1])
-    timestamp = rows[1][1]
+    try:
+        window = RowWindow(next(itertools.islice(sheets, 1, None)))
+    except StopIteration:
+        raise ParseError("workbook has no service failures sheet")
+    timestamp = window.cell(1, 1)
 
     yield ["_timestamp", "_id", "type", "reason", "count", "description"]
 
@@ -79,7 +89,7 @@ def service_failures(sheets):
         id = "%s.%s.%s" % (date.isoformat(), service_type, reason)
         return [timestamp, id, service_type, reason, failures, description]
 
-    for row in rows[6:]:
+    for row in window.rows_from(6):
         description = row[0]
         if len(description) == 0:
             return
@@ -95,27 +105,27 @@ def service_failures(sheets):
 
 
 def channel_volumetrics(rows):
-    rows = list(rows)
+    window = RowWindow(rows, keep=range(1, 6))
     yield ["_timestamp", "_id", "successful_agent", "successful_ivr",
            "successful_web"]
 
     for column in range(1, 8):
-        all = rows[5][column]
+        all = window.cell(5, column)
 
         if all == 0:
             return
 
-        date = rows[1][column]
-        agent = rows[2][column]
-        ivr = rows[3][column]
-        web = rows[4][column]
+        date = window.cell(1, column)
+        agent = window.cell(2, column)
+        ivr = window.cell(3, column)
+        web = window.cell(4, column)
 
         yield [date, parse_time_as_utc(date).date().isoformat(), agent, ivr,
                web]
 
 
 def customer_satisfaction(rows):
-    rows = list(rows)
+    window = RowWindow(rows)
     yield ["_timestamp", "_id", "satisfaction_tax_disc", "satisfaction_sorn"]
 
     def date_or_none(string):
@@ -125,7 +135,7 @@ def customer_satisfaction(rows):
             return None
 
     for row_number in itertools.count(4):
-        row = rows[row_number]
+        row = window.row(row_number)
         date_string, tax_disc_satisfaction, sorn_satisfaction = row
         date = date_or_none(date_string)
 
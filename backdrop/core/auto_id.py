@@ -0,0 +1,98 @@
+"""
+Generate record ids from the values of a bucket's auto id keys
+
+BUCKET_AUTO_ID_KEYS maps a bucket name to either a list of keys, which
+uses the original base64 scheme, or to a dict naming the keys and the
+scheme, eg. {"keys": ["_timestamp", "key"], "scheme": "sha1"}.
+
+The base64 scheme encodes the '.' joined values, so its ids grow with the
+values. The sha1 scheme gives a fixed width hex digest of the values.
+"""
+import datetime
+import hashlib
+from base64 import b64encode
+
+from .errors import ParseError, ValidationError
+from .timeutils import parse_time_as_utc
+
+SCHEMES = ("base64", "sha1")
+DEFAULT_SCHEME = "base64"
+
+
+def auto_id_config(config_value):
+    """Return the keys and scheme of a BUCKET_AUTO_ID_KEYS entry"""
+    if config_value is None:
+        return None, DEFAULT_SCHEME
+    if isinstance(config_value, dict):
+        keys = config_value["keys"]
+        scheme = config_value.get("scheme", DEFAULT_SCHEME)
+    else:
+        keys, scheme = config_value, DEFAULT_SCHEME
+    if scheme not in SCHEMES:
+        raise ValueError("Unknown auto id scheme: %s" % scheme)
+    return keys, scheme
+
+
+def can_regenerate(keys, scheme):
+    """Return whether stored records give the ids they were stored with
+
+    base64 ids encode a _timestamp string as it was submitted, but it is
+    stored parsed, so its ids cannot be generated again from the store.
+    """
+    return scheme != "base64" or "_timestamp" not in keys
+
+
+def generate_ids(data, keys, scheme=DEFAULT_SCHEME):
+    """Return the auto id of each of a list of records"""
+    if scheme not in SCHEMES:
+        raise ValueError("Unknown auto id scheme: %s" % scheme)
+    keys = tuple(keys)
+    generate_id = _sha1_id if scheme == "sha1" else _base64_id
+
+    ids = []
+    for datum in data:
+        try:
+            values = [datum[key] for key in keys]
+        except KeyError:
+            raise ValidationError(
+                "One or more of the following required values is missing: "
+                "%s" % ", ".join(keys))
+        except TypeError:
+            raise ValidationError('record must be an object')
+        ids.append(generate_id(keys, values))
+    return ids
+
+
+def _base64_id(keys, values):
+    # strings are encoded as they are to keep existing ids unchanged
+    return b64encode(".".join(
+        value if isinstance(value, str) else
+        value.encode("utf-8") if isinstance(value, unicode) else
+        _canonical(key, value).encode("utf-8")
+        for key, value in zip(keys, values)))
+
+
+def _sha1_id(keys, values):
+    # length prefixes stop values that contain separators from colliding
+    canonical = u"".join(
+        u"%d:%s" % (len(value), value)
+        for value in (_canonical(key, value)
+                      for key, value in zip(keys, values)))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def _canonical(key, value):
+    """Return a unicode form of a value that is the same for equal values
+
+    Timestamps are normalised to UTC so that the same time given with
+    different offsets, or already parsed, gives the same id.
+    """
+    if key == "_timestamp" or isinstance(value, datetime.datetime):
+        try:
+            return unicode(parse_time_as_utc(value).isoformat())
+        except (ValueError, TypeError, AttributeError):
+            raise ParseError(
+                '%s is not a valid timestamp, it must be ISO8601' % key)
+    if isinstance(value, str):
+        return value.decode("utf-8")
+    return unicode(value)
@@ -1,28 +1,109 @@
-from base64 import b64encode
+from itertools import islice
+
 from flask import logging
 from backdrop.core import records
-from backdrop.core.errors import ValidationError
+from backdrop.core.auto_id import generate_ids, DEFAULT_SCHEME
+from backdrop.core.errors import ParseError, ValidationError
+from backdrop.core.staging import StagingArea
+from backdrop.core.streaming import chunks
 
 log = logging.getLogger(__name__)
 
 
 class Bucket(object):
-    def __init__(self, db, bucket_name, generate_id_from=None):
+    def __init__(self, db, bucket_name, generate_id_from=None,
+                 auto_id_scheme=DEFAULT_SCHEME):
         self.bucket_name = bucket_name
         self.repository = db.get_repository(bucket_name)
         self.auto_id_keys = generate_id_from
+        self.auto_id_scheme = auto_id_scheme
+
+    def parse_and_store(self, data, offset=0):
+        return self.store(self.parse(data, offset))
+
+    def parse_and_store_in_chunks(self, data, chunk_size,
+                                  all_or_nothing=True, progress=None,
+                                  already_stored=0):
+        """Parse and store an iterable of records a chunk at a time
+
+        With all_or_nothing, every record is validated and staged on disk
+        before any of them are stored, so an invalid record means nothing
+        is stored. progress is called with the number of records parsed
+        and stored so far after each chunk. The first already_stored
+        records are not stored again, so an interrupted upload can be
+        resumed from the progress it last reported.
+
+        Returns the numbers of records inserted, updated and unchanged if
+        the bucket's repository skips unchanged records, otherwise None.
+        """
+        progress = progress or (lambda parsed, stored: None)
+        counts = None
+        if not all_or_nothing:
+            for offset, chunk in _enumerate_chunks(data, chunk_size):
+                skipped = max(0, min(already_stored - offset, len(chunk)))
+                if skipped < len(chunk):
+                    counts = add_write_counts(
+                        counts, self.parse_and_store(chunk[skipped:],
+                                                     offset + skipped))
+                progress(offset + len(chunk), offset + len(chunk))
+            return counts
+
+        with StagingArea() as staged:
+            for offset, chunk in _enumerate_chunks(data, chunk_size):
+                staged.add(record.to_mongo()
+                           for record in self.parse(chunk, offset))
+                progress(staged.count, 0)
+            stored = min(already_stored, staged.count)
+            for documents in chunks(islice(staged, stored, None),
+                                    chunk_size):
+                counts = add_write_counts(
+                    counts, self.repository.save_all(documents))
+                stored += len(documents)
+                progress(staged.count, stored)
+        return counts
+
+    def validate_in_chunks(self, data, chunk_size):
+        """Parse an iterable of records a chunk at a time without storing
+
+        Returns the number of valid records and a list of
+        {"index": ..., "message": ...} for each invalid record.
+        """
+        valid, rejected = 0, []
+        for offset, chunk in _enumerate_chunks(data, chunk_size):
+            records_, invalid = self.parse_valid(chunk, offset)
+            valid += len(records_)
+            rejected += invalid
+        return valid, rejected
 
-    def parse_and_store(self, data):
+    def parse(self, data, offset=0):
         log.info("received %s documents" % len(data))
 
         if self.auto_id_keys:
-            data = [self._add_id(d) for d in data]
+            ids = generate_ids(data, self.auto_id_keys, self.auto_id_scheme)
+            data = [dict(datum, _id=_id) for datum, _id in zip(data, ids)]
 
-        self.store(records.parse_all(data))
+        return records.parse_all(data, offset)
+
+    def parse_valid(self, data, offset=0):
+        """Parse the valid records of data and report the invalid ones
+
+        Returns the records and a list of {"index": ..., "message": ...}
+        for each rejected record.
+        """
+        log.info("received %s documents" % len(data))
+
+        indexed = enumerate(data, offset)
+        rejected = []
+        if self.auto_id_keys:
+            indexed, rejected = self._add_ids(indexed)
+
+        records_, invalid = records.parse_valid(indexed)
+        return records_, sorted(rejected + invalid, key=lambda r: r['index'])
 
     def store(self, records):
         if isinstance(records, list):
-            [self.repository.save(record.to_mongo()) for record in records]
+            return self.repository.save_all(
+                [record.to_mongo() for record in records])
         else:
             self.repository.save(records.to_mongo())
 
@@ -31,15 +112,32 @@ class Bucket(object):
 
         return result
 
-    def _add_id(self, datum):
-        self._validate_presence_of_auto_id_keys(datum)
-        return dict(datum.items() + [("_id", self._generate_id(datum))])
+    def _add_ids(self, indexed):
+        with_ids, rejected = [], []
+        for index, datum in indexed:
+            try:
+                [_id] = generate_ids([datum], self.auto_id_keys,
+                                     self.auto_id_scheme)
+                with_ids.append((index, dict(datum, _id=_id)))
+            except (ParseError, ValidationError) as e:
+                rejected.append({'index': index, 'message': str(e)})
+        return with_ids, rejected
+
+
+def _enumerate_chunks(data, chunk_size):
+    """Yield chunks of data with the index of their first item"""
+    offset = 0
+    for chunk in chunks(data, chunk_size):
+        yield offset, chunk
+        offset += len(chunk)
 
-    def _validate_presence_of_auto_id_keys(self, datum):
-        if not set(self.auto_id_keys).issubset(set(datum.keys())):
-            raise ValidationError(
-                "One or more of the following required values is missing: "
-                "%s" % ", ".join(self.auto_id_keys))
 
-    def _generate_id(self, datum):
-        return b64encode(".".join([datum[key] for key in self.auto_id_keys]))
+def add_write_counts(total, counts):
+    """Add up the write counts of the chunks of an upload"""
+    if not isinstance(counts, dict):
+        # the repository does not report them
+        return total
+    total = total or dict.fromkeys(counts, 0)
+    for key, count in counts.items():
+        total[key] += count
+    return total
@@ -1,21 +1,78 @@
+import hashlib
 import logging
-from bson import Code
+from bson import BSON, Code, SON
 import pymongo
 from pymongo.errors import AutoReconnect
 from backdrop import statsd
 from backdrop.core import timeutils
 
+DEFAULT_BATCH_SIZE = 1000
+# how Repository.group and multi_group group documents: "group" uses the
+# group command with a JavaScript reducer, "aggregate" a $group pipeline
+GROUP_ENGINES = ("group", "aggregate")
+# the partial results of the aggregate engine needed for each collect
+# method: the sum of numbers, the count of values (including nulls, as
+# the group engine collects them), the counts of numbers, booleans and
+# true values (which the group engine sums as 1) and the set of values
+SUM_PARTIALS = ["sum", "count", "numbers", "booleans", "trues"]
+COLLECT_PARTIALS = {
+    "sum": SUM_PARTIALS,
+    "count": ["count"],
+    "mean": SUM_PARTIALS,
+    "set": ["set"],
+    "default": ["set"],
+}
+# fields that are not part of the content hash of a document
+UNHASHED_FIELDS = frozenset(["_id", "_updated_at", "_content_hash"])
+# fields kept for the driver's own use that find leaves out of results
+HIDDEN_FIELDS = {"_content_hash": False}
+
+WRITE_CONCERNS = {
+    "unacknowledged": {"w": 0},
+    "acknowledged": {"w": 1},
+    "journaled": {"w": 1, "j": True},
+}
+
 
 class Database(object):
-    def __init__(self, host, port, name):
+    def __init__(self, host, port, name, batch_size=DEFAULT_BATCH_SIZE,
+                 write_profiles=None, group_engines=None):
+        """
+        write_profiles maps bucket names to how their writes are made: a
+        dict with any of "write_concern" (one of WRITE_CONCERNS),
+        "batch_size", "ordered" and "skip_unchanged".
+
+        group_engines maps bucket names to one of GROUP_ENGINES, the
+        default being "group".
+        """
         self._mongo = pymongo.MongoClient(host, port)
         self.name = name
+        self.batch_size = batch_size
+        self.write_profiles = write_profiles or {}
+        for bucket_name, profile in self.write_profiles.items():
+            write_concern = profile.get("write_concern")
+            if write_concern is not None \
+                    and write_concern not in WRITE_CONCERNS:
+                raise ValueError("Unknown write concern for %s: %s"
+                                 % (bucket_name, write_concern))
+        self.group_engines = group_engines or {}
+        for bucket_name, engine in self.group_engines.items():
+            if engine not in GROUP_ENGINES:
+                raise ValueError("Unknown group engine for %s: %s"
+                                 % (bucket_name, engine))
 
     def alive(self):
         return self._mongo.alive()
 
     def get_repository(self, bucket_name):
-        return Repository(MongoDriver(self._mongo[self.name][bucket_name]))
+        profile = self.write_profiles.get(bucket_name, {})
+        return Repository(MongoDriver(
+            self._mongo[self.name][bucket_name],
+            batch_size=profile.get("batch_size", self.batch_size),
+            write_concern=profile.get("write_concern"),
+            ordered=profile.get("ordered", False),
+            skip_unchanged=profile.get("skip_unchanged", False)),
+            group_engine=self.group_engines.get(bucket_name, "group"))
 
     @property
     def connection(self):
@@ -23,8 +80,15 @@ class Database(object):
 
 
 class MongoDriver(object):
-    def __init__(self, collection):
+    def __init__(self, collection, batch_size=DEFAULT_BATCH_SIZE,
+                 write_concern=None, ordered=False, skip_unchanged=False):
         self._collection = collection
+        self.batch_size = batch_size
+        # None leaves the write concern of the connection in place
+        self.write_concern = WRITE_CONCERNS[write_concern] \
+            if write_concern else None
+        self.ordered = ordered
+        self.skip_unchanged = skip_unchanged
         self.sort_options = {
             "ascending": pymongo.ASCENDING,
             "descending": pymongo.DESCENDING
@@ -37,7 +101,7 @@ class MongoDriver(object):
         cursor.sort(key, self.sort_options[direction])
 
     def find(self, query, sort, limit):
-        cursor = self._collection.find(query)
+        cursor = self._collection.find(query, fields=HIDDEN_FIELDS)
         self._apply_sorting(cursor, sort[0], sort[1])
         if limit:
             cursor.limit(limit)
@@ -57,6 +121,42 @@ class MongoDriver(object):
             reduce=self._build_reducer_function(collect_fields)
         )
 
+    def aggregate_group(self, keys, query, collect, sort=None, limit=None):
+        """Group documents with a $group pipeline
+
+        Returns a document for each distinct combination of keys with its
+        _count and the partial results merge_aggregated needs to apply the
+        collect methods. Large groupings spill to disk on the server.
+
+        When grouping by more than one key with a sort or limit, the
+        documents of each top level group are rolled up into its _rows so
+        that top level groups can be sorted and limited in the pipeline.
+        Every top level group then has to fit in a single document, so
+        otherwise they are left for merge_aggregated to nest. sort must be
+        one that pipeline_sort_expression can express.
+        """
+        stage = _group_stage(keys, collect)
+        pipeline = [
+            {"$match": self._ignore_docs_without_grouping_keys(keys, query)},
+            {"$group": stage},
+        ]
+        if len(keys) > 1 and (sort or limit):
+            stage = _rollup_stage(stage)
+            pipeline.append({"$group": stage})
+        if sort:
+            projection = dict((name, 1) for name in stage if name != "_id")
+            projection["_sort"] = pipeline_sort_expression(
+                keys, collect, sort[0])
+            pipeline.append({"$project": projection})
+            direction = 1 if sort[1] == "ascending" else -1
+            # _id breaks ties so that pages of results are stable
+            pipeline.append({"$sort": SON([("_sort", direction),
+                                           ("_id", 1)])})
+        if limit:
+            pipeline.append({"$limit": limit})
+        return self._collection.aggregate(pipeline, cursor={},
+                                          allowDiskUse=True)
+
     def _build_collector_code(self, collect_fields):
         template = "if (current['{c}'] !== undefined) " \
                    "{{ previous['{c}'].push(current['{c}']); }}"
@@ -84,7 +184,7 @@ class MongoDriver(object):
 
     def save(self, obj, tries=3):
         try:
-            self._collection.save(obj)
+            self._collection.save(obj, **(self.write_concern or {}))
         except AutoReconnect:
             logging.warning("AutoReconnect on save")
             statsd.incr("db.AutoReconnect", bucket=self._collection.name)
@@ -93,10 +193,75 @@ class MongoDriver(object):
             else:
                 raise
 
+    def save_all(self, objs):
+        """Write documents in batches
+
+        With skip_unchanged, documents whose _id is already stored with
+        the same _content_hash are not written, and the numbers of
+        documents inserted, updated and left unchanged are returned.
+        """
+        counts = dict.fromkeys(['inserted', 'updated', 'unchanged'], 0) \
+            if self.skip_unchanged else None
+        for batch in _batches(_last_write_wins(objs), self.batch_size):
+            if self.skip_unchanged:
+                batch = self._changed(batch, counts)
+            if batch:
+                self._save_batch(batch)
+        return counts
+
+    def _changed(self, batch, counts):
+        """Return the documents of a batch that are new or have changed"""
+        ids = [obj['_id'] for obj in batch if '_id' in obj]
+        stored = {}
+        if ids:
+            stored = dict(
+                (doc['_id'], doc.get('_content_hash'))
+                for doc in self._collection.find({'_id': {'$in': ids}},
+                                                 {'_content_hash': True}))
+        changed = []
+        for obj in batch:
+            obj['_content_hash'] = content_hash(obj)
+            if '_id' not in obj or obj['_id'] not in stored:
+                counts['inserted'] += 1
+            elif stored[obj['_id']] == obj['_content_hash']:
+                counts['unchanged'] += 1
+                continue
+            else:
+                counts['updated'] += 1
+            changed.append(obj)
+        return changed
+
+    def _save_batch(self, batch, tries=3):
+        """Write a batch of documents in a single bulk operation
+
+        Documents with an _id are upserted, the rest are inserted. Inserted
+        documents get their _id assigned client side, so a retry after an
+        AutoReconnect upserts them rather than inserting them twice.
+        """
+        if self.ordered:
+            bulk = self._collection.initialize_ordered_bulk_op()
+        else:
+            bulk = self._collection.initialize_unordered_bulk_op()
+        for obj in batch:
+            if '_id' in obj:
+                bulk.find({'_id': obj['_id']}).upsert().replace_one(obj)
+            else:
+                bulk.insert(obj)
+        try:
+            bulk.execute(self.write_concern)
+        except AutoReconnect:
+            logging.warning("AutoReconnect on bulk save")
+            statsd.incr("db.AutoReconnect", bucket=self._collection.name)
+            if tries > 1:
+                self._save_batch(batch, tries - 1)
+            else:
+                raise
+
 
 class Repository(object):
-    def __init__(self, mongo):
+    def __init__(self, mongo, group_engine="group"):
         self._mongo = mongo
+        self.group_engine = group_engine
 
     def _validate_sort(self, sort):
         if len(sort) != 2:
@@ -127,6 +292,12 @@ class Repository(object):
         obj['_updated_at'] = timeutils.now()
         self._mongo.save(obj)
 
+    def save_all(self, objs):
+        updated_at = timeutils.now()
+        for obj in objs:
+            obj['_updated_at'] = updated_at
+        return self._mongo.save_all(objs)
+
     def multi_group(self, key1, key2, query,
                     sort=None, limit=None, collect=None):
         if key1 == key2:
@@ -147,10 +318,21 @@ class Repository(object):
         return query
 
     def _group(self, keys, query, sort=None, limit=None, collect=None):
-        collect_fields = unique_collect_fields(collect)
-        results = self._mongo.group(keys, query, list(collect_fields))
+        if self.group_engine == "aggregate":
+            if not sort or pipeline_sort_expression(keys, collect, sort[0]):
+                # top level groups are sorted and limited by the database
+                return merge_aggregated(
+                    keys, collect,
+                    self._mongo.aggregate_group(keys, query, collect,
+                                                sort, limit))
+            results = merge_aggregated(
+                keys, collect,
+                self._mongo.aggregate_group(keys, query, collect))
+        else:
+            collect_fields = unique_collect_fields(collect)
+            results = self._mongo.group(keys, query, list(collect_fields))
 
-        results = nested_merge(keys, collect, results)
+            results = nested_merge(keys, collect, results)
 
         if sort:
             sorters = {
@@ -168,6 +350,27 @@ class Repository(object):
         return results
 
 
+def _batches(items, size):
+    """Split a list into consecutive lists of at most size items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _last_write_wins(objs):
+    """Drop all but the last document for each _id, keeping the order"""
+    last_index = dict((obj['_id'], index)
+                      for index, obj in enumerate(objs) if '_id' in obj)
+    return [obj for index, obj in enumerate(objs)
+            if '_id' not in obj or last_index[obj['_id']] == index]
+
+
+def content_hash(obj):
+    """Return a hash of the fields of a document that hold its content"""
+    content = SON(sorted((key, value) for key, value in obj.items()
+                         if key not in UNHASHED_FIELDS))
+    return hashlib.sha1(BSON.encode(content)).hexdigest()
+
+
 class GroupingError(ValueError):
     pass
 
@@ -236,43 +439,208 @@ def unique_collect_fields(collect):
 
 def nested_merge(keys, collect, results):
     groups = []
+    index = {}
     for result in results:
         collected, result = extract_collected_values(collect, result)
 
-        groups, group = _merge(groups, keys, result)
+        group = _merge(groups, index, keys, result)
 
         insert_collected_values(collected, group)
 
+    _sort_and_count_subgroups(groups, keys)
     apply_collection_methods(collect, groups)
     return groups
 
 
-def _merge(groups, keys, result):
-    keys = list(keys)
-    key = keys.pop(0)
-    is_leaf = (len(keys) == 0)
+def merge_aggregated(keys, collect, results):
+    """Build the groups nested_merge builds from the results of
+    aggregate_group
+
+    The partial results of sub-groups are combined into their top level
+    group, which is where nested_merge applies the collect methods.
+    """
+    fields = _collect_field_names(collect)
+    groups = []
+    index = {}
+    partials_of = {}
+    for result in _rolled_down(results):
+        row = dict((key, result['_id'].get('k%d' % index))
+                   for index, key in enumerate(keys))
+        row['_count'] = result['_count']
+        group = _merge(groups, index, keys, row)
+
+        partials = partials_of.setdefault(id(group), {})
+        for field, name in fields.items():
+            for partial in SUM_PARTIALS + ["set"]:
+                value = result.get('%s_%s' % (name, partial))
+                if value is not None:
+                    _combine_partial(partials, (field, partial), value)
+
+    for group in groups:
+        partials = partials_of.get(id(group), {})
+        for collect_field, collect_method in collect:
+            value = _collected_value(partials, collect_field, collect_method)
+            if collect_method == 'default':
+                group[collect_field] = value
+                group['{0}:set'.format(collect_field)] = value
+            else:
+                group['{0}:{1}'.format(collect_field, collect_method)] = value
+    _sort_and_count_subgroups(groups, keys)
+    return groups
+
+
+def _group_stage(keys, collect):
+    stage = {
+        "_id": dict(("k%d" % index, "$" + key)
+                    for index, key in enumerate(keys)),
+        "_count": {"$sum": 1},
+    }
+    fields = _collect_field_names(collect)
+    for collect_field, collect_method in collect:
+        if collect_method not in COLLECT_PARTIALS:
+            raise ValueError("Unknown collection method")
+        for partial in COLLECT_PARTIALS[collect_method]:
+            stage["%s_%s" % (fields[collect_field], partial)] = \
+                _accumulator(partial, "$" + collect_field)
+    return stage
+
+
+def _rollup_stage(stage):
+    """Group the results of a $group stage by their first key"""
+    rollup = {
+        "_id": {"k0": "$_id.k0"},
+        "_count": {"$sum": "$_count"},
+        "_group_count": {"$sum": 1},
+        "_rows": {"$push": "$$ROOT"},
+    }
+    for name in stage:
+        # sets are not rolled up as they are not sorted on
+        if name.rsplit("_", 1)[-1] in SUM_PARTIALS:
+            rollup.setdefault(name, {"$sum": "$" + name})
+    return rollup
+
+
+def _rolled_down(results):
+    for result in results:
+        if "_rows" in result:
+            for row in result["_rows"]:
+                yield row
+        else:
+            yield result
+
+
+def pipeline_sort_expression(keys, collect, sort_key):
+    """Return the expression that sorts the top level groups of
+    aggregate_group on sort_key, or None if it cannot be sorted there
+    """
+    if sort_key == keys[0]:
+        return "$_id.k0"
+    if sort_key == "_count" or (sort_key == "_group_count" and len(keys) > 1):
+        return "$" + sort_key
+    if ":" not in sort_key:
+        return None
+    collect_field, collect_method = sort_key.rsplit(":", 1)
+    if (collect_field, collect_method) not in collect:
+        return None
+    name = _collect_field_names(collect)[collect_field]
+    if collect_method == "count":
+        return "$%s_count" % name
+    # true values are summed as 1, as the group engine sums them
+    total = {"$add": ["$%s_sum" % name, "$%s_trues" % name]}
+    if collect_method == "sum":
+        return total
+    if collect_method == "mean":
+        return {"$cond": [{"$eq": ["$%s_count" % name, 0]}, None,
+                          {"$divide": [total, "$%s_count" % name]}]}
+    return None
+
+
+def _accumulator(partial, field):
+    if partial == "sum":
+        return {"$sum": field}
+    if partial == "count":
+        # missing fields sort before null, which is counted
+        return {"$sum": {"$cond": [{"$gte": [field, None]}, 1, 0]}}
+    if partial == "numbers":
+        # numbers sort after null and before every string
+        return {"$sum": {"$cond": [{"$and": [{"$gt": [field, None]},
+                                             {"$lt": [field, ""]}]}, 1, 0]}}
+    if partial == "booleans":
+        return {"$sum": {"$cond": [{"$or": [{"$eq": [field, True]},
+                                            {"$eq": [field, False]}]}, 1, 0]}}
+    if partial == "trues":
+        return {"$sum": {"$cond": [{"$eq": [field, True]}, 1, 0]}}
+    return {"$addToSet": field}
+
+
+def _collect_field_names(collect):
+    """Name each collect field safely for use in a $group stage"""
+    return dict((field, "f%d" % index) for index, field
+                in enumerate(sorted(unique_collect_fields(collect))))
+
+
+def _combine_partial(partials, key, value):
+    if key[1] == "set":
+        partials.setdefault(key, set()).update(value)
+    else:
+        partials[key] = partials.get(key, 0) + value
+
+
+def _collected_value(partials, collect_field, collect_method):
+    if collect_method in ("set", "default"):
+        return sorted(partials.get((collect_field, "set"), []))
+    count = partials.get((collect_field, "count"), 0)
+    if collect_method == "count":
+        return count
+    # $sum skips what is not a number, where the group engine cannot sum
+    # it, and booleans, which the group engine sums as 0 or 1
+    summable = count == partials.get((collect_field, "numbers"), 0) + \
+        partials.get((collect_field, "booleans"), 0)
+    total = partials.get((collect_field, "sum"), 0) + \
+        partials.get((collect_field, "trues"), 0)
+    if collect_method == "sum":
+        if not summable:
+            raise InvalidOperationError("Unable to sum that data")
+        return total
+    if not summable or not count:
+        raise InvalidOperationError("Unable to find the mean of that data")
+    return total / float(count)
+
+
+def _merge(groups, index, keys, result):
+    """Merge a result into groups and return the top level group it is in
+
+    index maps the values of the first key to their groups and the indexes
+    of their sub-groups, so that a group is found without scanning its
+    siblings. Sub-groups are left unsorted and uncounted until
+    _sort_and_count_subgroups.
+    """
+    key = keys[0]
+    is_leaf = (len(keys) == 1)
     value = result.pop(key)
 
-    group = _find_group(group for group in groups if group[key] == value)
-    if not group:
+    entry = index.get(_hashable(value))
+    if entry is None:
         if is_leaf:
             group = _new_leaf_node(key, value, result.get('_count'))
         else:
             group = _new_branch_node(key, value)
         groups.append(group)
+        entry = index[_hashable(value)] = (group, {})
 
+    group, subgroup_index = entry
     if not is_leaf:
-        _merge_and_sort_subgroup(group, keys, result)
-        _add_branch_node_counts(group)
-    return groups, group
+        _merge(group['_subgroup'], subgroup_index, keys[1:], result)
+    return group
 
 
-def _find_group(items):
-    """Return the first item in an iterator or None"""
-    try:
-        return next(items)
-    except StopIteration:
-        return
+def _hashable(value):
+    """Return a dict key for a group value, which may be a list or a dict"""
+    if isinstance(value, list):
+        return list, tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return dict, frozenset((k, _hashable(v)) for k, v in value.items())
+    return value
 
 
 def _new_branch_node(key, value):
@@ -293,9 +661,14 @@ def _new_leaf_node(key, value, count=None):
     return r
 
 
-def _merge_and_sort_subgroup(group, keys, result):
-    group['_subgroup'], _ = _merge(group['_subgroup'], keys, result)
-    group['_subgroup'].sort(key=lambda d: d[keys[0]])
+def _sort_and_count_subgroups(groups, keys):
+    """Sort the sub-groups of each branch node by their key and count them"""
+    if len(keys) < 2:
+        return
+    for group in groups:
+        _sort_and_count_subgroups(group['_subgroup'], keys[1:])
+        group['_subgroup'].sort(key=lambda d: d[keys[1]])
+        _add_branch_node_counts(group)
 
 
 def _add_branch_node_counts(group):
@@ -1,6 +1,7 @@
 from backdrop.core.timeseries import WEEK, MONTH
 from backdrop.core.timeutils import parse_time_as_utc
-from backdrop.core.validation import validate_record_data
+from backdrop.core.validation import validate_record_data, \
+    validate_all_record_data
 from .errors import ParseError, ValidationError
 
 
@@ -10,6 +11,16 @@ class Record(object):
         if not result.is_valid:
             raise ValidationError(result.message)
 
+        self._set_data(data)
+
+    @classmethod
+    def _from_valid_data(cls, data, meta):
+        record = cls.__new__(cls)
+        record.data = data
+        record.meta = meta
+        return record
+
+    def _set_data(self, data):
         self.data = data
         self.meta = {}
 
@@ -22,6 +33,14 @@ class Record(object):
             self.data.items() + self.meta.items()
         )
 
+    def to_staged(self):
+        """Return a document from which from_staged rebuilds the record"""
+        return {'data': self.data, 'meta': self.meta}
+
+    @classmethod
+    def from_staged(cls, document):
+        return cls._from_valid_data(document['data'], document['meta'])
+
     def __eq__(self, other):
         if not isinstance(other, Record):
             return False
@@ -33,6 +52,84 @@ class Record(object):
 
 
 def parse(datum):
+    return Record(_parse_timestamp(datum))
+
+
+def parse_all(data, offset=0):
+    """Parse a list of records, naming the index of the first bad record
+
+    offset is the index of the first record of data within the whole
+    payload, for when a payload is parsed a chunk at a time. The records
+    are validated in a single pass before any Record is created.
+    """
+    results = validate_all_record_data(_parse_timestamps(data, offset))
+    for index, result in enumerate(results, offset):
+        if not result.is_valid:
+            raise ValidationError(
+                'record at index %d: %s' % (index, result.message))
+
+    return [Record._from_valid_data(datum, meta)
+            for datum, meta in zip(data, _period_starts(data))]
+
+
+def parse_valid(indexed_data):
+    """Parse the valid records of a list and report the invalid ones
+
+    indexed_data is an iterable of (index, datum) pairs. Returns the
+    records and a list with the index and reason of each rejected datum.
+    """
+    indexes, data, rejected = [], [], []
+    for index, datum in indexed_data:
+        try:
+            data.append(_parse_timestamp(datum))
+            indexes.append(index)
+        except (ParseError, ValidationError) as e:
+            rejected.append(_rejection(index, e))
+
+    valid = []
+    for index, datum, result in zip(indexes, data,
+                                    validate_all_record_data(data)):
+        if result.is_valid:
+            valid.append(datum)
+        else:
+            rejected.append(_rejection(index, result.message))
+
+    records = [Record._from_valid_data(datum, meta)
+               for datum, meta in zip(valid, _period_starts(valid))]
+    return records, sorted(rejected, key=lambda r: r['index'])
+
+
+def _rejection(index, reason):
+    return {'index': index, 'message': str(reason)}
+
+
+def _period_starts(data):
+    """Compute the period start meta of a list of records in one pass"""
+    metas = [{} for _ in data]
+    timed = [(meta, datum['_timestamp'])
+             for meta, datum in zip(metas, data) if '_timestamp' in datum]
+    timestamps = [timestamp for _, timestamp in timed]
+
+    for (meta, _), week_start, month_start in zip(
+            timed, WEEK.start_all(timestamps), MONTH.start_all(timestamps)):
+        meta['_week_start_at'] = week_start
+        meta['_month_start_at'] = month_start
+
+    return metas
+
+
+def _parse_timestamps(data, offset):
+    for index, datum in enumerate(data, offset):
+        try:
+            yield _parse_timestamp(datum)
+        except (ParseError, ValidationError) as e:
+            raise e.__class__('record at index %d: %s' % (index, e))
+
+
+def _parse_timestamp(datum):
+    if not isinstance(datum, dict):
+        raise ValidationError('record must be an object')
+
     if '_timestamp' in datum:
         try:
             datum['_timestamp'] = parse_time_as_utc(
@@ -41,8 +138,4 @@ def parse(datum):
             raise ParseError(
                 '_timestamp is not a valid timestamp, it must be ISO8601')
 
-    return Record(datum)
-
-
-def parse_all(data):
-    return [parse(datum) for datum in data]
+    return datum
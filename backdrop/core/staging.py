@@ -0,0 +1,42 @@
+"""
+On-disk staging area for documents that are stored all or nothing.
+
+Documents are appended to an anonymous temporary file as BSON while an
+upload is validated, and read back a document at a time once all of it
+is known to be valid, so memory use does not grow with the upload.
+"""
+import struct
+import tempfile
+
+import bson
+
+
+class StagingArea(object):
+    def __init__(self, directory=None):
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self.count = 0
+
+    def add(self, documents):
+        for document in documents:
+            self._file.write(bson.BSON.encode(document))
+            self.count += 1
+
+    def __iter__(self):
+        self._file.flush()
+        self._file.seek(0)
+        while True:
+            header = self._file.read(4)
+            if not header:
+                return
+            length = struct.unpack('<i', header)[0]
+            yield bson.BSON(
+                header + self._file.read(length - 4)).decode(tz_aware=True)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,246 @@
+"""
+Helpers for processing request payloads incrementally.
+"""
+import json
+import json.scanner
+import re
+import zlib
+from itertools import islice
+
+from .errors import ParseError, PayloadTooLarge
+
+READ_SIZE = 64 * 1024
+WBITS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+MAX_ITEM_SIZE = 1024 * 1024
+# how close to the end of what has been read a decoding error has to be
+# for the value to be treated as cut short rather than malformed; longer
+# than any literal or escape that can be cut in two
+TRUNCATION_MARGIN = 16
+ERROR_POSITION = re.compile(r'\(char (\d+)\)')
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+
+def chunks(items, size):
+    """Yield lists of at most size items from an iterable"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_json(stream, read_size=READ_SIZE, max_item_size=MAX_ITEM_SIZE):
+    """Yield the items of a JSON array as they are read from a stream
+
+    A top level value that is not an array is yielded on its own. Only the
+    item currently being decoded is held in memory, and an item of more
+    than max_item_size bytes raises PayloadTooLarge.
+    """
+    reader = _JsonReader(stream, read_size, max_item_size)
+
+    if reader.next_char() != '[':
+        yield reader.value()
+        reader.expect_end()
+        return
+
+    reader.advance()
+    if reader.next_char() == ']':
+        reader.advance()
+        reader.expect_end()
+        return
+
+    while True:
+        yield reader.value()
+        char = reader.next_char()
+        reader.advance()
+        if char == ']':
+            reader.expect_end()
+            return
+        if char != ',':
+            raise ParseError("Request must be valid JSON")
+
+
+def iter_ndjson(stream, read_size=READ_SIZE, max_item_size=MAX_ITEM_SIZE):
+    """Yield the values of newline delimited JSON as they are read
+
+    Blank lines are skipped, and a line of more than max_item_size bytes
+    raises ParseError.
+    """
+    decoder = json.JSONDecoder()
+    line_number = 0
+    for line in _iter_lines(stream, read_size, max_item_size):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield decoder.decode(line.decode('utf-8'))
+        except ValueError:
+            raise ParseError("line %d is not valid JSON" % line_number)
+
+
+def _iter_lines(stream, read_size, max_line_size):
+    # the pieces of an unfinished line are joined once it is finished
+    pieces, size = [], 0
+    while True:
+        data = stream.read(read_size)
+        if not data:
+            break
+        lines = data.split('\n')
+        for line in lines[:-1]:
+            pieces.append(line)
+            _check_line_size(size + len(line), max_line_size)
+            yield ''.join(pieces)
+            pieces, size = [], 0
+        pieces.append(lines[-1])
+        size += len(lines[-1])
+        _check_line_size(size, max_line_size)
+    if size:
+        yield ''.join(pieces)
+
+
+def _check_line_size(size, max_line_size):
+    if size > max_line_size:
+        raise ParseError("Lines of the request must be at most %d bytes"
+                         % max_line_size)
+
+
+class _JsonReader(object):
+    def __init__(self, stream, read_size, max_item_size):
+        self._stream = stream
+        self._read_size = read_size
+        self._max_item_size = max_item_size
+        self._decoder = json.JSONDecoder()
+        self._python_decoder = json.JSONDecoder()
+        self._python_decoder.scan_once = \
+            json.scanner.py_make_scanner(self._python_decoder)
+        self._buffer = ''
+        self._position = 0
+
+    def next_char(self):
+        """Skip whitespace and return the next character, '' at the end"""
+        while True:
+            self._position = WHITESPACE.match(self._buffer,
+                                              self._position).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                return ''
+
+    def advance(self):
+        self._position += 1
+
+    def value(self):
+        self.next_char()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer,
+                                                      self._position)
+            except ValueError as e:
+                if not self._is_truncated(e) or not self._fill():
+                    raise ParseError("Request must be valid JSON")
+                if len(self._buffer) > self._max_item_size:
+                    raise PayloadTooLarge(
+                        "Items of the request must be at most %d bytes"
+                        % self._max_item_size)
+                continue
+            # a number at the end of the buffer may carry on in the next
+            # read, even when what was read of it ends in '.' or 'e'
+            if self._may_carry_on(value, end) and self._fill():
+                continue
+            self._position = end
+            return value
+
+    def _may_carry_on(self, value, end):
+        if end == len(self._buffer):
+            return True
+        return isinstance(value, (int, long, float)) \
+            and not isinstance(value, bool) \
+            and NUMBER_TAIL.match(self._buffer, end) is not None
+
+    def _is_truncated(self, error):
+        """Whether a decoding error may be down to the value carrying on
+        past what has been read so far
+        """
+        message = str(error)
+        if not ERROR_POSITION.search(message):
+            # the C scanner does not say where a nested value went wrong
+            message = self._python_decoding_error() or message
+        if message.startswith("Unterminated string") \
+                or message.endswith("end is out of bounds"):
+            return True
+        position = ERROR_POSITION.search(message)
+        position = int(position.group(1)) if position else self._position
+        return len(self._buffer) - position <= TRUNCATION_MARGIN
+
+    def _python_decoding_error(self):
+        try:
+            self._python_decoder.raw_decode(self._buffer, self._position)
+        except ValueError as e:
+            return str(e)
+
+    def expect_end(self):
+        if self.next_char() != '':
+            raise ParseError("Request must be valid JSON")
+
+    def _fill(self):
+        """Read more of the stream, returning False once it is exhausted"""
+        data = self._stream.read(self._read_size)
+        if not data:
+            return False
+        self._buffer = self._buffer[self._position:] + data
+        self._position = 0
+        return True
+
+
+class DecompressingReader(object):
+    """Read a gzip or deflate compressed stream as it is decompressed
+
+    At most size bytes are decompressed per read, so memory use does not
+    depend on how well the stream compresses. Reading more than max_size
+    decompressed bytes raises PayloadTooLarge.
+    """
+    def __init__(self, stream, encoding, max_size, read_size=READ_SIZE):
+        self._stream = stream
+        self._encoding = encoding
+        self._max_size = max_size
+        self._read_size = read_size
+        self._decompressor = zlib.decompressobj(WBITS[encoding])
+        self._size = 0
+        self._started = False
+
+    def read(self, size=READ_SIZE):
+        while True:
+            data = self._decompressor.unconsumed_tail
+            if not data:
+                data = self._stream.read(self._read_size)
+                if not data:
+                    return self._count(self._decompressor.flush())
+            chunk = self._decompress(data, size)
+            if chunk:
+                return self._count(chunk)
+
+    def _decompress(self, data, size):
+        try:
+            chunk = self._decompressor.decompress(data, size)
+        except zlib.error:
+            if self._started or self._encoding != 'deflate':
+                raise ParseError(
+                    "Request body is not valid %s data" % self._encoding)
+            # some clients send deflate data without the zlib header
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decompress(data, size)
+        self._started = True
+        return chunk
+
+    def _count(self, chunk):
+        self._size += len(chunk)
+        if self._size > self._max_size:
+            raise PayloadTooLarge(
+                "Request body must be at most %d bytes "
+                "when decompressed" % self._max_size)
+        return chunk
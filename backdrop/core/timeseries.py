@@ -1,15 +1,50 @@
+from collections import OrderedDict
 from datetime import timedelta, time
+import threading
 import time as _time
-from dateutil.relativedelta import relativedelta, MO
+from dateutil.relativedelta import relativedelta
 import pytz
 
+START_CACHE_SIZE = 1024
 
-class Week(object):
-    def __init__(self):
-        self._delta = timedelta(days=7)
+
+class _Period(object):
+    """Memoizes the start of the period containing each day
+
+    Subclasses implement _start(timestamp), which must only depend on the
+    date and timezone of timestamp.
+    """
+    def __init__(self, cache_size=START_CACHE_SIZE):
+        self._starts = _LRUCache(cache_size)
 
     def start(self, timestamp):
-        return _truncate_time(timestamp) + relativedelta(weekday=MO(-1))
+        key = _day_key(timestamp)
+        start = self._starts.get(key)
+        if start is None:
+            start = self._start(timestamp)
+            self._starts.put(key, start)
+        return start
+
+    def start_all(self, timestamps):
+        """Return the period start of each of a list of timestamps"""
+        starts = {}
+        result = []
+        for timestamp in timestamps:
+            key = _day_key(timestamp)
+            start = starts.get(key)
+            if start is None:
+                start = starts[key] = self.start(timestamp)
+            result.append(start)
+        return result
+
+
+class Week(_Period):
+    def __init__(self, cache_size=START_CACHE_SIZE):
+        super(Week, self).__init__(cache_size)
+        self._delta = timedelta(days=7)
+
+    def _start(self, timestamp):
+        return _truncate_time(timestamp) - timedelta(days=timestamp.weekday())
 
     def end(self, timestamp):
         if self._monday_midnight(timestamp):
@@ -28,14 +63,15 @@ class Week(object):
             and timestamp.time() == time(0, 0, 0, 0)
 
 
-class Month(object):
-    def __init__(self):
+class Month(_Period):
+    def __init__(self, cache_size=START_CACHE_SIZE):
+        super(Month, self).__init__(cache_size)
         self._delta = relativedelta(months=1)
 
     def is_month_boundary(self, t):
         return t.day == 1 and t.time() == time(0, 0, 0, 0)
 
-    def start(self, timestamp):
+    def _start(self, timestamp):
         return timestamp.replace(day=1,
                                  hour=0,
                                  minute=0,
@@ -55,6 +91,34 @@ class Month(object):
             _start += self._delta
 
 
+class _LRUCache(object):
+    """A least recently used cache that threads can share
+
+    WEEK and MONTH are module level, so request threads share their caches.
+    """
+    def __init__(self, size):
+        self._size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is not None:
+                self._items[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            if len(self._items) > self._size:
+                self._items.popitem(last=False)
+
+
+def _day_key(timestamp):
+    return timestamp.year, timestamp.month, timestamp.day, timestamp.tzinfo
+
+
 WEEK = Week()
 MONTH = Month()
 
@@ -1,7 +1,14 @@
 import datetime
+import re
 from dateutil import parser
 import pytz
 
+ISO8601 = re.compile(
+    '^([0-9]{4})-([0-9]{2})-([0-9]{2})'
+    'T([0-9]{2}):([0-9]{2}):([0-9]{2})'
+    '(?:Z|([+-])([0-9]{2}):?([0-9]{2}))$'
+)
+
 
 def now():
     return datetime.datetime.now(pytz.UTC)
@@ -11,11 +18,67 @@ def parse_time_as_utc(time_string):
     if isinstance(time_string, datetime.datetime):
         time = time_string
     else:
+        time = parse_iso8601_as_utc(time_string)
+        if time is not None:
+            return time
         time = parser.parse(time_string)
 
     return as_utc(time)
 
 
+def parse_iso8601_as_utc(time_string):
+    """Parse a time in the strict format straight to a UTC datetime
+
+    Returns None if time_string is not in the strict format.
+    """
+    parsed = _parse_iso8601(time_string)
+    if parsed is None:
+        return None
+    local_time, offset = parsed
+    return utc(local_time - offset)
+
+
+def parse_time(time_string):
+    """Parse a time string keeping the UTC offset it was given in"""
+    parsed = _parse_iso8601(time_string)
+    if parsed is not None:
+        local_time, offset = parsed
+        return local_time.replace(
+            tzinfo=pytz.FixedOffset(offset.days * 1440 + offset.seconds / 60))
+    return parser.parse(time_string)
+
+
+def _parse_iso8601(time_string):
+    """Parse the strict ISO 8601 format that the APIs document
+
+    Returns a naive local time and its UTC offset as a timedelta, or None
+    if time_string is not in the strict format. Raises ValueError if it
+    is in the format but is not a real time.
+    """
+    if not isinstance(time_string, basestring):
+        return None
+    match = ISO8601.match(time_string)
+    if match is None:
+        return None
+
+    year, month, day, hour, minute, second, sign, offset_hours, \
+        offset_minutes = match.groups()
+
+    local_time = datetime.datetime(int(year), int(month), int(day),
+                                   int(hour), int(minute), int(second))
+    if sign is None:
+        return local_time, datetime.timedelta(0)
+
+    if int(offset_hours) > 23 or int(offset_minutes) > 59:
+        raise ValueError("UTC offset out of range")
+    offset = datetime.timedelta(hours=int(offset_hours),
+                                minutes=int(offset_minutes))
+    if sign == '-':
+        offset = -offset
+
+    return local_time, offset
+
+
 def as_utc(dt):
     if dt.tzinfo is None:
         return utc(dt)
@@ -12,7 +12,7 @@ def create_parser(upload_format, upload_filters):
         for upload_filter in upload_filters:
             data = upload_filter(data)
 
-        return list(make_dicts(data))
+        return make_dicts(data)
 
     return parser
 
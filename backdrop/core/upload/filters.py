@@ -1,3 +1,117 @@
+import re
+from itertools import chain, islice
+
+from backdrop.core.timeutils import parse_iso8601_as_utc
+
+SAMPLE_SIZE = 1000
+INTEGER = re.compile(r'^[+-]?[0-9]+$')
+FLOAT = re.compile(r'^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$')
+LEADING_ZERO = re.compile(r'^[+-]?0[0-9]')
+MIN_INT64 = -2 ** 63
+MAX_INT64 = 2 ** 63 - 1
+
 
 def first_sheet_filter(sheets):
-    return list(sheets)[0]
+    """Yield the rows of the first sheet
+
+    The sheets are kept open until the rows have been read.
+    """
+    for sheet in sheets:
+        for row in sheet:
+            yield row
+        return
+
+
+def infer_column_types(rows, sample_size=SAMPLE_SIZE):
+    """Convert the string values of each column to the type of the column
+
+    The type of each column is decided once from the first sample_size
+    rows: int, float, bool, ISO 8601 timestamp, or string if its values
+    are not all one of those. Numbers with leading zeros and integers that
+    do not fit in 64 bits are codes or ids rather than numbers, so they
+    leave their columns as strings. Columns whose header starts with an
+    underscore are left as strings for the record parser. Blank values,
+    and values after the sample that do not fit their column's type, are
+    left as they are.
+    """
+    rows = iter(rows)
+    header = next(rows)
+    yield header
+
+    sample = list(islice(rows, sample_size))
+    converters = [_converter_for(key, [row[index] for row in sample
+                                       if index < len(row)])
+                  for index, key in enumerate(header)]
+
+    for row in chain(sample, rows):
+        if len(row) != len(converters):
+            # left for make_dicts to report
+            yield row
+        else:
+            yield [convert(value) for convert, value in zip(converters, row)]
+
+
+def _is_integer(value):
+    return INTEGER.match(value) is not None and _is_number(value)
+
+
+def _is_float(value):
+    return FLOAT.match(value) is not None and _is_number(value)
+
+
+def _is_number(value):
+    if LEADING_ZERO.match(value):
+        return False
+    return INTEGER.match(value) is None or \
+        MIN_INT64 <= int(value) <= MAX_INT64
+
+
+def _is_bool(value):
+    return value.lower() in ('true', 'false')
+
+
+def _is_timestamp(value):
+    try:
+        return parse_iso8601_as_utc(value) is not None
+    except ValueError:
+        return False
+
+
+def _to_bool(value):
+    return value.lower() == 'true'
+
+
+COLUMN_TYPES = [
+    (_is_integer, int),
+    (_is_float, float),
+    (_is_bool, _to_bool),
+    (_is_timestamp, parse_iso8601_as_utc),
+]
+
+
+def _converter_for(key, values):
+    if isinstance(key, basestring) and key.startswith('_'):
+        return _unchanged
+    values = [value.strip() for value in values
+              if isinstance(value, basestring) and value.strip()]
+    if not values:
+        return _unchanged
+    for is_type, convert in COLUMN_TYPES:
+        if all(is_type(value) for value in values):
+            return _converter(is_type, convert)
+    return _unchanged
+
+
+def _converter(is_type, convert):
+    def converter(value):
+        if not isinstance(value, basestring):
+            return value
+        stripped = value.strip()
+        if not stripped or not is_type(stripped):
+            return value
+        return convert(stripped)
+    return converter
+
+
+def _unchanged(value):
+    return value
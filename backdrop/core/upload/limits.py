@@ -0,0 +1,174 @@
+"""
+Parse uploads in a child process with limits on its time and memory.
+
+The parser runs in a new Python process, started with fork and exec so
+that nothing held by the threads of the web worker is inherited, whose
+address space and CPU time are limited with setrlimit and which is killed
+if it runs for longer than its time limit. The child rebuilds the parser
+from the upload format and the names of its filters, reads the upload
+from its stdin and pickles the parsed records to a temporary file that
+the parent reads back once the child has finished, so a pathological
+file kills the child rather than the web worker.
+
+    python -m backdrop.core.upload.limits '<json arguments>'
+"""
+import cPickle as pickle
+import json
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from backdrop.core.errors import ParseError, ValidationError
+
+ERRORS = {
+    'ParseError': ParseError,
+    'ValidationError': ValidationError,
+}
+# how often the parent checks whether the child has finished, in seconds
+POLL_INTERVAL = 0.01
+
+
+def parse_with_limits(upload_format, upload_filters, file_stream,
+                      time_limit=None, memory_limit=None, directory=None):
+    """Parse file_stream as create_parser would in a child process
+
+    upload_filters are dotted names or module level functions. Returns an
+    iterator over the parsed records. Raises ParseError if the child goes
+    over its time limit in seconds or its memory limit in bytes, and
+    re-raises the ParseError or ValidationError of the parser.
+    """
+    arguments = json.dumps({
+        'format': upload_format,
+        'filters': map(_filter_name, upload_filters),
+        'time_limit': time_limit,
+        'memory_limit': memory_limit,
+    })
+    upload = tempfile.TemporaryFile(dir=directory)
+    output = tempfile.TemporaryFile(dir=directory)
+    errors = tempfile.TemporaryFile(dir=directory)
+    try:
+        try:
+            shutil.copyfileobj(file_stream, upload)
+            upload.seek(0)
+            child = subprocess.Popen(
+                [sys.executable, '-m', __name__, arguments],
+                stdin=upload, stdout=output, stderr=errors, close_fds=True,
+                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+            _wait(child, time_limit)
+        finally:
+            upload.close()
+        if child.returncode != 0:
+            _raise_error(errors)
+    except:
+        output.close()
+        raise
+    finally:
+        errors.close()
+
+    output.seek(0)
+    return _read_records(output)
+
+
+def _filter_name(upload_filter):
+    if callable(upload_filter):
+        return '%s.%s' % (upload_filter.__module__, upload_filter.__name__)
+    return upload_filter
+
+
+def _wait(child, time_limit):
+    deadline = time.time() + time_limit if time_limit is not None else None
+    while child.poll() is None:
+        if deadline is not None and time.time() > deadline:
+            child.kill()
+            child.wait()
+            raise ParseError("the upload took too long to parse")
+        time.sleep(POLL_INTERVAL)
+
+
+def _raise_error(errors):
+    """Raise the error the child reported on the last line of its stderr"""
+    errors.seek(0)
+    lines = errors.read().splitlines()
+    try:
+        error = json.loads(lines[-1])
+        exception = ERRORS[error['error']](error['message'])
+    except (IndexError, ValueError, KeyError, TypeError):
+        # killed, most likely by its resource limits
+        raise ParseError("the upload used too many resources to parse")
+    raise exception
+
+
+def _main(arguments):
+    from backdrop.core.upload import create_parser
+
+    arguments = json.loads(arguments)
+    # records go to the original stdout, anything printed to stderr
+    output = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    try:
+        parser = create_parser(arguments['format'], arguments['filters'])
+        _limit_resources(arguments['time_limit'], arguments['memory_limit'])
+        pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+        for record in parser(sys.stdin):
+            pickler.dump(record)
+            # records are only read back once, so nothing is memoised
+            pickler.clear_memo()
+        output.flush()
+    except (ParseError, ValidationError) as e:
+        return _report(type(e).__name__, e.message)
+    except MemoryError:
+        return _report('ParseError',
+                       "the upload used too much memory to parse")
+    except Exception as e:
+        return _report('ParseError',
+                       "the upload could not be parsed: %s" % e)
+    return 0
+
+
+def _report(error, message):
+    sys.stderr.write('\n%s\n' % json.dumps({'error': error,
+                                            'message': message}))
+    sys.stderr.flush()
+    return 1
+
+
+def _limit_resources(time_limit, memory_limit):
+    if time_limit is not None:
+        cpu_seconds = int(math.ceil(time_limit))
+        resource.setrlimit(resource.RLIMIT_CPU,
+                           (cpu_seconds, cpu_seconds + 1))
+    if memory_limit is not None:
+        # on top of what the child uses once its parser is loaded
+        address_space = _address_space_size() + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS,
+                           (address_space, address_space))
+
+
+def _address_space_size():
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[0])
+        return pages * resource.getpagesize()
+    except (IOError, ValueError, IndexError):
+        return 0
+
+
+def _read_records(output):
+    try:
+        unpickler = pickle.Unpickler(output)
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
+    finally:
+        output.close()
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1]))
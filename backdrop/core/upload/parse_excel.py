@@ -1,15 +1,62 @@
 import logging
+import mmap
+from StringIO import StringIO
 import xlrd
 import datetime
 from backdrop.core.errors import ParseError
 from backdrop.core.timeutils import utc
+from .parse_xlsx import is_xlsx, parse_xlsx
 
 
 def parse_excel(incoming_data):
-    book = xlrd.open_workbook(file_contents=incoming_data.read())
+    if not _is_seekable(incoming_data):
+        incoming_data = StringIO(incoming_data.read())
 
-    for sheet in book.sheets():
-        yield _extract_rows(sheet, book)
+    if is_xlsx(incoming_data):
+        return parse_xlsx(incoming_data, _extract_date)
+    return _parse_xls(incoming_data)
+
+
+def _parse_xls(incoming_data):
+    """Yield the sheets of a workbook
+
+    Each sheet is unloaded when the next one is asked for, and the
+    workbook's resources are released once this generator is finished
+    or closed, so a sheet has to be read before the generator moves on.
+    """
+    book = xlrd.open_workbook(file_contents=_contents_of(incoming_data),
+                              on_demand=True)
+    try:
+        for index in range(book.nsheets):
+            yield _extract_sheet(book, index)
+            book.unload_sheet(index)
+    finally:
+        book.release_resources()
+
+
+def _extract_sheet(book, index):
+    """Load a sheet when its rows are first asked for, so sheets that no
+    filter reads are never built
+    """
+    sheet = book.sheet_by_index(index)
+    for row in _extract_rows(sheet, book):
+        yield row
+
+
+def _contents_of(stream):
+    """Memory map files on disk rather than reading them into memory"""
+    try:
+        return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, IOError, ValueError, mmap.error):
+        return stream.read()
+
+
+def _is_seekable(stream):
+    try:
+        stream.tell()
+        return hasattr(stream, "seek")
+    except (AttributeError, IOError):
+        return False
 
 
 def _extract_rows(sheet, book):
@@ -23,8 +70,12 @@ def _extract_values(row, book):
 
 def _extract_cell_value(cell, book):
     if cell.ctype == xlrd.XL_CELL_DATE:
-        time_tuple = xlrd.xldate_as_tuple(cell.value, book.datemode)
-        return utc(datetime.datetime(*time_tuple)).isoformat()
+        return _extract_date(cell.value, book.datemode)
     elif cell.ctype == xlrd.XL_CELL_ERROR:
         raise ParseError("Error encountered in cell")
     return cell.value
+
+
+def _extract_date(value, datemode):
+    time_tuple = xlrd.xldate_as_tuple(value, datemode)
+    return utc(datetime.datetime(*time_tuple)).isoformat()
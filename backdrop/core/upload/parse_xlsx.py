@@ -0,0 +1,261 @@
+"""
+Read xlsx workbooks a row at a time.
+
+The workbook is opened with zipfile and each worksheet is parsed with
+iterparse as its rows are asked for, so only one row of a sheet is held
+in memory at once and sheets that are never asked for are never parsed.
+Values are the same as those that xlrd gives for the workbook.
+"""
+import posixpath
+import re
+import zipfile
+from xml.etree import cElementTree as ElementTree
+
+from xlrd.formatting import is_date_format_string
+
+from backdrop.core.errors import ParseError
+
+MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIPS = \
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_RELATIONSHIPS = \
+    "{http://schemas.openxmlformats.org/package/2006/relationships}"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+ROW = MAIN + "row"
+CELL = MAIN + "c"
+VALUE = MAIN + "v"
+INLINE_STRING = MAIN + "is"
+TEXT = MAIN + "t"
+RICH_TEXT_RUN = MAIN + "r"
+SHEET_DATA = MAIN + "sheetData"
+
+# built in number formats that are dates, as xlrd treats them
+DATE_FORMAT_IDS = frozenset(range(14, 23) + range(45, 48))
+ESCAPE = re.compile(r'_x[0-9A-Fa-f]{4}_')
+COLUMN = re.compile(r'[A-Z]+')
+
+
+def is_xlsx(incoming_data):
+    """Whether a seekable stream holds an xlsx (zip) file"""
+    position = incoming_data.tell()
+    is_zip = incoming_data.read(4) == 'PK\x03\x04'
+    incoming_data.seek(position)
+    return is_zip
+
+
+def parse_xlsx(incoming_data, extract_date):
+    """Yield a generator of rows for each worksheet of an xlsx file
+
+    extract_date converts a date cell's value and the workbook's datemode
+    to the value returned for the cell.
+    """
+    try:
+        workbook = _Workbook(zipfile.ZipFile(incoming_data), extract_date)
+    except (zipfile.BadZipfile, KeyError, SyntaxError):
+        raise ParseError("Could not read the xlsx file")
+
+    for path in workbook.sheet_paths:
+        yield workbook.rows(path)
+
+
+class _Workbook(object):
+    def __init__(self, archive, extract_date):
+        self._archive = archive
+        self._extract_date = extract_date
+        self._shared_strings = None
+        self._date_styles = None
+        self.datemode = 0
+        self.sheet_paths = self._read_sheet_paths()
+
+    def rows(self, path):
+        """Yield the rows of a sheet padded to the width of the sheet
+
+        Rows are yielded up to the last with a value, as xlrd does. The
+        sheet is read twice: first for its size, then for its values.
+        """
+        self._read_shared_parts()
+        nrows, ncols = self._extent(path)
+        next_rowx = 0
+        for rowx, cells in self._rows(path):
+            if rowx >= nrows:
+                break
+            while next_rowx < rowx:
+                yield [''] * ncols
+                next_rowx += 1
+            row = [''] * ncols
+            for colx, cell in cells:
+                row[colx] = self._value(cell)
+            yield row
+            next_rowx = rowx + 1
+
+    def _extent(self, path):
+        nrows = ncols = 0
+        for rowx, cells in self._rows(path):
+            cells = [colx for colx, cell in cells if _has_value(cell)]
+            if cells:
+                nrows = rowx + 1
+                ncols = max(ncols, max(cells) + 1)
+        return nrows, ncols
+
+    def _rows(self, path):
+        """Yield the row index and (column index, cell element) pairs of
+        each row of a sheet
+        """
+        rowx = -1
+        sheet_data = None
+        for event, elem in ElementTree.iterparse(self._archive.open(path),
+                                                 events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == SHEET_DATA:
+                    sheet_data = elem
+                continue
+            if elem.tag != ROW:
+                continue
+            row_number = elem.get('r')
+            rowx = int(row_number) - 1 if row_number else rowx + 1
+
+            colx = -1
+            cells = []
+            for cell in elem.iter(CELL):
+                ref = cell.get('r')
+                colx = _column_index(ref) if ref else colx + 1
+                cells.append((colx, cell))
+            yield rowx, cells
+
+            # drop parsed rows so memory does not grow with the sheet
+            if sheet_data is not None:
+                sheet_data.clear()
+
+    def _value(self, cell):
+        cell_type = cell.get('t', 'n')
+        if cell_type == 'inlineStr':
+            return _text_of(cell.find(INLINE_STRING))
+
+        value = cell.findtext(VALUE)
+        if cell_type == 'n':
+            if not value:
+                return ''
+            number = float(value)
+            if int(cell.get('s', '0')) in self._date_styles:
+                return self._extract_date(number, self.datemode)
+            return number
+        elif cell_type == 's':
+            return self._shared_strings[int(value)] if value else ''
+        elif cell_type == 'str':
+            # xlrd gives None for a formula string without a value
+            return _cooked(cell.find(VALUE)) if value is not None else None
+        elif cell_type == 'b':
+            return int(value)
+        elif cell_type == 'e':
+            raise ParseError("Error encountered in cell")
+        raise ParseError("Unknown cell type %s" % cell_type)
+
+    def _read_sheet_paths(self):
+        targets = {}
+        relationships = self._parse('xl/_rels/workbook.xml.rels')
+        for relationship in relationships.iter(
+                PACKAGE_RELATIONSHIPS + 'Relationship'):
+            if relationship.get('Type').endswith('/worksheet'):
+                targets[relationship.get('Id')] = \
+                    _member_path(relationship.get('Target'))
+
+        workbook = self._parse('xl/workbook.xml')
+        properties = workbook.find(MAIN + 'workbookPr')
+        if properties is not None \
+                and properties.get('date1904') in ('1', 'true'):
+            self.datemode = 1
+        return [targets[sheet.get(RELATIONSHIPS + 'id')]
+                for sheet in workbook.iter(MAIN + 'sheet')
+                if sheet.get(RELATIONSHIPS + 'id') in targets]
+
+    def _read_shared_parts(self):
+        if self._shared_strings is not None:
+            return
+        self._date_styles = self._read_date_styles()
+        self._shared_strings = self._read_shared_strings()
+
+    def _read_date_styles(self):
+        """Return the indexes of the cell styles that format dates"""
+        if 'xl/styles.xml' not in self._archive.namelist():
+            return frozenset()
+        styles = self._parse('xl/styles.xml')
+        date_formats = set(DATE_FORMAT_IDS)
+        for number_format in styles.iter(MAIN + 'numFmt'):
+            format_id = int(number_format.get('numFmtId'))
+            date_formats.discard(format_id)
+            if is_date_format_string(_FORMAT_BOOK,
+                                     number_format.get('formatCode')):
+                date_formats.add(format_id)
+
+        cell_formats = styles.find(MAIN + 'cellXfs')
+        if cell_formats is None:
+            return frozenset()
+        return frozenset(
+            index for index, xf in enumerate(cell_formats.iter(MAIN + 'xf'))
+            if int(xf.get('numFmtId', '0')) in date_formats)
+
+    def _read_shared_strings(self):
+        if 'xl/sharedStrings.xml' not in self._archive.namelist():
+            return []
+        strings = []
+        for event, elem in ElementTree.iterparse(
+                self._archive.open('xl/sharedStrings.xml')):
+            if elem.tag == MAIN + 'si':
+                strings.append(_text_of(elem))
+                elem.clear()
+        return strings
+
+    def _parse(self, path):
+        return ElementTree.parse(self._archive.open(path)).getroot()
+
+
+class _FormatBook(object):
+    """Stands in for the xlrd Book that is_date_format_string logs to"""
+    verbosity = 0
+    logfile = None
+
+
+_FORMAT_BOOK = _FormatBook()
+
+
+def _has_value(cell):
+    cell_type = cell.get('t', 'n')
+    if cell_type in ('n', 's'):
+        return bool(cell.findtext(VALUE))
+    return True
+
+
+def _text_of(elem):
+    """Return the text of a shared or inline string, including rich text"""
+    parts = []
+    for child in elem:
+        if child.tag == TEXT:
+            parts.append(_cooked(child))
+        elif child.tag == RICH_TEXT_RUN:
+            parts.extend(_cooked(text) for text in child.iter(TEXT))
+    return u''.join(parts)
+
+
+def _cooked(elem):
+    if elem.text is None:
+        return u''
+    text = elem.text
+    if elem.get(XML_SPACE) != 'preserve':
+        text = text.strip("\t\n \r")
+    text = ESCAPE.sub(lambda match: unichr(int(match.group(0)[2:6], 16)),
+                      text)
+    return unicode(text)
+
+
+def _column_index(ref):
+    index = 0
+    for letter in COLUMN.match(ref).group(0):
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _member_path(target):
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join('xl', target))
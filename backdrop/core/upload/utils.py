@@ -4,7 +4,11 @@ from backdrop.core.errors import ParseError
 
 
 def remove_blanks(rows):
-    return filter(lambda r: not all(len(v) == 0 for v in r), rows)
+    return ifilter(lambda r: not all(_is_blank(v) for v in r), rows)
+
+
+def _is_blank(value):
+    return isinstance(value, basestring) and len(value) == 0
 
 
 def make_dicts(rows):
@@ -28,3 +32,54 @@ def make_dicts(rows):
                 'Some rows in the CSV file contain fewer values than columns')
 
         yield dict(zip(keys, row))
+
+
+class RowWindow(object):
+    """Forward only access by index to the rows of a lazily parsed sheet
+
+    Rows are read from the sheet only as far as the furthest row asked
+    for, and only the rows listed in keep are held on to once passed, so
+    a filter that needs a few cells of a large sheet does not need the
+    whole sheet in memory.
+    """
+    def __init__(self, rows, keep=()):
+        self._rows = iter(rows)
+        self._keep = frozenset(keep)
+        self._kept = {}
+        self._next_index = 0
+
+    def row(self, index):
+        if index in self._kept:
+            return self._kept[index]
+        if index < self._next_index:
+            raise ValueError("Row %d has already been read past" % index)
+        while self._next_index <= index:
+            row = self._read()
+        return row
+
+    def cell(self, row_index, column_index):
+        return self.row(row_index)[column_index]
+
+    def rows_from(self, index):
+        """Yield the rows from index to the end of the sheet"""
+        if index < self._next_index:
+            raise ValueError("Row %d has already been read past" % index)
+        try:
+            while self._next_index < index:
+                self._read()
+        except IndexError:
+            return
+        for row in self._rows:
+            self._next_index += 1
+            yield row
+
+    def _read(self):
+        try:
+            row = next(self._rows)
+        except StopIteration:
+            raise IndexError("Row %d is past the end of the sheet"
+                             % self._next_index)
+        if self._next_index in self._keep:
+            self._kept[self._next_index] = row
+        self._next_index += 1
+        return row
@@ -9,12 +9,19 @@ import datetime
 import re
 from dateutil import parser
 import pytz
+from backdrop.core import timeutils
 
 RESERVED_KEYWORDS = (
     '_timestamp',
     '_id'
 )
 VALID_KEY = re.compile('^[a-z_][a-z0-9_]+$')
+WHITESPACE = re.compile('\s')
+TIME_PATTERN = re.compile(
+    "[0-9]{4}-[0-9]{2}-[0-9]{2}"
+    "T[0-9]{2}:[0-9]{2}:[0-9]{2}"
+    "(?:[+-][0-9]{2}:?[0-9]{2}|Z)"
+)
 
 
 def _is_real_date(value):
@@ -26,15 +33,15 @@ def _is_real_date(value):
 
 
 def _is_valid_format(value):
-    time_pattern = re.compile(
-        "[0-9]{4}-[0-9]{2}-[0-9]{2}"
-        "T[0-9]{2}:[0-9]{2}:[0-9]{2}"
-        "(?:[+-][0-9]{2}:?[0-9]{2}|Z)"
-    )
-    return bool(time_pattern.match(value))
+    return bool(TIME_PATTERN.match(value))
 
 
 def value_is_valid_datetime_string(value):
+    try:
+        if timeutils.parse_iso8601_as_utc(value) is not None:
+            return True
+    except ValueError:
+        return False
     return _is_valid_format(value) and _is_real_date(value)
 
 
@@ -68,7 +75,7 @@ def bucket_is_valid(bucket_name):
 def value_is_valid_id(value):
     if not isinstance(value, basestring):
         return False
-    if re.compile('\s').search(value):
+    if WHITESPACE.search(value):
         return False
     return len(value) > 0
 
@@ -84,8 +91,50 @@ def invalid(message):
     return ValidationResult(False, message)
 
 
-def validate_record_data(data):
-    for key, value in data.items():
+class RecordValidator(object):
+    """Validates record data, remembering the keys it has seen pass
+
+    Records in a batch nearly always share the same few keys, so once a key
+    has passed the key checks only its value is checked. The cache of keys
+    is bounded so that arbitrary input can not grow it without limit.
+    """
+    VALID_VALUE_TYPES = frozenset(
+        [int, float, str, unicode, bool, datetime.datetime])
+
+    def __init__(self, max_known_keys=10000):
+        self._known_keys = set()
+        self._max_known_keys = max_known_keys
+        self._valid = valid()
+
+    def validate(self, data):
+        known_keys = self._known_keys
+        for key, value in data.iteritems():
+            if key not in known_keys:
+                result = self._validate_key(key)
+                if not result.is_valid:
+                    return result
+
+            if type(value) not in self.VALID_VALUE_TYPES \
+                    and not value_is_valid(value):
+                return invalid('{0} has an invalid value'.format(key))
+
+            if key == '_timestamp' \
+                    and not isinstance(value, datetime.datetime):
+                return invalid(
+                    '_timestamp is not a valid datetime object')
+
+            if key == '_id' and not value_is_valid_id(value):
+                return invalid('_id is not a valid id')
+
+        return self._valid
+
+    def validate_all(self, batch):
+        """Yield a ValidationResult for each record data in the batch"""
+        validate = self.validate
+        for data in batch:
+            yield validate(data)
+
+    def _validate_key(self, key):
         if not key_is_valid(key):
             return invalid('{0} is not a valid key'.format(key))
 
@@ -93,14 +142,18 @@ def validate_record_data(data):
             return invalid(
                 '{0} is not a recognised internal field'.format(key))
 
-        if not value_is_valid(value):
-            return invalid('{0} has an invalid value'.format(key))
+        if len(self._known_keys) < self._max_known_keys:
+            self._known_keys.add(key)
 
-        if key == '_timestamp' and not isinstance(value, datetime.datetime):
-            return invalid(
-                '_timestamp is not a valid datetime object')
+        return self._valid
+
+
+_record_validator = RecordValidator()
+
+
+def validate_record_data(data):
+    return _record_validator.validate(data)
 
-        if key == '_id' and not value_is_valid_id(value):
-            return invalid('_id is not a valid id')
 
-    return valid()
+def validate_all_record_data(batch):
+    return _record_validator.validate_all(batch)
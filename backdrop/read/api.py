@@ -32,7 +32,8 @@ app.config.from_object(
 db = database.Database(
     app.config['MONGO_HOST'],
     app.config['MONGO_PORT'],
-    app.config['DATABASE_NAME']
+    app.config['DATABASE_NAME'],
+    group_engines=app.config.get('BUCKET_GROUP_ENGINES')
 )
 
 setup_logging()
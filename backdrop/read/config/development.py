@@ -38,3 +38,8 @@ RAW_QUERIES_ALLOWED = {
   # LPA / Lasting Power of Attorney
   "lpa_journey": True,
 }
+# how grouped queries of a bucket are run: "group" (the default) or
+# "aggregate", which uses a $group pipeline instead of the group command
+BUCKET_GROUP_ENGINES = {
+    "lpa_volumes": "aggregate",
+}
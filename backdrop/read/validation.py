@@ -1,7 +1,6 @@
 from datetime import time
-from dateutil import parser
-import pytz
 import api
+from ..core.timeutils import parse_time, parse_time_as_utc
 from ..core.validation import value_is_valid_datetime_string, valid, \
     invalid, key_is_valid
 import re
@@ -213,8 +212,8 @@ def _is_valid_date(string):
 class TimeSpanValidator(Validator):
     def validate(self, request_args, context):
         if self._is_valid_date_query(request_args):
-            start_at = parser.parse(request_args['start_at'])
-            end_at = parser.parse(request_args['end_at'])
+            start_at = parse_time_as_utc(request_args['start_at'])
+            end_at = parse_time_as_utc(request_args['end_at'])
             delta = end_at - start_at
             if delta.days < context['length']:
                 self.add_error('The minimum time span for a query is 7 days')
@@ -228,7 +227,7 @@ class MidnightValidator(Validator):
     def validate(self, request_args, context):
         timestamp = request_args.get(context['param_name'])
         if _is_valid_date(timestamp):
-            dt = parser.parse(timestamp).astimezone(pytz.UTC)
+            dt = parse_time_as_utc(timestamp)
             if dt.time() != time(0):
                 self.add_error('%s must be midnight' % context['param_name'])
 
@@ -238,7 +237,7 @@ class MondayValidator(Validator):
         if request_args.get('period') == 'week':
             timestamp = request_args.get(context['param_name'])
             if _is_valid_date(timestamp):
-                if (parser.parse(timestamp)).weekday() != 0:
+                if parse_time(timestamp).weekday() != 0:
                     self.add_error('%s must be a monday'
                                    % context['param_name'])
 
@@ -249,7 +248,7 @@ class FirstOfMonthValidator(Validator):
         if request_args.get('period') == 'month':
             timestamp = request_args.get(context['param_name'])
             if _is_valid_date(timestamp):
-                if (parser.parse(timestamp)).day != 1:
+                if parse_time(timestamp).day != 1:
                     self.add_error('\'%s\' must be the first of the month for '
                                    'period=month queries'
                                    % context['param_name'])
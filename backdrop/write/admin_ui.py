@@ -1,19 +1,45 @@
+import tempfile
+import time
 from functools import wraps
 from flask import flash, session, render_template, redirect, \
-    request, abort
+    request, abort, current_app, Request, jsonify
 from admin_ui_helper import url_for
+from backdrop.core.auto_id import auto_id_config
 from backdrop.core.bucket import Bucket
+from backdrop.core.database import DEFAULT_BATCH_SIZE
 from backdrop.core.errors import ParseError, ValidationError
 from backdrop.core.upload import create_parser
+from backdrop.core.upload.limits import parse_with_limits
 from backdrop.core.upload.filters import first_sheet_filter
 from backdrop.write.signonotron2 import Signonotron2
+from backdrop.write.upload_jobs import UploadJobs
 from ..core import cache_control
 
+DEFAULT_MAX_UPLOAD_SIZE = 1000000
+
+
+class UploadRequest(Request):
+    """Spools every uploaded file to a temporary file on disk
+
+    Werkzeug keeps uploads under 500KB in memory, so without this a
+    parser could not rely on the upload having a file descriptor.
+    """
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return tempfile.TemporaryFile(
+            'w+b', dir=current_app.config.get('UPLOAD_DIRECTORY'))
+
 
 def setup(app, db):
     USER_SCOPE = app.config['USER_SCOPE']
     ADMIN_UI_HOST = app.config["BACKDROP_ADMIN_UI_HOST"]
-    MAX_UPLOAD_SIZE = 1000000
+
+    app.request_class = UploadRequest
+
+    app.upload_jobs = None
+    if app.config.get('BACKGROUND_UPLOAD_BUCKETS'):
+        app.upload_jobs = UploadJobs(
+            app.config.get('UPLOAD_JOBS_PATH', 'tmp/upload_jobs'))
 
     app.oauth_service = Signonotron2(
         client_id=app.config['OAUTH_CLIENT_ID'],
@@ -126,37 +152,103 @@ def setup(app, db):
         if not app.permissions.allowed(current_user_email, bucket_name):
             return abort(404)
 
-        upload_format = _upload_format_for(bucket_name)
-        upload_filters = _upload_filters_for(bucket_name)
-
         if request.method == 'GET':
-            return render_template("upload_%s.html" % upload_format,
-                                   bucket_name=bucket_name)
+            return render_template(
+                "upload_%s.html" % _upload_format_for(bucket_name),
+                bucket_name=bucket_name)
+
+        return _store_data(bucket_name)
 
-        parser = create_parser(upload_format, upload_filters)
+    @app.route('/<bucket:bucket_name>/upload/jobs/<job_id>', methods=['GET'])
+    @protected
+    @cache_control.nocache
+    def upload_job(bucket_name, job_id):
+        current_user_email = session.get("user").get("email")
+        if not app.permissions.allowed(current_user_email, bucket_name):
+            return abort(404)
 
-        return _store_data(bucket_name, parser)
+        job = app.upload_jobs.status(job_id) if app.upload_jobs else None
+        if job is None or job['bucket'] != bucket_name:
+            return abort(404)
+
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(status='ok', job=job)
+        if job['state'] == 'stored':
+            return render_template("upload_ok.html", job=job,
+                                   counts=job.get('counts'))
+        if job['state'] == 'failed':
+            return render_template("upload_error.html", job=job,
+                                   message=job.get('message'))
+        return render_template("upload_job.html", job=job,
+                               bucket_name=bucket_name)
+
+    def _store_data(bucket_name):
+        # checked before request.files is touched, which reads the upload
+        if request.content_length > _max_upload_size_for(bucket_name):
+            return _invalid_upload("file too large")
 
-    def _store_data(bucket_name, parser):
         file_stream = request.files["file"].stream
-        if not request.files["file"].filename:
+        filename = request.files["file"].filename
+        if not filename:
             return _invalid_upload("file is required")
         try:
-            if request.content_length > MAX_UPLOAD_SIZE:
-                return _invalid_upload("file too large")
+            if request.form.get("dry_run") == "true":
+                return _dry_run(bucket_name, file_stream)
+            if _uploads_run_in_background(bucket_name):
+                job_id = app.upload_jobs.submit(bucket_name, filename,
+                                                file_stream)
+                return redirect(url_for(ADMIN_UI_HOST, 'upload_job',
+                                        bucket_name=bucket_name,
+                                        job_id=job_id))
             try:
-                data = parser(file_stream)
+                counts = _process_upload(bucket_name, file_stream)
 
-                auto_id_keys = _auto_id_keys_for(bucket_name)
-                bucket = Bucket(db, bucket_name, generate_id_from=auto_id_keys)
-                bucket.parse_and_store(data)
-
-                return render_template("upload_ok.html")
+                return render_template("upload_ok.html", counts=counts)
             except (ParseError, ValidationError) as e:
                 return _invalid_upload(e.message)
         finally:
             file_stream.close()
 
+    def _dry_run(bucket_name, file_stream):
+        started = time.time()
+        try:
+            valid, rejected = _bucket_for(bucket_name).validate_in_chunks(
+                _parse_upload(bucket_name, file_stream),
+                app.config.get('WRITE_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        except (ParseError, ValidationError) as e:
+            return _invalid_upload(e.message)
+
+        return render_template("upload_dry_run.html",
+                               bucket_name=bucket_name,
+                               records=valid + len(rejected),
+                               valid=valid,
+                               rejected=rejected,
+                               elapsed=time.time() - started)
+
+    def _process_upload(bucket_name, file_stream, progress=None,
+                        already_stored=0):
+        return _bucket_for(bucket_name).parse_and_store_in_chunks(
+            _parse_upload(bucket_name, file_stream),
+            app.config.get('WRITE_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            all_or_nothing=_uploads_are_all_or_nothing(bucket_name),
+            progress=progress, already_stored=already_stored)
+
+    def _parse_upload(bucket_name, file_stream):
+        upload_format = _upload_format_for(bucket_name)
+        upload_filters = _upload_filters_for(bucket_name)
+        if app.config.get('PARSE_UPLOADS_WITH_LIMITS'):
+            return parse_with_limits(
+                upload_format, upload_filters, file_stream,
+                time_limit=app.config.get('UPLOAD_PARSE_TIME_LIMIT'),
+                memory_limit=app.config.get('UPLOAD_PARSE_MEMORY_LIMIT'),
+                directory=app.config.get('UPLOAD_DIRECTORY'))
+        return create_parser(upload_format, upload_filters)(file_stream)
+
+    def _bucket_for(bucket_name):
+        auto_id_keys, auto_id_scheme = _auto_id_for(bucket_name)
+        return Bucket(db, bucket_name, generate_id_from=auto_id_keys,
+                      auto_id_scheme=auto_id_scheme)
+
     def _upload_format_for(bucket_name):
         return app.config.get("BUCKET_UPLOAD_FORMAT", {})\
                          .get(bucket_name, "csv")
@@ -165,13 +257,30 @@ def setup(app, db):
         return app.config.get("BUCKET_UPLOAD_FILTERS", {})\
                          .get(bucket_name, [first_sheet_filter])
 
-    def _auto_id_keys_for(bucket_name):
-        return app.config.get("BUCKET_AUTO_ID_KEYS", {}).get(bucket_name)
+    def _auto_id_for(bucket_name):
+        return auto_id_config(
+            app.config.get("BUCKET_AUTO_ID_KEYS", {}).get(bucket_name))
+
+    def _max_upload_size_for(bucket_name):
+        return app.config.get("BUCKET_MAX_UPLOAD_SIZE", {}).get(
+            bucket_name,
+            app.config.get("MAX_UPLOAD_SIZE", DEFAULT_MAX_UPLOAD_SIZE))
+
+    def _uploads_run_in_background(bucket_name):
+        return app.upload_jobs is not None and \
+            bucket_name in app.config.get('BACKGROUND_UPLOAD_BUCKETS', [])
+
+    def _uploads_are_all_or_nothing(bucket_name):
+        return bucket_name not in app.config.get('STREAMING_UPLOAD_BUCKETS',
+                                                 [])
 
     def _invalid_upload(msg):
         app.logger.error("Upload error: %s" % msg)
         return render_template("upload_error.html", message=msg), 400
 
+    # jobs are run by backdrop.write.upload_worker in its own process
+    app.process_upload = _process_upload
+
 
 def allow_test_signin(app):
     return bool(app.config.get("ALLOW_TEST_SIGNIN"))
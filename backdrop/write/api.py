@@ -1,18 +1,27 @@
+import time
+from itertools import chain
 from os import getenv
 
+from bson import ObjectId
 from flask import Flask, request, jsonify, g, redirect, url_for
 from flask_featureflags import FeatureFlag
+from pymongo.errors import AutoReconnect
 from backdrop import statsd
-from backdrop.core.bucket import Bucket
+from backdrop.core.bucket import Bucket, add_write_counts
 from backdrop.core.log_handler \
     import create_request_logger, create_response_logger
 from backdrop.core.flaskutils import BucketConverter
 from backdrop.write.permissions import Permissions
 from backdrop.write.admin_ui import use_single_sign_on
 from backdrop.write import admin_ui
+from backdrop.write.write_queue import WriteQueue, Drainer
 
-from ..core.errors import ParseError, ValidationError
+from ..core.errors import ParseError, ValidationError, PayloadTooLarge
+from ..core.streaming import chunks, iter_json, iter_ndjson, \
+    DecompressingReader, WBITS
 from ..core import database, log_handler, cache_control
+from ..core.records import Record
+from ..core.staging import StagingArea
 
 from .validation import bearer_token_is_valid
 
@@ -37,10 +46,15 @@ app.config.from_object(
 
 app.config['USER_SCOPE'] = "/_user"
 
+DEFAULT_MAX_DECOMPRESSED_SIZE = 100 * 1024 * 1024
+
 db = database.Database(
     app.config['MONGO_HOST'],
     app.config['MONGO_PORT'],
-    app.config['DATABASE_NAME']
+    app.config['DATABASE_NAME'],
+    batch_size=app.config.get('WRITE_BATCH_SIZE',
+                              database.DEFAULT_BATCH_SIZE),
+    write_profiles=app.config.get('BUCKET_WRITE_PROFILES')
 )
 
 setup_logging()
@@ -56,6 +70,13 @@ if use_single_sign_on(app):
     app.secret_key = app.config['SECRET_KEY']
     admin_ui.setup(app, db)
 
+write_queue = None
+if app.config.get('ASYNC_WRITE_BUCKETS') \
+        or app.config.get('SPOOL_WRITES_ON_OUTAGE'):
+    write_queue = WriteQueue(app.config.get('WRITE_QUEUE_PATH',
+                                            'tmp/write_queue'))
+    Drainer(write_queue, db).start()
+
 
 @app.errorhandler(500)
 @app.errorhandler(405)
@@ -80,11 +101,12 @@ def index():
 @app.route('/_status', methods=['GET'])
 @cache_control.nocache
 def health_check():
+    queue = {'write_queue': write_queue.stats()} if write_queue else {}
     if db.alive():
-        return jsonify(status='ok', message='database seems fine')
+        return jsonify(status='ok', message='database seems fine', **queue)
     else:
         return jsonify(status='error',
-                       message='cannot connect to database'), 500
+                       message='cannot connect to database', **queue), 500
 
 
 @app.route('/<bucket:bucket_name>', methods=['POST'])
@@ -99,25 +121,223 @@ def post_to_bucket(bucket_name):
         statsd.incr("write_api.bad_token", bucket=g.bucket_name)
         return jsonify(status='error', message='Forbidden'), 403
 
+    stored = 0
+    counts = None
+    staged = None
     try:
-        data = load_json(request.json)
+        data = load_json_stream(request)
 
         bucket = Bucket(db, bucket_name)
-        bucket.parse_and_store(data)
-
-        return jsonify(status='ok')
+        if dry_run_requested(request):
+            return dry_run(bucket, data)
+
+        rejected = [] if partial_success_requested(request) else None
+        parsed_chunks = parse_chunks(bucket, enumerate_chunks(data), rejected)
+
+        if writes_are_async(bucket_name) or writes_are_spooled(bucket_name):
+            return queue_writes(bucket, parsed_chunks, rejected)
+
+        if rejected is None and request.mimetype == 'application/json':
+            # a JSON write is stored all or nothing, so every record of it
+            # is parsed before any is stored
+            staged = stage(parsed_chunks)
+            parsed_chunks = chunks(staged_records(staged), batch_size())
+
+        for records in parsed_chunks:
+            try:
+                if records:
+                    if spool_writes_on_outage():
+                        assign_ids(records)
+                    counts = add_write_counts(counts, bucket.store(records))
+                stored += len(records)
+            except AutoReconnect:
+                if not spool_writes_on_outage():
+                    raise
+                app.logger.warning("Database unavailable, spooling writes")
+                statsd.incr("write_api.spooled", bucket=bucket_name)
+                return queue_writes(
+                    bucket, chain([records], parsed_chunks), rejected)
+
+        return write_result('ok', rejected,
+                            **dict(progress(stored), **(counts or {})))
     except (ParseError, ValidationError) as e:
-        return jsonify(status="error", message=str(e)), 400
+        return jsonify(status="error", message=str(e),
+                       **progress(stored)), 400
+    except PayloadTooLarge as e:
+        return jsonify(status="error", message=str(e),
+                       **progress(stored)), 413
+    finally:
+        if staged is not None:
+            staged.close()
+
+
+@app.route('/<bucket:bucket_name>/batches/<batch_id>', methods=['GET'])
+@cache_control.nocache
+def batch_status(bucket_name, batch_id):
+    g.bucket_name = bucket_name
+
+    tokens = app.config['TOKENS']
+    auth_header = request.headers.get('Authorization', None)
+
+    if not bearer_token_is_valid(tokens, auth_header, bucket_name):
+        statsd.incr("write_api.bad_token", bucket=g.bucket_name)
+        return jsonify(status='error', message='Forbidden'), 403
+
+    status = write_queue.status(batch_id) if write_queue else None
+    if status is None or status['bucket'] != bucket_name:
+        return jsonify(status='error', message='Batch not found'), 404
+
+    return jsonify(status='ok', batch=status)
+
+
+def writes_are_async(bucket_name):
+    return write_queue is not None \
+        and bucket_name in app.config.get('ASYNC_WRITE_BUCKETS', [])
+
+
+def spool_writes_on_outage():
+    return write_queue is not None \
+        and app.config.get('SPOOL_WRITES_ON_OUTAGE', False)
+
+
+def writes_are_spooled(bucket_name):
+    """Whether earlier writes to a bucket are still spooled
+
+    Later writes are spooled behind them so that they are stored in the
+    order they were made.
+    """
+    return spool_writes_on_outage() and write_queue.has_pending(bucket_name)
+
 
+def partial_success_requested(request):
+    """Whether to store the valid records of a payload with invalid ones
 
-def load_json(data):
-    if data is None:
+    The response then lists the index and reason of each rejected record.
+    """
+    return request.args.get('partial') == 'true'
+
+
+def dry_run_requested(request):
+    """Whether to validate a payload without storing any of it"""
+    return request.args.get('dry_run') == 'true'
+
+
+def dry_run(bucket, data):
+    started = time.time()
+    valid, rejected = bucket.validate_in_chunks(
+        data, app.config.get('WRITE_BATCH_SIZE', database.DEFAULT_BATCH_SIZE))
+    result = {
+        'dry_run': True,
+        'records': valid + len(rejected),
+        'valid': valid,
+        'rejected': rejected,
+        'elapsed': time.time() - started,
+    }
+    if rejected:
+        return jsonify(status='error',
+                       message='%d records are invalid' % len(rejected),
+                       **result), 400
+    return jsonify(status='ok', **result)
+
+
+def queue_writes(bucket, parsed_chunks, rejected=None):
+    batch_id = write_queue.put(
+        bucket.bucket_name,
+        (record.to_mongo() for records in parsed_chunks for record in records))
+    return write_result('accepted', rejected, batch_id=batch_id), 202
+
+
+def assign_ids(records):
+    """Give records without an _id one before they are stored
+
+    A chunk that meets an outage is spooled whole, including any batches
+    of it that were already written, and those are then upserted under
+    the same ids rather than stored twice.
+    """
+    for record in records:
+        if '_id' not in record.data:
+            record.meta['_id'] = ObjectId()
+
+
+def stage(parsed_chunks):
+    """Stage parsed records on disk, raising if any record is invalid"""
+    staged = StagingArea()
+    try:
+        staged.add(record.to_staged()
+                   for records in parsed_chunks for record in records)
+    except:
+        staged.close()
+        raise
+    return staged
+
+
+def staged_records(staged):
+    return (Record.from_staged(document) for document in staged)
+
+
+def parse_chunks(bucket, payload_chunks, rejected=None):
+    for offset, chunk in payload_chunks:
+        if rejected is None:
+            yield bucket.parse(chunk, offset)
+        else:
+            records, invalid = bucket.parse_valid(chunk, offset)
+            rejected += invalid
+            yield records
+
+
+def write_result(status, rejected=None, **kwargs):
+    if rejected:
+        statsd.incr("write_api.rejected", len(rejected),
+                    bucket=g.bucket_name)
+        kwargs['rejected'] = rejected
+        if status == 'ok':
+            status = 'partial'
+    return jsonify(status=status, **kwargs)
+
+
+def load_json_stream(request):
+    if request.mimetype == 'application/x-ndjson':
+        return iter_ndjson(request_body(request))
+    if request.mimetype != 'application/json':
         raise ValidationError("Request must be JSON")
 
-    if isinstance(data, list):
-        return data
-    else:
-        return [data]
+    return iter_json(request_body(request))
+
+
+def progress(stored):
+    """Report how many records of a streamed payload have been stored
+
+    NDJSON uploads can be too long to resend after an error, so their
+    responses say how many records were stored before it.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        return {'records': stored}
+    return {}
+
+
+def request_body(request):
+    """Return the request body, decompressing it as it is read"""
+    encoding = request.headers.get('Content-Encoding', 'identity').lower()
+    if encoding == 'identity':
+        return request.stream
+    if encoding not in WBITS:
+        raise ValidationError("Unsupported Content-Encoding: %s" % encoding)
+
+    return DecompressingReader(
+        request.stream, encoding,
+        app.config.get('MAX_DECOMPRESSED_SIZE', DEFAULT_MAX_DECOMPRESSED_SIZE))
+
+
+def enumerate_chunks(data):
+    """Yield chunks of the payload with the index of their first record"""
+    offset = 0
+    for chunk in chunks(data, batch_size()):
+        yield offset, chunk
+        offset += len(chunk)
+
+
+def batch_size():
+    return app.config.get('WRITE_BATCH_SIZE', database.DEFAULT_BATCH_SIZE)
 
 
 def start(port):
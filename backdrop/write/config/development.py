@@ -8,6 +8,51 @@ BACKDROP_ADMIN_UI_HOST = "http://backdrop-admin.dev.gov.uk"
 BUCKET_AUTO_ID_KEYS = {
     "lpa_volumes": ("key", "start_at", "end_at")
 }
+# Buckets listed here accept writes with 202 Accepted and store them
+# from an on-disk queue in the background
+ASYNC_WRITE_BUCKETS = []
+WRITE_QUEUE_PATH = "tmp/write_queue"
+# Spool synchronous writes to the same queue while the database is down
+SPOOL_WRITES_ON_OUTAGE = False
+# Largest gzip or deflate compressed request body once decompressed
+MAX_DECOMPRESSED_SIZE = 100 * 1024 * 1024
+# How writes to a bucket are made: "write_concern" is one of
+# unacknowledged, acknowledged or journaled; "batch_size" and "ordered"
+# control the bulk writes; "skip_unchanged" stores a content hash with
+# each record and only writes records that are new or have changed
+BUCKET_WRITE_PROFILES = {
+    "licensing_realtime": {
+        "write_concern": "unacknowledged",
+        "batch_size": 5000
+    },
+    "lpa_volumes": {
+        "skip_unchanged": True
+    },
+}
+# Uploads to these buckets are stored as they are parsed rather than
+# only once the whole file is valid
+STREAMING_UPLOAD_BUCKETS = []
+# Uploads to these buckets are parsed and stored by upload worker
+# processes, started with python -m backdrop.write.upload_worker, and the
+# upload page links to the job's progress
+BACKGROUND_UPLOAD_BUCKETS = []
+UPLOAD_JOBS_PATH = "tmp/upload_jobs"
+# Parse uploads in a child process that is stopped if it runs for longer
+# than the time limit in seconds or grows by more than the memory limit.
+# The child is a new Python process started with fork and exec, so it is
+# safe alongside the threads of ASYNC_WRITE_BUCKETS and
+# SPOOL_WRITES_ON_OUTAGE. Upload filters must be dotted names or module
+# level functions for the child to load them.
+PARSE_UPLOADS_WITH_LIMITS = False
+UPLOAD_PARSE_TIME_LIMIT = 300
+UPLOAD_PARSE_MEMORY_LIMIT = 512 * 1024 * 1024
+# Uploaded files are spooled here, the system temporary directory if None
+UPLOAD_DIRECTORY = None
+# Largest upload request in bytes, for all buckets and for given buckets
+MAX_UPLOAD_SIZE = 1000000
+BUCKET_MAX_UPLOAD_SIZE = {
+    "evl_ceg_data": 20 * 1024 * 1024,
+}
 BUCKET_UPLOAD_FORMAT = {
     "my_xlsx_bucket": "excel",
     "evl_ceg_data": "excel",
@@ -16,6 +61,8 @@ BUCKET_UPLOAD_FORMAT = {
     "evl_channel_volumetrics": "excel",
     "evl_customer_satisfaction": "excel",
 }
+# Add "backdrop.core.upload.filters.infer_column_types" after the sheet
+# filter to store numbers, booleans and timestamps in uploads as such
 BUCKET_UPLOAD_FILTERS = {
     "evl_ceg_data": [
         "backdrop.core.upload.filters.first_sheet_filter",
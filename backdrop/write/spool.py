@@ -0,0 +1,158 @@
+"""
+Spool directories shared by the write queue and upload jobs.
+
+Items are written to tmp/ and renamed into pending/, so an item is either
+fully queued or not queued at all. A process claims items by renaming them
+into its own claimed/<pid>/ directory, which lets several gunicorn workers
+share a spool, and items claimed by processes that are no longer running
+are put back into pending/ by recover. Each item has a JSON status file in
+status/ named after its id.
+"""
+import errno
+import json
+import os
+import re
+import time
+import uuid
+
+ITEM_ID = re.compile('^[0-9a-f]{32}$')
+STATUS_TTL = 24 * 60 * 60
+
+
+class Spool(object):
+    def __init__(self, path, directories=()):
+        self.path = path
+        for name in ['tmp', 'pending', 'claimed', 'status'] + \
+                list(directories):
+            make_dirs(self._dir(name))
+
+    def status(self, item_id):
+        """Return the status of an item or None if it is not known"""
+        if not ITEM_ID.match(item_id):
+            return None
+        try:
+            with open(self._dir('status', item_id)) as status_file:
+                return json.load(status_file)
+        except IOError:
+            return None
+
+    def pending(self):
+        return sorted(os.listdir(self._dir('pending')))
+
+    def recover(self):
+        """Requeue items claimed by processes that are no longer running
+
+        Returns the names of the items requeued. Items that another
+        process recovered first are skipped.
+        """
+        recovered = []
+        for pid in os.listdir(self._dir('claimed')):
+            if int(pid) == os.getpid() or is_running(int(pid)):
+                continue
+            claimed_dir = self._dir('claimed', pid)
+            for name in list_dir(claimed_dir):
+                if if_exists(os.rename, os.path.join(claimed_dir, name),
+                             self._dir('pending', name)):
+                    recovered.append(name)
+            if_exists(os.rmdir, claimed_dir)
+        return recovered
+
+    def expire_statuses(self, ttl=STATUS_TTL):
+        expire_before = time.time() - ttl
+        for item_id in os.listdir(self._dir('status')):
+            status_path = self._dir('status', item_id)
+            if os.path.getmtime(status_path) < expire_before:
+                if_exists(os.remove, status_path)
+
+    def _new_item(self, bucket_name):
+        """Return the id and file name of a new item"""
+        item_id = uuid.uuid4().hex
+        return item_id, '%020d.%s.%s' % (time.time() * 1000000, item_id,
+                                         bucket_name)
+
+    def _claim(self, names):
+        claimed_dir = self._claimed_dir()
+        make_dirs(claimed_dir)
+        claimed = []
+        for name in names:
+            try:
+                os.rename(self._dir('pending', name),
+                          os.path.join(claimed_dir, name))
+                claimed.append(name)
+            except OSError:
+                # another process got there first
+                pass
+        return claimed
+
+    def _release(self, names):
+        for name in names:
+            # items finished before whatever interrupted their processing
+            # are no longer there
+            if_exists(os.rename, os.path.join(self._claimed_dir(), name),
+                      self._dir('pending', name))
+
+    def _set_status(self, item_id, status):
+        tmp_path = self._dir('tmp', 'status.' + item_id)
+        write_file(tmp_path, json.dumps(status))
+        os.rename(tmp_path, self._dir('status', item_id))
+
+    def _claimed_path(self, name):
+        return os.path.join(self._claimed_dir(), name)
+
+    def _claimed_dir(self):
+        return self._dir('claimed', str(os.getpid()))
+
+    def _dir(self, *names):
+        return os.path.join(self.path, *names)
+
+
+def parse_name(name):
+    """Return the time an item was queued, its id and its bucket name"""
+    queued_at, item_id, bucket_name = name.split('.')
+    return int(queued_at) / 1000000.0, item_id, bucket_name
+
+
+def write_file(path, contents):
+    with open(path, 'wb') as f:
+        f.write(contents)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def make_dirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def list_dir(path):
+    """List a directory that another process may have removed"""
+    try:
+        return os.listdir(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return []
+
+
+def if_exists(func, *args):
+    """Call func on paths that another process may have moved away first,
+    returning whether they were still there
+    """
+    try:
+        func(*args)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return False
+    return True
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
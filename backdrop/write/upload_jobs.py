@@ -0,0 +1,156 @@
+"""
+Background jobs for admin uploads.
+
+An uploaded file is copied into a spool (see backdrop.write.spool) as a
+job, and the request returns straight away with a link to the job's status
+page. Upload workers run in processes of their own (see
+backdrop.write.upload_worker), claim jobs, parse and store them, and keep
+the job's status up to date with the rows parsed and stored so far. A job
+whose worker died is requeued by recover and resumed after the rows it
+had stored.
+"""
+import logging
+import os
+import shutil
+import time
+
+from backdrop.core import timeutils
+from backdrop.core.errors import ParseError, ValidationError
+from backdrop.write.spool import Spool, parse_name
+
+log = logging.getLogger(__name__)
+
+
+class UploadJobs(Spool):
+    def submit(self, bucket_name, filename, stream):
+        """Copy an uploaded file into a new job and return its id"""
+        job_id, name = self._new_item(bucket_name)
+        tmp_path = self._dir('tmp', name)
+
+        try:
+            with open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(stream, f)
+        except:
+            os.remove(tmp_path)
+            raise
+
+        self._set_status(job_id, {
+            'job_id': job_id,
+            'bucket': bucket_name,
+            'filename': filename,
+            'state': 'queued',
+            'rows_parsed': 0,
+            'rows_stored': 0,
+            'queued_at': timeutils.now().isoformat(),
+        })
+        os.rename(tmp_path, self._dir('pending', name))
+
+        return job_id
+
+    def status(self, job_id):
+        """Return the status of a job or None if it is not known
+
+        The elapsed time of a running job is brought up to date.
+        """
+        status = super(UploadJobs, self).status(job_id)
+        if status is not None and status['state'] == 'running':
+            status['elapsed'] = time.time() - status['started']
+        return status
+
+    def run_next(self, process):
+        """Claim the oldest pending job and run it
+
+        process is called with the bucket name, the uploaded file, a
+        callback taking the rows parsed and stored so far and the number
+        of rows stored by an earlier run of the job, which are not to be
+        stored again. It may return the numbers of rows inserted, updated
+        and unchanged. Returns whether there was a job to run.
+        """
+        job = self._claim_next()
+        if job is None:
+            return False
+        name, job_id, bucket_name = job
+        path = self._claimed_path(name)
+        already_stored = (self.status(job_id) or {}).get('rows_stored', 0)
+
+        started = time.time()
+        self._update(job_id, state='running', started=started,
+                     started_at=timeutils.now().isoformat(), elapsed=0)
+
+        def progress(parsed, stored):
+            self._update(job_id, rows_parsed=parsed, rows_stored=stored,
+                         elapsed=time.time() - started)
+
+        try:
+            with open(path, 'rb') as stream:
+                counts = process(bucket_name, stream, progress,
+                                 already_stored)
+        except (ParseError, ValidationError) as e:
+            self._finish(job_id, started, 'failed', message=e.message)
+        except Exception as e:
+            log.exception(e)
+            self._finish(job_id, started, 'failed',
+                         message="the upload could not be stored")
+        else:
+            self._finish(job_id, started, 'stored', counts=counts)
+        # a worker stopped part way through leaves the job to be recovered
+        os.remove(path)
+
+        return True
+
+    def recover(self):
+        """Requeue jobs claimed by workers that are no longer running"""
+        recovered = super(UploadJobs, self).recover()
+        for name in recovered:
+            self._update(parse_name(name)[1], state='queued')
+        return recovered
+
+    def _claim_next(self):
+        for name in self.pending():
+            if self._claim([name]):
+                _, job_id, bucket_name = parse_name(name)
+                return name, job_id, bucket_name
+        return None
+
+    def _finish(self, job_id, started, state, message=None, counts=None):
+        changes = {
+            'state': state,
+            'finished_at': timeutils.now().isoformat(),
+            'elapsed': time.time() - started,
+        }
+        if message:
+            changes['message'] = message
+        if counts:
+            changes['counts'] = counts
+        self._update(job_id, **changes)
+
+    def _update(self, job_id, **changes):
+        status = self.status(job_id) or {'job_id': job_id}
+        status.update(changes)
+        self._set_status(job_id, status)
+
+
+class UploadWorker(object):
+    """Runs upload jobs one at a time until its process is stopped"""
+    def __init__(self, jobs, process, interval=1.0):
+        self.jobs = jobs
+        self.process = process
+        self.interval = interval
+
+    def run(self):
+        recovered = False
+        last_expired = 0
+        while True:
+            try:
+                if not recovered:
+                    self.jobs.recover()
+                    recovered = True
+                ran = self.jobs.run_next(self.process)
+                if time.time() - last_expired > 60:
+                    self.jobs.expire_statuses()
+                    last_expired = time.time()
+            except Exception as e:
+                log.exception(e)
+                ran = False
+            if not ran:
+                time.sleep(self.interval)
@@ -0,0 +1,27 @@
+"""
+Run the background upload jobs of the write app in a process of its own.
+
+    python -m backdrop.write.upload_worker
+
+Each worker process runs one job at a time, so run more of them to run
+more jobs at once. A job claimed by a worker that dies is requeued by the
+next worker to start and resumed after the rows it had stored.
+"""
+import logging
+import sys
+
+from backdrop.write.api import app
+from backdrop.write.upload_jobs import UploadWorker
+
+log = logging.getLogger(__name__)
+
+
+def main():
+    if getattr(app, 'upload_jobs', None) is None:
+        log.error("no buckets are configured for background uploads")
+        return 1
+    UploadWorker(app.upload_jobs, app.process_upload).run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""
+Write-behind queue for the write API.
+
+Validated records are spooled to local disk as batches and a background
+drainer commits them to the database, grouping pending batches by bucket.
+Batches live in a spool (see backdrop.write.spool), which lets several
+gunicorn workers drain the same queue. Every spooled document has an _id,
+so replaying a batch that was partly written upserts the documents that
+were written rather than storing them twice.
+
+The same queue is used as a spool for synchronous writes while the
+database is unreachable; see SPOOL_WRITES_ON_OUTAGE in the write API.
+"""
+import errno
+import fcntl
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import bson
+from pymongo.errors import AutoReconnect
+
+from backdrop import statsd
+from backdrop.core import timeutils
+from backdrop.write.spool import Spool, parse_name
+
+log = logging.getLogger(__name__)
+
+REPLAY_RATE_WINDOW = 60
+
+
+class WriteQueue(Spool):
+    def __init__(self, path):
+        super(WriteQueue, self).__init__(path,
+                                         directories=['failed', 'locks'])
+        self._stored = deque()
+
+    def put(self, bucket_name, documents):
+        """Spool an iterable of documents as one batch and return its id
+
+        Documents are written to disk as they are produced, and those
+        without an _id are given one. If producing them raises, nothing is
+        queued.
+        """
+        batch_id, name = self._new_item(bucket_name)
+        tmp_path = self._dir('tmp', name)
+
+        try:
+            count = _write_documents(tmp_path, _with_ids(documents))
+        except:
+            os.remove(tmp_path)
+            raise
+
+        self._set_status(batch_id, {
+            'batch_id': batch_id,
+            'bucket': bucket_name,
+            'state': 'queued',
+            'records': count,
+            'queued_at': timeutils.now().isoformat(),
+        })
+        os.rename(tmp_path, self._dir('pending', name))
+
+        return batch_id
+
+    def has_pending(self, bucket_name):
+        """Whether any batch of a bucket is still waiting to be stored
+
+        Batches being stored are claimed by a drainer that holds the
+        bucket's lock, so only the pending directory is listed.
+        """
+        if any(parse_name(name)[2] == bucket_name
+               for name in self.pending()):
+            return True
+        lock = self._lock(bucket_name)
+        if lock is None:
+            return True
+        lock.close()
+        return False
+
+    def stats(self):
+        """Return the size of the queue, the age of its oldest batch in
+        seconds and the records per second stored by this process over
+        the last minute
+        """
+        names = self.pending()
+        size = 0
+        for name in names:
+            try:
+                size += os.path.getsize(self._dir('pending', name))
+            except OSError:
+                # claimed since it was listed
+                pass
+        oldest_age = time.time() - parse_name(names[0])[0] if names else 0
+        return {
+            'batches': len(names),
+            'bytes': size,
+            'oldest_age': oldest_age,
+            'replay_rate': self._replay_rate(),
+        }
+
+    def drain(self, db, max_batches=100):
+        """Store the oldest pending batches with one write per bucket
+
+        Returns the number of batches taken off the queue. A process only
+        claims and stores the batches of a bucket while it holds the
+        bucket's lock, so each bucket's batches are stored in the order
+        they were queued; buckets locked by another process are left to
+        it. Batches are put back on the queue if the database cannot be
+        reached.
+        """
+        drained = []
+        for bucket_name, names in _group_by_bucket(
+                self.pending()[:max_batches]):
+            lock = self._lock(bucket_name)
+            if lock is None:
+                continue
+            try:
+                claimed = self._claim(names)
+                if claimed and not self._store(db, bucket_name, claimed):
+                    return 0
+            finally:
+                lock.close()
+            drained += claimed
+
+        self._report_depth(drained)
+
+        return len(drained)
+
+    def _store(self, db, bucket_name, names):
+        """Store claimed batches of a bucket in one write
+
+        Returns False, having put them back on the queue, if the database
+        cannot be reached.
+        """
+        finished = False
+        try:
+            documents = []
+            for name in names:
+                documents += self._read(name)
+            try:
+                db.get_repository(bucket_name).save_all(documents)
+            except AutoReconnect:
+                log.warning("Database unavailable, requeueing batches")
+                return False
+            except Exception as e:
+                log.exception(e)
+                self._finish(names, 'failed', message=str(e))
+            else:
+                self._finish(names, 'stored')
+                self._record_stored(len(documents))
+                statsd.incr("write_queue.replayed", len(documents),
+                            bucket=bucket_name)
+            finished = True
+        finally:
+            if not finished:
+                self._release(names)
+        return True
+
+    def _lock(self, bucket_name):
+        """Lock the batches of a bucket, returning the open lock file, or
+        None if another process holds the lock
+
+        The lock is released when the file is closed or the process dies.
+        """
+        lock_file = open(self._dir('locks', bucket_name), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as e:
+            lock_file.close()
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                return None
+            raise
+        return lock_file
+
+    def _finish(self, names, state, message=None):
+        for name in names:
+            claimed_path = self._claimed_path(name)
+            if state == 'failed':
+                os.rename(claimed_path, self._dir('failed', name))
+            else:
+                os.remove(claimed_path)
+
+            queued_at, batch_id, bucket_name = parse_name(name)
+            status = self.status(batch_id) or {'batch_id': batch_id,
+                                               'bucket': bucket_name}
+            status['state'] = state
+            status['%s_at' % state] = timeutils.now().isoformat()
+            if message:
+                status['message'] = message
+            self._set_status(batch_id, status)
+
+            statsd.incr("write_queue.%s" % state, bucket=bucket_name)
+            statsd.timing("write_queue.lag",
+                          (time.time() - queued_at) * 1000,
+                          bucket=bucket_name)
+
+    def _report_depth(self, drained):
+        depth = dict((parse_name(name)[2], 0) for name in drained)
+        oldest = {}
+        for name in self.pending():
+            queued_at, _, bucket_name = parse_name(name)
+            depth[bucket_name] = depth.get(bucket_name, 0) + 1
+            oldest.setdefault(bucket_name, queued_at)
+        for bucket_name, count in depth.items():
+            oldest_age = time.time() - oldest[bucket_name] \
+                if bucket_name in oldest else 0
+            statsd.gauge("write_queue.oldest_age", oldest_age,
+                         bucket=bucket_name)
+            statsd.gauge("write_queue.depth", count, bucket=bucket_name)
+
+    def _record_stored(self, count):
+        now = time.time()
+        self._stored.append((now, count))
+        while self._stored and self._stored[0][0] < now - REPLAY_RATE_WINDOW:
+            self._stored.popleft()
+
+    def _replay_rate(self):
+        since = time.time() - REPLAY_RATE_WINDOW
+        stored = sum(count for at, count in list(self._stored) if at >= since)
+        return float(stored) / REPLAY_RATE_WINDOW
+
+    def _read(self, name):
+        with open(self._claimed_path(name), 'rb') as f:
+            return bson.decode_all(f.read())
+
+
+class Drainer(threading.Thread):
+    """Background thread that keeps draining a write queue"""
+    def __init__(self, queue, db, interval=1.0):
+        super(Drainer, self).__init__(name="write-queue-drainer")
+        self.daemon = True
+        self.queue = queue
+        self.db = db
+        self.interval = interval
+
+    def run(self):
+        recovered = False
+        last_expired = 0
+        while True:
+            try:
+                if not recovered:
+                    self.queue.recover()
+                    recovered = True
+                if self.queue.pending() and not self.db.alive():
+                    drained = 0
+                else:
+                    drained = self.queue.drain(self.db)
+                if time.time() - last_expired > 60:
+                    self.queue.expire_statuses()
+                    last_expired = time.time()
+            except Exception as e:
+                log.exception(e)
+                drained = 0
+            if not drained:
+                time.sleep(self.interval)
+
+
+def _group_by_bucket(names):
+    """Group batch file names by bucket, keeping the order of the queue"""
+    groups = []
+    index = {}
+    for name in names:
+        bucket_name = parse_name(name)[2]
+        if bucket_name not in index:
+            index[bucket_name] = []
+            groups.append((bucket_name, index[bucket_name]))
+        index[bucket_name].append(name)
+    return groups
+
+
+def _with_ids(documents):
+    for document in documents:
+        if '_id' not in document:
+            document['_id'] = bson.ObjectId()
+        yield document
+
+
+def _write_documents(path, documents):
+    count = 0
+    with open(path, 'wb') as f:
+        for document in documents:
+            f.write(bson.BSON.encode(document))
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    return count
@@ -0,0 +1,86 @@
+"""
+Compare merging the results of a two key group query by scanning for each
+group and by looking groups up in an index.
+
+    python -m benchmarks.group_merging
+"""
+import copy
+import time
+
+from backdrop.core import database
+
+AUTHORITY_COUNT = 10000
+WEEK_COUNT = 52
+
+
+def legacy_nested_merge(keys, collect, results):
+    """nested_merge as it was before groups were indexed"""
+    groups = []
+    for result in results:
+        collected, result = database.extract_collected_values(collect, result)
+        groups, group = legacy_merge(groups, keys, result)
+        database.insert_collected_values(collected, group)
+
+    database.apply_collection_methods(collect, groups)
+    return groups
+
+
+def legacy_merge(groups, keys, result):
+    keys = list(keys)
+    key = keys.pop(0)
+    is_leaf = (len(keys) == 0)
+    value = result.pop(key)
+
+    group = next((group for group in groups if group[key] == value), None)
+    if not group:
+        if is_leaf:
+            group = database._new_leaf_node(key, value, result.get('_count'))
+        else:
+            group = database._new_branch_node(key, value)
+        groups.append(group)
+
+    if not is_leaf:
+        group['_subgroup'], _ = legacy_merge(group['_subgroup'], keys, result)
+        group['_subgroup'].sort(key=lambda d: d[keys[0]])
+        database._add_branch_node_counts(group)
+    return groups, group
+
+
+def make_results(authority_count, week_count):
+    """Results of the group command for authority and week, newest week
+    first so that every sub-group is re-sorted"""
+    return [{'authority': 'authority-%05d' % authority,
+             '_week_start_at': week_count - week,
+             '_count': 1.0,
+             'value': [float(week)]}
+            for authority in range(authority_count)
+            for week in range(week_count)]
+
+
+def timed(func, results):
+    """Return the time func takes to merge a copy of results, and its
+    output"""
+    results = copy.deepcopy(results)
+    start = time.time()
+    output = func(['authority', '_week_start_at'], [('value', 'sum')],
+                  results)
+    return time.time() - start, output
+
+
+def main():
+    results = make_results(AUTHORITY_COUNT, WEEK_COUNT)
+
+    print "merging %d x %d groups" % (AUTHORITY_COUNT, WEEK_COUNT)
+    # scanning is quadratic in the number of groups, so it is run once
+    legacy_time, legacy_output = timed(legacy_nested_merge, results)
+    indexed_time, indexed_output = min(
+        timed(database.nested_merge, results) for _ in range(3))
+    assert legacy_output == indexed_output
+
+    print "  scanning: %.3fs" % legacy_time
+    print "  indexed:  %.3fs" % indexed_time
+    print "  speedup:  %.1fx" % (legacy_time / indexed_time)
+
+
+if __name__ == '__main__':
+    main()
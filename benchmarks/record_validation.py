@@ -0,0 +1,80 @@
+"""
+Compare record validation before and after the compiled validator.
+
+    python -m benchmarks.record_validation
+"""
+import datetime
+import re
+import timeit
+
+import pytz
+
+from backdrop.core.validation import key_is_valid, key_is_internal, \
+    key_is_reserved, value_is_valid, invalid, valid, \
+    validate_all_record_data
+
+BATCH_SIZE = 10000
+
+
+def legacy_value_is_valid_id(value):
+    if not isinstance(value, basestring):
+        return False
+    if re.compile('\s').search(value):
+        return False
+    return len(value) > 0
+
+
+def legacy_validate_record_data(data):
+    """validate_record_data as it was before RecordValidator"""
+    for key, value in data.items():
+        if not key_is_valid(key):
+            return invalid('{0} is not a valid key'.format(key))
+
+        if key_is_internal(key) and not key_is_reserved(key):
+            return invalid(
+                '{0} is not a recognised internal field'.format(key))
+
+        if not value_is_valid(value):
+            return invalid('{0} has an invalid value'.format(key))
+
+        if key == '_timestamp' and not isinstance(value, datetime.datetime):
+            return invalid(
+                '_timestamp is not a valid datetime object')
+
+        if key == '_id' and not legacy_value_is_valid_id(value):
+            return invalid('_id is not a valid id')
+
+    return valid()
+
+
+def make_batch(size):
+    timestamp = datetime.datetime(2013, 8, 1, tzinfo=pytz.UTC)
+    return [{
+        u'_id': u'2013-08-01.authority-%d' % i,
+        u'_timestamp': timestamp,
+        u'authority': u'Westminster',
+        u'licence_name': u'Temporary events notice',
+        u'type': u'success',
+        u'count': i,
+        u'value': 12.5,
+    } for i in range(size)]
+
+
+def main():
+    batch = make_batch(BATCH_SIZE)
+
+    legacy = min(timeit.repeat(
+        lambda: [legacy_validate_record_data(data) for data in batch],
+        number=1, repeat=5))
+    compiled = min(timeit.repeat(
+        lambda: list(validate_all_record_data(batch)),
+        number=1, repeat=5))
+
+    print "validating %d records" % BATCH_SIZE
+    print "  legacy:   %.4fs" % legacy
+    print "  compiled: %.4fs" % compiled
+    print "  speedup:  %.1fx" % (legacy / compiled)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare parsing timestamps with dateutil and with the strict ISO 8601
+fast path.
+
+    python -m benchmarks.timestamp_parsing
+"""
+import datetime
+import timeit
+
+from dateutil import parser
+import pytz
+
+from backdrop.core.timeutils import parse_time_as_utc, as_utc
+from backdrop.core.validation import value_is_valid_datetime_string, \
+    _is_valid_format, _is_real_date
+
+TIMESTAMP_COUNT = 100000
+
+
+def legacy_parse_time_as_utc(time_string):
+    """parse_time_as_utc as it was before the fast path"""
+    return as_utc(parser.parse(time_string))
+
+
+def legacy_value_is_valid_datetime_string(value):
+    return _is_valid_format(value) and _is_real_date(value)
+
+
+def make_timestamps(count):
+    start = datetime.datetime(2013, 1, 1, tzinfo=pytz.UTC)
+    offsets = ['+00:00', 'Z', '+01:00', '-0500']
+    return [(start + datetime.timedelta(minutes=i)).strftime(
+        '%Y-%m-%dT%H:%M:%S') + offsets[i % len(offsets)]
+        for i in range(count)]
+
+
+def best_of(func, timestamps):
+    return min(timeit.repeat(lambda: [func(t) for t in timestamps],
+                             number=1, repeat=3))
+
+
+def main():
+    timestamps = make_timestamps(TIMESTAMP_COUNT)
+
+    print "parsing %d timestamps" % TIMESTAMP_COUNT
+    for name, legacy, fast in [
+        ("parse_time_as_utc", legacy_parse_time_as_utc, parse_time_as_utc),
+        ("value_is_valid_datetime_string",
+         legacy_value_is_valid_datetime_string,
+         value_is_valid_datetime_string),
+    ]:
+        legacy_time = best_of(legacy, timestamps)
+        fast_time = best_of(fast, timestamps)
+        print "  %s" % name
+        print "    dateutil:  %.3fs" % legacy_time
+        print "    fast path: %.3fs" % fast_time
+        print "    speedup:   %.1fx" % (legacy_time / fast_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Rewrite the ids of the records in a bucket with its configured auto id scheme
+
+Run this after changing the auto id scheme of a bucket in
+BUCKET_AUTO_ID_KEYS so that re-uploaded records replace the existing
+ones rather than being stored alongside them. Buckets whose base64 ids
+include _timestamp cannot be rewritten, as the ids of re-uploaded records
+depend on how their timestamps were written: use the sha1 scheme.
+
+    GOVUK_ENV=production python rewrite_auto_ids.py lpa_volumes
+"""
+import logging
+import os
+
+from argh import arg
+from argh.dispatching import dispatch_command
+
+from backdrop.core.auto_id import auto_id_config, can_regenerate, \
+    generate_ids
+from backdrop.core.streaming import chunks
+from run_migrations import load_config, get_database
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+def rewrite_ids(collection, keys, scheme, batch_size=1000):
+    """Move each record whose id differs from its generated id
+
+    Returns the number of records that were moved. Records are written
+    under their new id before the old one is removed, so running this
+    again after an interruption carries on where it stopped.
+    """
+    if not can_regenerate(keys, scheme):
+        raise ValueError("base64 ids of _timestamp cannot be generated "
+                         "from stored records, use the sha1 scheme")
+    query = dict((key, {"$exists": True}) for key in keys)
+    rewritten = 0
+    for documents in chunks(collection.find(query), batch_size):
+        bulk = collection.initialize_ordered_bulk_op()
+        moved = 0
+        ids = generate_ids(documents, keys, scheme)
+        for document, new_id in zip(documents, ids):
+            old_id = document["_id"]
+            if old_id == new_id:
+                continue
+            document["_id"] = new_id
+            bulk.find({"_id": new_id}).upsert().replace_one(document)
+            bulk.find({"_id": old_id}).remove_one()
+            moved += 1
+        if moved:
+            bulk.execute()
+            rewritten += moved
+            log.info("Rewrote %d ids" % rewritten)
+    return rewritten
+
+
+@arg('bucket', help='The name of the bucket to rewrite')
+@arg('--batch-size', type=int, help='The number of records to move at once')
+def rewrite_auto_ids(bucket, batch_size=1000):
+    config = load_config(os.getenv('GOVUK_ENV', 'development'))
+    keys, scheme = auto_id_config(
+        getattr(config, 'BUCKET_AUTO_ID_KEYS', {}).get(bucket))
+    if not keys:
+        raise SystemExit("%s has no auto id keys configured" % bucket)
+
+    collection = get_database(config)[bucket]
+    log.info("Rewriting %s ids with the %s scheme" % (bucket, scheme))
+    try:
+        rewritten = rewrite_ids(collection, keys, scheme, batch_size)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    log.info("Done, rewrote %d ids" % rewritten)
+
+if __name__ == '__main__':
+    dispatch_command(rewrite_auto_ids)
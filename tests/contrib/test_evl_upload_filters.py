@@ -1,6 +1,8 @@
 from datetime import timedelta
+import itertools
 import unittest
 from hamcrest import assert_that, is_
+from backdrop.core.errors import ParseError
 from backdrop.contrib.evl_upload_filters import service_volumetrics, service_failures, channel_volumetrics, customer_satisfaction
 from tests.support.test_helpers import d_tz
 
@@ -25,6 +27,21 @@ class EVLServiceVolumetrics(unittest.TestCase):
         assert_that(data, is_([["_timestamp", "_id", "timeSpan", "successful_tax_disc", "successful_sorn"],
                                [timestamp, "2013-07-30", "day", 52, 13]]))
 
+    def test_service_volumetrics_reads_only_the_rows_it_needs(self):
+        timestamp = d_tz(2013, 7, 30)
+
+        def rows():
+            for row in self.ignore_rows(2) + [["Date", timestamp]] + \
+                    self.ignore_rows(21) + [["TTS.02", "- Relicense", 52],
+                                            ["TTS.03", "- SORN", 13]]:
+                yield row
+            for _ in itertools.count():
+                raise AssertionError("read past the rows it needs")
+
+        data = list(service_volumetrics(rows()))
+
+        assert_that(data[1], is_([timestamp, "2013-07-30", "day", 52, 13]))
+
     def test_converts_service_failures_data_to_normalised_data(self):
         timestamp = d_tz(2013, 7, 30)
         failures_raw_data = [
@@ -72,6 +89,11 @@ class EVLServiceVolumetrics(unittest.TestCase):
             [timestamp, "2013-07-30.sorn.1",     "sorn",     1, 0,  "No sorn failure"],
         ]))
 
+    def test_workbook_without_a_service_failures_sheet_is_a_parse_error(self):
+        failures = service_failures(iter([["Only sheet"]]))
+
+        self.assertRaises(ParseError, list, failures)
+
     def test_converts_channel_volumetrics_raw_data_to_normalised_data(self):
         monday = d_tz(2013, 7, 29)
         tuesday = monday + timedelta(days=1)
@@ -8,6 +8,7 @@ from hamcrest import *
 from backdrop.core import database, bucket
 from backdrop.core.records import Record
 from backdrop.read.query import Query
+from rewrite_auto_ids import rewrite_ids
 from tests.support.test_helpers import d_tz
 
 HOST = 'localhost'
@@ -76,3 +77,20 @@ class TestBucketIntegration(unittest.TestCase):
             has_entry('_start_at', d_tz(2013, 1, 28)),
             has_entry('_start_at', d_tz(2013, 2, 25))
         ))
+
+    def test_rewritten_ids_are_replaced_by_re_uploaded_rows(self):
+        rows = [
+            {"_timestamp": "2013-08-01T01:00:00+01:00", "key": "foo"},
+            {"_timestamp": "2013-08-02T00:00:00Z", "key": "bar"},
+        ]
+        keys = ["_timestamp", "key"]
+        base64_bucket = bucket.Bucket(self.db, BUCKET, generate_id_from=keys)
+        sha1_bucket = bucket.Bucket(self.db, BUCKET, generate_id_from=keys,
+                                    auto_id_scheme="sha1")
+        base64_bucket.store(base64_bucket.parse([dict(row) for row in rows]))
+
+        rewritten = rewrite_ids(self.mongo_collection, keys, "sha1")
+        sha1_bucket.store(sha1_bucket.parse([dict(row) for row in rows]))
+
+        assert_that(rewritten, is_(2))
+        assert_that(self.mongo_collection.count(), is_(2))
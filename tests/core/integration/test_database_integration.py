@@ -5,7 +5,8 @@ from hamcrest import *
 from pymongo import MongoClient
 
 from backdrop.core.database import Repository, GroupingError, \
-    InvalidSortError, MongoDriver, Database
+    InvalidSortError, MongoDriver, Database, GROUP_ENGINES, \
+    InvalidOperationError
 from backdrop.read.query import Query
 from tests.support.test_helpers import d, d_tz
 
@@ -44,6 +45,29 @@ class TestMongoDriver(unittest.TestCase):
 
         assert_that(saved_documents, only_contains(updated_document))
 
+    def test_save_all(self):
+        self.mongo_driver.save_all([
+            {'name': 'test_document'},
+            {'_id': 'event1', 'title': "I'm an event"},
+            {'_id': 'event1', 'title': "I'm another event"},
+        ])
+
+        results = self.mongo_collection.find()
+        assert_that(results, contains_inanyorder(
+            has_entries({'name': 'test_document'}),
+            has_entries({'_id': 'event1', 'title': "I'm another event"})
+        ))
+
+    def test_save_all_updates_documents_with_id(self):
+        self.mongo_driver.save({"_id": "event1", "title": "I'm an event"})
+
+        self.mongo_driver.save_all([
+            {"_id": "event1", "title": "I'm another event"}
+        ])
+
+        assert_that(self.mongo_collection.find(), only_contains(
+            {"_id": "event1", "title": "I'm another event"}))
+
     def test_find(self):
         self._setup_people()
 
@@ -56,6 +80,18 @@ class TestMongoDriver(unittest.TestCase):
             has_entries({"name": "John", "plays": "guitar"}),
         ))
 
+    def test_find_leaves_out_the_content_hash(self):
+        driver = MongoDriver(self.mongo_collection, skip_unchanged=True)
+        driver.save_all([{"_id": "a", "name": "Alice"}])
+
+        results = list(driver.find({}, ["_id", "ascending"], None))
+
+        assert_that(self.mongo_collection.find_one(),
+                    has_key("_content_hash"))
+        assert_that(results, contains(all_of(
+            has_entries({"_id": "a", "name": "Alice"}),
+            is_not(has_key("_content_hash")))))
+
     def test_find_sort_descending(self):
         self._setup_people()
 
@@ -214,10 +250,11 @@ class TestMongoDriver(unittest.TestCase):
 
 class RepositoryIntegrationTest(unittest.TestCase):
     __metaclass__ = ABCMeta
+    group_engine = "group"
 
     def setUp(self):
         mongo = MongoDriver(MongoClient(HOST, PORT)[DB_NAME][BUCKET])
-        self.repo = Repository(mongo)
+        self.repo = Repository(mongo, group_engine=self.group_engine)
 
         self.mongo_collection = MongoClient(HOST, PORT)[DB_NAME][BUCKET]
         self.mongo_collection.drop()
@@ -473,6 +510,11 @@ class TestRepositoryIntegration_Grouping(RepositoryIntegrationTest):
         })))
 
 
+class TestRepositoryIntegration_GroupingWithAggregate(
+        TestRepositoryIntegration_Grouping):
+    group_engine = "aggregate"
+
+
 class TestRepositoryIntegration_MultiGroupWithMissingFields(
         RepositoryIntegrationTest):
     def test_query_for_data_with_different_missing_fields_no_results(self):
@@ -531,6 +573,11 @@ class TestRepositoryIntegration_MultiGroupWithMissingFields(
         assert_that(result, has_item(has_entry("_group_count", 1)))
 
 
+class TestRepositoryIntegration_MultiGroupWithMissingFieldsWithAggregate(
+        TestRepositoryIntegration_MultiGroupWithMissingFields):
+    group_engine = "aggregate"
+
+
 class TestRepositoryIntegration_Sorting(RepositoryIntegrationTest):
     def setup_numeric_values(self):
         self.mongo_collection.save({"value": 6})
@@ -711,6 +758,179 @@ class TestRepositoryIntegration_Sorting(RepositoryIntegrationTest):
         assert_that(result, has_item(has_entry("_count", 1)))
 
 
+class TestRepositoryIntegration_SortingWithAggregate(
+        TestRepositoryIntegration_Sorting):
+    group_engine = "aggregate"
+
+
+class TestRepositoryIntegration_GroupEngines(RepositoryIntegrationTest):
+    """Both group engines give the same results from the same documents"""
+    def setUp(self):
+        super(TestRepositoryIntegration_GroupEngines, self).setUp()
+        self.repos = dict(
+            (engine, Repository(MongoDriver(self.mongo_collection),
+                                group_engine=engine))
+            for engine in GROUP_ENGINES)
+        for document in [
+            {"kind": "a", "size": "s", "number": 2, "mixed": None,
+             "label": "x"},
+            {"kind": "a", "size": "l", "number": 3.5, "mixed": "two",
+             "label": "y"},
+            {"kind": "a", "size": "l", "number": True, "label": None},
+            {"kind": "b", "size": "s", "number": False, "mixed": 1,
+             "label": "x"},
+            {"kind": "b", "size": "s", "mixed": 4},
+            {"kind": "c", "size": "m", "number": 7, "mixed": None},
+            {"size": "s", "number": 100},
+        ]:
+            self.mongo_collection.save(document)
+
+    def results(self, engine, method, *args, **kwargs):
+        try:
+            results = getattr(self.repos[engine], method)(*args, **kwargs)
+        except InvalidOperationError:
+            return "InvalidOperationError"
+        if "sort" not in kwargs:
+            results.sort(key=lambda group: group["kind"])
+        return results
+
+    def assert_same_results(self, *args, **kwargs):
+        expected = self.results("group", *args, **kwargs)
+
+        assert_that(self.results("aggregate", *args, **kwargs),
+                    is_(expected))
+        return expected
+
+    def test_counts_and_sets_include_nulls(self):
+        collect = [("mixed", "count"), ("mixed", "set"), ("label", "set"),
+                   ("label", "default")]
+
+        results = self.assert_same_results(
+            "group", "kind", Query.create(), collect=collect)
+        self.assert_same_results(
+            "multi_group", "kind", "size", Query.create(), collect=collect)
+
+        assert_that(results[0], has_entries({
+            "kind": "a", "mixed:count": 2, "mixed:set": [None, "two"],
+            "label:set": [None, "x", "y"]}))
+
+    def test_numbers_and_booleans_are_summed(self):
+        collect = [("number", "sum"), ("number", "mean")]
+
+        results = self.assert_same_results(
+            "group", "kind", Query.create(), collect=collect)
+        self.assert_same_results(
+            "multi_group", "kind", "size", Query.create(), collect=collect)
+
+        assert_that(results, contains(
+            has_entries({"number:sum": 6.5, "number:mean": 6.5 / 3}),
+            has_entries({"number:sum": 0, "number:mean": 0}),
+            has_entries({"number:sum": 7, "number:mean": 7}),
+        ))
+
+    def test_values_that_are_not_numbers_cannot_be_summed(self):
+        for method in ["sum", "mean"]:
+            results = self.assert_same_results(
+                "group", "kind", Query.create(),
+                collect=[("mixed", method)])
+
+            assert_that(results, is_("InvalidOperationError"))
+
+    def test_sorted_and_limited_groups_are_the_same(self):
+        collect = [("number", "sum"), ("label", "set")]
+        for sort in [["_count", "descending"], ["number:sum", "ascending"],
+                     ["kind", "descending"]]:
+            self.assert_same_results(
+                "group", "kind", Query.create(), sort=sort, limit=2,
+                collect=collect)
+            self.assert_same_results(
+                "multi_group", "kind", "size", Query.create(), sort=sort,
+                limit=2, collect=collect)
+
+
+class TestRepositoryIntegration_TopGroupsWithAggregate(
+        RepositoryIntegrationTest):
+    """Top level groups are sorted and limited in the $group pipeline"""
+    group_engine = "aggregate"
+
+    def setUp(self):
+        super(TestRepositoryIntegration_TopGroupsWithAggregate,
+              self).setUp()
+        for region, channel, value in [
+            ("north", "web", 10), ("north", "web", 20),
+            ("north", "phone", 1),
+            ("south", "web", 5), ("south", "phone", 5),
+            ("east", "web", 100),
+            ("west", "phone", 2), ("west", "phone", 4), ("west", "web", 3),
+            ("west", "post", 2),
+        ]:
+            self.mongo_collection.save(
+                {"region": region, "channel": channel, "value": value})
+        # a group with no values has no mean
+        self.mongo_collection.save({"region": "none", "channel": "web"})
+
+    def top_groups(self, sort, keys=("region",),
+                   collect=(("value", "sum"), ("value", "mean"))):
+        collect = list(collect)
+        if len(keys) > 1:
+            return self.repo.multi_group(keys[0], keys[1], Query.create(),
+                                         sort=sort, limit=2, collect=collect)
+        return self.repo.group(keys[0], Query.create(), sort=sort, limit=2,
+                               collect=collect)
+
+    def test_top_groups_by_count(self):
+        for keys in [("region",), ("region", "channel")]:
+            results = self.top_groups(["_count", "descending"], keys)
+
+            assert_that(results, contains(
+                has_entries({"region": "west", "_count": 4,
+                             "value:sum": 11}),
+                has_entries({"region": "north", "_count": 3,
+                             "value:sum": 31}),
+            ))
+
+    def test_top_groups_by_sum(self):
+        for keys in [("region",), ("region", "channel")]:
+            results = self.top_groups(["value:sum", "descending"], keys)
+
+            assert_that(results, contains(
+                has_entries({"region": "east", "value:sum": 100}),
+                has_entries({"region": "north", "value:sum": 31}),
+            ))
+
+    def test_top_groups_by_mean(self):
+        for keys in [("region",), ("region", "channel")]:
+            results = self.top_groups(["value:mean", "descending"], keys)
+
+            assert_that(results, contains(
+                has_entries({"region": "east", "value:mean": 100}),
+                has_entries({"region": "north", "value:mean": 31 / 3.0}),
+            ))
+
+    def test_bottom_groups_by_sum(self):
+        results = self.top_groups(["value:sum", "ascending"],
+                                  collect=[("value", "sum")])
+
+        assert_that(results, contains(
+            has_entries({"region": "none", "value:sum": 0}),
+            has_entries({"region": "south", "value:sum": 10}),
+        ))
+
+    def test_multi_key_top_groups_keep_their_subgroups(self):
+        results = self.top_groups(["_count", "descending"],
+                                  ("region", "channel"))
+
+        assert_that(results[0], has_entries({
+            "region": "west",
+            "_group_count": 3,
+            "_subgroup": contains(
+                has_entries({"channel": "phone", "_count": 2}),
+                has_entries({"channel": "post", "_count": 1}),
+                has_entries({"channel": "web", "_count": 1}),
+            ),
+        }))
+
+
 class TestDatabase(unittest.TestCase):
     def setUp(self):
         self.db = Database('localhost', 27017, 'backdrop_test')
@@ -2,8 +2,12 @@ from base64 import b64encode, b64decode
 import unittest
 from hamcrest import *
 from nose.tools import raises
+from backdrop.core.auto_id import auto_id_config, can_regenerate, \
+    generate_ids
 from backdrop.core.bucket import Bucket
-from backdrop.core.errors import ValidationError
+from backdrop.core.errors import ParseError, ValidationError
+from backdrop.core.records import Record
+from tests.support.test_helpers import d_tz
 from tests.core.test_bucket import mock_repository, mock_database
 
 
@@ -23,10 +27,10 @@ class TestBucketAutoIdGeneration(unittest.TestCase):
 
         bucket.parse_and_store(objects)
 
-        self.mock_repository.save.assert_called_once_with({
+        self.mock_repository.save_all.assert_called_once_with([{
             "_id": b64encode("def"),
             "abc": "def"
-        })
+        }])
 
     def test_auto_id_generation(self):
         objects = [{
@@ -40,12 +44,12 @@ class TestBucketAutoIdGeneration(unittest.TestCase):
 
         bucket.parse_and_store(objects)
 
-        self.mock_repository.save.assert_called_once_with({
+        self.mock_repository.save_all.assert_called_once_with([{
             "_id": b64encode("WC2B 6SE.125"),
             "postcode": "WC2B 6SE",
             "number": "125",
             "name": "Aviation House"
-        })
+        }])
 
     def test_no_id_generated_if_auto_id_is_none(self):
         object = {
@@ -58,7 +62,7 @@ class TestBucketAutoIdGeneration(unittest.TestCase):
 
         bucket.parse_and_store([object])
 
-        self.mock_repository.save.assert_called_once_with(object)
+        self.mock_repository.save_all.assert_called_once_with([object])
 
     @raises(ValidationError)
     def test_validation_error_if_auto_id_property_is_missing(self):
@@ -83,7 +87,103 @@ class TestBucketAutoIdGeneration(unittest.TestCase):
         bucket = Bucket(self.mock_database, "bucket", generate_id_from=auto_id)
         bucket.parse_and_store(objects)
 
-        saved_object = self.mock_repository.save.call_args[0][0]
+        saved_object = self.mock_repository.save_all.call_args[0][0][0]
 
         assert_that(b64decode(saved_object['_id']),
                     is_("2013-08-01T00:00:00+00:00.bar"))
+
+    def test_sha1_ids_are_fixed_width(self):
+        objects = [{"key": "a" * 200}, {"key": "b"}]
+
+        bucket = Bucket(self.mock_database, "bucket",
+                        generate_id_from=["key"], auto_id_scheme="sha1")
+        bucket.parse_and_store(objects)
+
+        saved_objects = self.mock_repository.save_all.call_args[0][0]
+        assert_that(len(saved_objects[0]['_id']), is_(40))
+        assert_that(len(saved_objects[1]['_id']), is_(40))
+
+    def test_records_missing_auto_id_keys_are_rejected(self):
+        bucket = Bucket(self.mock_database, "bucket",
+                        generate_id_from=["key"])
+
+        records, rejected = bucket.parse_valid(
+            [{"key": "a"}, {"foo": "b"}], offset=5)
+
+        assert_that(records, has_length(1))
+        assert_that(rejected, contains(has_entry("index", 6)))
+
+
+class TestGenerateIds(unittest.TestCase):
+    def test_base64_ids_are_unchanged(self):
+        ids = generate_ids([{"a": "WC2B 6SE", "b": u"125"}], ["a", "b"])
+
+        assert_that(ids, is_([b64encode("WC2B 6SE.125")]))
+
+    def test_base64_ids_can_be_generated_from_non_strings(self):
+        ids = generate_ids([{"a": d_tz(2013, 8, 1), "b": 12}], ["a", "b"])
+
+        assert_that(b64decode(ids[0]), is_("2013-08-01T00:00:00+00:00.12"))
+
+    def test_sha1_ids_are_the_same_for_the_same_time(self):
+        ids = generate_ids([
+            {"_timestamp": "2013-08-01T01:00:00+01:00", "key": "foo"},
+            {"_timestamp": "2013-08-01T00:00:00Z", "key": "foo"},
+            {"_timestamp": d_tz(2013, 8, 1), "key": "foo"},
+        ], ["_timestamp", "key"], "sha1")
+
+        assert_that(ids[0], is_(ids[1]))
+        assert_that(ids[0], is_(ids[2]))
+
+    def test_sha1_ids_do_not_collide_on_separators(self):
+        ids = generate_ids([{"a": "x.y", "b": "z"}, {"a": "x", "b": "y.z"}],
+                           ["a", "b"], "sha1")
+
+        assert_that(ids[0], is_not(ids[1]))
+
+    def test_invalid_timestamp_raises_parse_error(self):
+        self.assertRaises(ParseError, generate_ids,
+                          [{"_timestamp": "foobar"}], ["_timestamp"], "sha1")
+
+    def test_unknown_scheme_raises_value_error(self):
+        self.assertRaises(ValueError, generate_ids, [], ["a"], "md5")
+
+
+class TestCanRegenerate(unittest.TestCase):
+    def stored(self, datum):
+        return Record(dict(datum, _timestamp=d_tz(2013, 8, 1))).to_mongo()
+
+    def test_base64_ids_of_timestamps_cannot_be_regenerated(self):
+        datum = {"_timestamp": "2013-08-01T01:00:00+01:00", "key": "foo"}
+        keys = ["_timestamp", "key"]
+
+        assert_that(can_regenerate(keys, "base64"), is_(False))
+        assert_that(generate_ids([self.stored(datum)], keys),
+                    is_not(generate_ids([datum], keys)))
+
+    def test_sha1_ids_of_timestamps_can_be_regenerated(self):
+        datum = {"_timestamp": "2013-08-01T01:00:00+01:00", "key": "foo"}
+        keys = ["_timestamp", "key"]
+
+        assert_that(can_regenerate(keys, "sha1"), is_(True))
+        assert_that(generate_ids([self.stored(datum)], keys, "sha1"),
+                    is_(generate_ids([datum], keys, "sha1")))
+
+    def test_base64_ids_of_other_keys_can_be_regenerated(self):
+        datum = {"_timestamp": "2013-08-01T00:00:00Z", "key": u"f\xf6o"}
+
+        assert_that(can_regenerate(["key"], "base64"), is_(True))
+        assert_that(generate_ids([self.stored(datum)], ["key"]),
+                    is_(generate_ids([datum], ["key"])))
+
+
+class TestAutoIdConfig(unittest.TestCase):
+    def test_a_list_of_keys_uses_base64(self):
+        assert_that(auto_id_config(["a", "b"]), is_((["a", "b"], "base64")))
+
+    def test_the_scheme_can_be_chosen(self):
+        assert_that(auto_id_config({"keys": ["a"], "scheme": "sha1"}),
+                    is_((["a"], "sha1")))
+
+    def test_no_keys(self):
+        assert_that(auto_id_config(None), is_((None, "base64")))
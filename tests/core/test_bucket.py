@@ -45,12 +45,106 @@ class TestBucket(unittest.TestCase):
 
         self.bucket.store(my_records)
 
-        self.mock_repository.save.assert_has_calls([
-            call({'name': "Groucho"}),
-            call({"name": "Harpo"}),
-            call({"name": "Chico"})
+        self.mock_repository.save_all.assert_called_once_with([
+            {'name': "Groucho"},
+            {"name": "Harpo"},
+            {"name": "Chico"}
         ])
 
+    def test_that_valid_data_is_stored_in_chunks(self):
+        self.bucket.parse_and_store_in_chunks(
+            ({"num": i} for i in range(5)), 2)
+
+        assert_that(self.mock_repository.save_all.call_args_list, is_([
+            call([{"num": 0}, {"num": 1}]),
+            call([{"num": 2}, {"num": 3}]),
+            call([{"num": 4}]),
+        ]))
+
+    def test_that_nothing_is_stored_if_a_later_chunk_is_invalid(self):
+        data = [{"num": 1}, {"num": 2}, {"num": 3}, {"_id": "f o o"}]
+
+        try:
+            self.bucket.parse_and_store_in_chunks(iter(data), 2)
+            self.fail("expected a ValidationError")
+        except bucket.ValidationError as e:
+            assert_that(str(e), starts_with("record at index 3:"))
+
+        assert_that(self.mock_repository.save_all.called, is_(False))
+
+    def test_that_chunks_before_an_error_are_stored_when_streaming(self):
+        data = [{"num": 1}, {"num": 2}, {"num": 3}, {"_id": "f o o"}]
+
+        self.assertRaises(bucket.ValidationError,
+                          self.bucket.parse_and_store_in_chunks,
+                          iter(data), 2, all_or_nothing=False)
+
+        self.mock_repository.save_all.assert_called_once_with(
+            [{"num": 1}, {"num": 2}])
+
+    def test_progress_is_reported_after_each_chunk(self):
+        progress = Mock()
+
+        self.bucket.parse_and_store_in_chunks(
+            ({"num": i} for i in range(3)), 2, progress=progress)
+
+        assert_that(progress.call_args_list, is_([
+            call(2, 0), call(3, 0), call(3, 2), call(3, 3)]))
+
+    def test_progress_is_reported_after_each_chunk_when_streaming(self):
+        progress = Mock()
+
+        self.bucket.parse_and_store_in_chunks(
+            ({"num": i} for i in range(3)), 2, all_or_nothing=False,
+            progress=progress)
+
+        assert_that(progress.call_args_list, is_([call(2, 2), call(3, 3)]))
+
+    def test_records_already_stored_are_not_stored_again(self):
+        progress = Mock()
+
+        self.bucket.parse_and_store_in_chunks(
+            ({"num": i} for i in range(5)), 2, progress=progress,
+            already_stored=2)
+
+        assert_that(self.mock_repository.save_all.call_args_list, is_([
+            call([{"num": 2}, {"num": 3}]),
+            call([{"num": 4}]),
+        ]))
+        assert_that(progress.call_args_list[-1], is_(call(5, 5)))
+
+    def test_records_already_stored_are_not_stored_again_when_streaming(self):
+        self.bucket.parse_and_store_in_chunks(
+            ({"num": i} for i in range(5)), 2, all_or_nothing=False,
+            already_stored=3)
+
+        assert_that(self.mock_repository.save_all.call_args_list, is_([
+            call([{"num": 3}]),
+            call([{"num": 4}]),
+        ]))
+
+    def test_write_counts_of_each_chunk_are_added_up(self):
+        self.mock_repository.save_all.side_effect = [
+            {"inserted": 1, "updated": 1, "unchanged": 0},
+            {"inserted": 0, "updated": 0, "unchanged": 1},
+        ]
+
+        counts = self.bucket.parse_and_store_in_chunks(
+            ({"num": i} for i in range(3)), 2)
+
+        assert_that(counts, is_({"inserted": 1, "updated": 1,
+                                 "unchanged": 1}))
+
+    def test_validate_in_chunks_reports_invalid_records(self):
+        data = [{"num": 1}, {"_id": "f o o"}, {"num": 3}]
+
+        valid, rejected = self.bucket.validate_in_chunks(iter(data), 2)
+
+        assert_that(valid, is_(2))
+        assert_that(rejected, contains(has_entries({"index": 1})))
+        assert_that(self.mock_repository.save_all.called, is_(False))
+        assert_that(self.mock_repository.save.called, is_(False))
+
     def test_filter_by_query(self):
         self.bucket.query(Query.create(filter_by=[['name', 'Chico']]))
         self.mock_repository.find.assert_called_once()
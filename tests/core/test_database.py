@@ -1,6 +1,7 @@
 import unittest
 from hamcrest import assert_that, is_
-from mock import Mock, patch
+from mock import Mock, patch, call
+from bson import SON
 from pymongo.errors import AutoReconnect
 from backdrop.core import database
 from backdrop.core.database import Repository, InvalidSortError, InvalidOperationError, MongoDriver, apply_collection_method
@@ -34,6 +35,482 @@ class DatabaseTestCase(unittest.TestCase):
 
         assert_that(self.collection.save.call_count, is_(1))
 
+    def test_find_leaves_out_the_content_hash(self):
+        self.driver.find({"plays": "guitar"}, ["name", "ascending"], None)
+
+        self.collection.find.assert_called_once_with(
+            {"plays": "guitar"}, fields={"_content_hash": False})
+
+
+class BulkSaveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.bulk = Mock()
+        self.collection.initialize_unordered_bulk_op.return_value = self.bulk
+        self.driver = MongoDriver(self.collection, batch_size=2)
+
+    def test_save_all_inserts_documents_without_id(self):
+        self.driver.save_all([{"name": "Groucho"}])
+
+        self.bulk.insert.assert_called_once_with({"name": "Groucho"})
+        assert_that(self.bulk.find.called, is_(False))
+
+    def test_save_all_upserts_documents_with_id(self):
+        self.driver.save_all([{"_id": "groucho", "name": "Groucho"}])
+
+        self.bulk.find.assert_called_once_with({"_id": "groucho"})
+        self.bulk.find.return_value.upsert.return_value.replace_one\
+            .assert_called_once_with({"_id": "groucho", "name": "Groucho"})
+        assert_that(self.bulk.insert.called, is_(False))
+
+    def test_save_all_writes_in_batches(self):
+        self.driver.save_all([{"a": 1}, {"a": 2}, {"a": 3}])
+
+        assert_that(self.collection.initialize_unordered_bulk_op.call_count,
+                    is_(2))
+        assert_that(self.bulk.execute.call_count, is_(2))
+
+    def test_save_all_does_nothing_for_no_documents(self):
+        self.driver.save_all([])
+
+        assert_that(self.bulk.execute.called, is_(False))
+
+    def test_save_all_keeps_the_last_document_for_each_id(self):
+        self.driver.save_all([
+            {"_id": "a", "value": 1},
+            {"_id": "b", "value": 2},
+            {"_id": "a", "value": 3},
+        ])
+
+        replace_one = \
+            self.bulk.find.return_value.upsert.return_value.replace_one
+        assert_that(replace_one.call_args_list, is_([
+            call({"_id": "b", "value": 2}),
+            call({"_id": "a", "value": 3}),
+        ]))
+
+    def test_save_all_retries_a_batch_on_auto_reconnect(self):
+        self.bulk.execute.side_effect = [AutoReconnect, None]
+
+        self.driver.save_all([{"a": 1}])
+
+        assert_that(self.bulk.execute.call_count, is_(2))
+
+    def test_save_all_stops_retrying_a_batch_after_3_attempts(self):
+        self.bulk.execute.side_effect = AutoReconnect
+
+        self.assertRaises(AutoReconnect, self.driver.save_all, [{"a": 1}])
+
+        assert_that(self.bulk.execute.call_count, is_(3))
+
+    def test_save_all_uses_the_connection_write_concern_by_default(self):
+        self.driver.save_all([{"a": 1}])
+
+        self.bulk.execute.assert_called_once_with(None)
+
+    def test_save_all_uses_the_write_concern_of_the_profile(self):
+        driver = MongoDriver(self.collection, write_concern="journaled")
+
+        driver.save_all([{"a": 1}])
+
+        self.bulk.execute.assert_called_once_with({"w": 1, "j": True})
+
+    def test_save_all_can_write_ordered_batches(self):
+        self.collection.initialize_ordered_bulk_op.return_value = self.bulk
+        driver = MongoDriver(self.collection, ordered=True)
+
+        driver.save_all([{"a": 1}])
+
+        assert_that(self.collection.initialize_unordered_bulk_op.called,
+                    is_(False))
+        assert_that(self.bulk.execute.call_count, is_(1))
+
+    def test_save_uses_the_write_concern_of_the_profile(self):
+        driver = MongoDriver(self.collection, write_concern="unacknowledged")
+
+        driver.save({"a": 1})
+
+        self.collection.save.assert_called_once_with({"a": 1}, w=0)
+
+
+class SkipUnchangedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.bulk = Mock()
+        self.collection.initialize_unordered_bulk_op.return_value = self.bulk
+        self.driver = MongoDriver(self.collection, skip_unchanged=True)
+
+    def given_stored(self, *docs):
+        self.collection.find.return_value = [
+            {"_id": doc["_id"], "_content_hash": database.content_hash(doc)}
+            for doc in docs]
+
+    def test_only_new_and_changed_documents_are_written(self):
+        self.given_stored({"_id": "a", "value": 1},
+                          {"_id": "b", "value": 2})
+
+        counts = self.driver.save_all([
+            {"_id": "a", "value": 1},
+            {"_id": "b", "value": 3},
+            {"_id": "c", "value": 4},
+        ])
+
+        assert_that(counts, is_({"inserted": 1, "updated": 1,
+                                 "unchanged": 1}))
+        replace_one = \
+            self.bulk.find.return_value.upsert.return_value.replace_one
+        assert_that([c[0][0]["_id"] for c in replace_one.call_args_list],
+                    is_(["b", "c"]))
+        self.collection.find.assert_called_once_with(
+            {"_id": {"$in": ["a", "b", "c"]}}, {"_content_hash": True})
+
+    def test_documents_are_stored_with_their_content_hash(self):
+        self.given_stored()
+
+        self.driver.save_all([{"_id": "a", "value": 1}])
+
+        replace_one = \
+            self.bulk.find.return_value.upsert.return_value.replace_one
+        replace_one.assert_called_once_with({
+            "_id": "a", "value": 1,
+            "_content_hash": database.content_hash({"value": 1})})
+
+    def test_nothing_is_written_if_nothing_changed(self):
+        self.given_stored({"_id": "a", "value": 1})
+
+        self.driver.save_all([{"_id": "a", "value": 1}])
+
+        assert_that(self.bulk.execute.called, is_(False))
+
+    def test_content_hash_ignores_the_id_and_update_time(self):
+        assert_that(
+            database.content_hash({"_id": "a", "value": 1,
+                                   "_updated_at": d_tz(2013, 1, 1)}),
+            is_(database.content_hash({"value": 1,
+                                       "_updated_at": d_tz(2014, 1, 1)})))
+
+    def test_counts_are_not_reported_without_skip_unchanged(self):
+        driver = MongoDriver(self.collection)
+
+        assert_that(driver.save_all([{"_id": "a"}]), is_(None))
+        assert_that(self.collection.find.called, is_(False))
+
+
+@patch("pymongo.MongoClient")
+class WriteProfilesTestCase(unittest.TestCase):
+    def test_repositories_get_the_profile_of_their_bucket(self, client):
+        db = database.Database("localhost", 27017, "backdrop", write_profiles={
+            "foo_realtime": {"write_concern": "unacknowledged",
+                             "batch_size": 5000,
+                             "ordered": True}
+        })
+
+        driver = db.get_repository("foo_realtime")._mongo
+
+        assert_that(driver.write_concern, is_({"w": 0}))
+        assert_that(driver.batch_size, is_(5000))
+        assert_that(driver.ordered, is_(True))
+
+    def test_buckets_without_a_profile_get_the_defaults(self, client):
+        db = database.Database("localhost", 27017, "backdrop", batch_size=10,
+                               write_profiles={"foo": {"ordered": True}})
+
+        driver = db.get_repository("bar")._mongo
+
+        assert_that(driver.write_concern, is_(None))
+        assert_that(driver.batch_size, is_(10))
+        assert_that(driver.ordered, is_(False))
+
+    def test_unknown_write_concerns_are_rejected(self, client):
+        self.assertRaises(ValueError, database.Database,
+                          "localhost", 27017, "backdrop",
+                          write_profiles={"foo": {"write_concern": "w2"}})
+
+    def test_buckets_get_their_group_engine(self, client):
+        db = database.Database("localhost", 27017, "backdrop",
+                               group_engines={"foo": "aggregate"})
+
+        assert_that(db.get_repository("foo").group_engine, is_("aggregate"))
+        assert_that(db.get_repository("bar").group_engine, is_("group"))
+
+    def test_unknown_group_engines_are_rejected(self, client):
+        self.assertRaises(ValueError, database.Database,
+                          "localhost", 27017, "backdrop",
+                          group_engines={"foo": "map_reduce"})
+
+
+class AggregateGroupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.collection.aggregate.return_value = []
+        self.driver = MongoDriver(self.collection)
+
+    def test_pipeline_groups_by_keys_and_accumulates_collected_fields(self):
+        self.driver.aggregate_group(
+            ["a", "b"], {"x": 1}, [("c", "sum"), ("d", "mean"),
+                                   ("e", "set")])
+
+        [pipeline], kwargs = self.collection.aggregate.call_args
+        assert_that(pipeline[:2], is_([
+            {"$match": {"x": 1, "a": {"$ne": None}, "b": {"$ne": None}}},
+            {"$group": {
+                "_id": {"k0": "$a", "k1": "$b"},
+                "_count": {"$sum": 1},
+                "f0_sum": {"$sum": "$c"},
+                "f0_count": {"$sum": {"$cond": [{"$gte": ["$c", None]},
+                                                1, 0]}},
+                "f0_numbers": {"$sum": {"$cond": [
+                    {"$and": [{"$gt": ["$c", None]}, {"$lt": ["$c", ""]}]},
+                    1, 0]}},
+                "f0_booleans": {"$sum": {"$cond": [
+                    {"$or": [{"$eq": ["$c", True]}, {"$eq": ["$c", False]}]},
+                    1, 0]}},
+                "f0_trues": {"$sum": {"$cond": [{"$eq": ["$c", True]},
+                                                1, 0]}},
+                "f1_sum": {"$sum": "$d"},
+                "f1_count": {"$sum": {"$cond": [{"$gte": ["$d", None]},
+                                                1, 0]}},
+                "f1_numbers": {"$sum": {"$cond": [
+                    {"$and": [{"$gt": ["$d", None]}, {"$lt": ["$d", ""]}]},
+                    1, 0]}},
+                "f1_booleans": {"$sum": {"$cond": [
+                    {"$or": [{"$eq": ["$d", True]}, {"$eq": ["$d", False]}]},
+                    1, 0]}},
+                "f1_trues": {"$sum": {"$cond": [{"$eq": ["$d", True]},
+                                                1, 0]}},
+                "f2_set": {"$addToSet": "$e"},
+            }},
+        ]))
+        assert_that(kwargs, is_({"cursor": {}, "allowDiskUse": True}))
+
+    def test_top_level_groups_are_sorted_and_limited_in_the_pipeline(self):
+        self.driver.aggregate_group(["a"], {}, [("c", "sum")],
+                                    sort=["c:sum", "descending"], limit=10)
+
+        [pipeline], _ = self.collection.aggregate.call_args
+        assert_that(pipeline[2:], is_([
+            {"$project": {"_count": 1, "f0_sum": 1, "f0_count": 1,
+                          "f0_numbers": 1, "f0_booleans": 1, "f0_trues": 1,
+                          "_sort": {"$add": ["$f0_sum", "$f0_trues"]}}},
+            {"$sort": SON([("_sort", -1), ("_id", 1)])},
+            {"$limit": 10},
+        ]))
+
+    def test_multi_key_groups_are_rolled_up_before_sorting(self):
+        self.driver.aggregate_group(["a", "b"], {}, [("c", "mean")],
+                                    sort=["_count", "ascending"], limit=5)
+
+        [pipeline], _ = self.collection.aggregate.call_args
+        assert_that(pipeline[2], is_({"$group": {
+            "_id": {"k0": "$_id.k0"},
+            "_count": {"$sum": "$_count"},
+            "_group_count": {"$sum": 1},
+            "_rows": {"$push": "$$ROOT"},
+            "f0_sum": {"$sum": "$f0_sum"},
+            "f0_count": {"$sum": "$f0_count"},
+            "f0_numbers": {"$sum": "$f0_numbers"},
+            "f0_booleans": {"$sum": "$f0_booleans"},
+            "f0_trues": {"$sum": "$f0_trues"},
+        }}))
+        assert_that(pipeline[3]["$project"]["_sort"], is_("$_count"))
+        assert_that(pipeline[5], is_({"$limit": 5}))
+
+    def test_multi_key_groups_are_not_rolled_up_without_sort_or_limit(self):
+        self.driver.aggregate_group(["a", "b"], {}, [("c", "set")])
+
+        [pipeline], _ = self.collection.aggregate.call_args
+        assert_that([stage.keys() for stage in pipeline],
+                    is_([["$match"], ["$group"]]))
+
+    def test_multi_key_groups_are_rolled_up_to_be_limited(self):
+        self.driver.aggregate_group(["a", "b"], {}, [], limit=5)
+
+        [pipeline], _ = self.collection.aggregate.call_args
+        assert_that(pipeline[2]["$group"]["_id"], is_({"k0": "$_id.k0"}))
+        assert_that(pipeline[3], is_({"$limit": 5}))
+
+    def test_sort_expressions(self):
+        collect = [("c", "sum"), ("c", "mean"), ("d", "set")]
+        expression = lambda key: database.pipeline_sort_expression(
+            ["a", "b"], collect, key)
+
+        assert_that(expression("a"), is_("$_id.k0"))
+        assert_that(expression("_group_count"), is_("$_group_count"))
+        assert_that(expression("c:sum"),
+                    is_({"$add": ["$f0_sum", "$f0_trues"]}))
+        assert_that(expression("c:mean"), is_({"$cond": [
+            {"$eq": ["$f0_count", 0]}, None,
+            {"$divide": [{"$add": ["$f0_sum", "$f0_trues"]},
+                         "$f0_count"]}]}))
+        assert_that(expression("b"), is_(None))
+        assert_that(expression("d:set"), is_(None))
+        assert_that(expression("c:count"), is_(None))
+
+    def test_unknown_collect_methods_are_rejected(self):
+        self.assertRaises(ValueError, self.driver.aggregate_group,
+                          ["a"], {}, [("c", "median")])
+
+
+def group_command(keys, collect, documents):
+    """What the group command returns for documents"""
+    fields = set(field for field, method in collect)
+    results = []
+    for document in documents:
+        row = _find_row(results, keys, document)
+        if row is None:
+            row = dict((key, document[key]) for key in keys)
+            row.update((field, []) for field in fields)
+            row["_count"] = 0
+            results.append(row)
+        row["_count"] += 1
+        for field in fields:
+            # the reducer collects values that are not undefined
+            if field in document:
+                row[field].append(document[field])
+    return results
+
+
+def aggregate_command(keys, collect, documents):
+    """What the $group pipeline of aggregate_group returns for documents"""
+    stage = database._group_stage(keys, collect)
+    results = []
+    for document in documents:
+        _id = dict(("k%d" % i, document[key]) for i, key in enumerate(keys))
+        row = _find_row(results, ["_id"], {"_id": _id})
+        if row is None:
+            row = {"_id": _id, "_count": 0}
+            results.append(row)
+        row["_count"] += 1
+        for field, name in database._collect_field_names(collect).items():
+            present = field in document
+            value = document.get(field)
+            is_boolean = isinstance(value, bool)
+            is_number = isinstance(value, (int, long, float)) \
+                and not is_boolean
+            if name + "_sum" in stage:
+                # $sum skips values that are not numbers
+                row[name + "_sum"] = \
+                    row.get(name + "_sum", 0) + (value if is_number else 0)
+            if name + "_count" in stage:
+                row[name + "_count"] = row.get(name + "_count", 0) + present
+            if name + "_numbers" in stage:
+                row[name + "_numbers"] = \
+                    row.get(name + "_numbers", 0) + is_number
+            if name + "_booleans" in stage:
+                row[name + "_booleans"] = \
+                    row.get(name + "_booleans", 0) + is_boolean
+            if name + "_trues" in stage:
+                row[name + "_trues"] = \
+                    row.get(name + "_trues", 0) + (value is True)
+            if name + "_set" in stage:
+                values = row.setdefault(name + "_set", [])
+                if present and value not in values:
+                    values.append(value)
+    return results
+
+
+def _find_row(results, keys, document):
+    for row in results:
+        if all(row[key] == document[key] for key in keys):
+            return row
+
+
+class MergeAggregatedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.documents = [
+            {"a": 1, "b": "x", "c": 2, "d": "p"},
+            {"a": 1, "b": "y", "c": 4, "d": "q"},
+            {"a": 1, "b": "x", "c": 6, "d": "p"},
+            {"a": 2, "b": "x", "c": 3},
+        ]
+
+    def assert_same_as_group_command(self, keys, collect):
+        expected = self.merged(database.nested_merge, group_command,
+                               keys, collect)
+        output = self.merged(database.merge_aggregated, aggregate_command,
+                             keys, collect)
+
+        assert_that(output, is_(expected))
+
+    def merged(self, merge, command, keys, collect):
+        try:
+            return merge(keys, collect,
+                         command(keys, collect, self.documents))
+        except InvalidOperationError:
+            return "InvalidOperationError"
+
+    def test_groups_by_one_key(self):
+        self.assert_same_as_group_command(["a"], [])
+
+    def test_groups_by_two_keys(self):
+        self.assert_same_as_group_command(["a", "b"], [])
+
+    def test_collects_each_method(self):
+        for method in ["sum", "count", "mean", "set", "default"]:
+            self.assert_same_as_group_command(["a"], [("c", method)])
+
+    def test_collects_across_subgroups(self):
+        self.assert_same_as_group_command(
+            ["a", "b"], [("c", "sum"), ("c", "mean"), ("d", "set"),
+                         ("d", "count")])
+
+    def test_merges_rolled_up_groups(self):
+        collect = [("c", "sum"), ("d", "set")]
+        rows = aggregate_command(["a", "b"], collect, self.documents)
+        rolled_up = [
+            {"_id": {"k0": 1}, "_rows": [row for row in rows
+                                         if row["_id"]["k0"] == 1]},
+            {"_id": {"k0": 2}, "_rows": [row for row in rows
+                                         if row["_id"]["k0"] == 2]},
+        ]
+
+        assert_that(database.merge_aggregated(["a", "b"], collect, rolled_up),
+                    is_(database.merge_aggregated(["a", "b"], collect, rows)))
+
+    def test_mean_of_no_values_is_an_invalid_operation(self):
+        self.assertRaises(
+            InvalidOperationError, database.merge_aggregated, ["a"],
+            [("c", "mean")], [{"_id": {"k0": 1}, "_count": 1,
+                               "f0_sum": 0, "f0_count": 0,
+                               "f0_numbers": 0}])
+
+    def test_nulls_are_counted_and_collected_as_the_group_engine_does(self):
+        self.documents = [
+            {"a": 1, "c": None},
+            {"a": 1, "c": 2},
+            {"a": 1},
+            {"a": 2, "c": None},
+        ]
+        for method in ["count", "set", "default"]:
+            self.assert_same_as_group_command(["a"], [("c", method)])
+
+    def test_values_that_are_not_numbers_cannot_be_summed(self):
+        for values in [[1, "2"], [1, None], [True, "yes"]]:
+            self.documents = [{"a": 1, "c": value} for value in values]
+            for method in ["sum", "mean"]:
+                self.assert_same_as_group_command(["a"], [("c", method)])
+                self.assertRaises(
+                    InvalidOperationError, database.merge_aggregated,
+                    ["a"], [("c", method)],
+                    aggregate_command(["a"], [("c", method)],
+                                      self.documents))
+
+    def test_booleans_are_summed_as_the_group_engine_sums_them(self):
+        self.documents = [
+            {"a": 1, "b": "x", "c": 1.5},
+            {"a": 1, "b": "y", "c": True},
+            {"a": 1, "b": "y", "c": False},
+            {"a": 2, "b": "x", "c": True},
+        ]
+        for method in ["sum", "mean"]:
+            self.assert_same_as_group_command(["a"], [("c", method)])
+            self.assert_same_as_group_command(["a", "b"], [("c", method)])
+
+    def test_mean_skips_documents_without_the_field(self):
+        self.documents = [{"a": 1, "c": 1}, {"a": 1}, {"a": 1, "c": 4}]
+
+        self.assert_same_as_group_command(["a"], [("c", "mean")])
+
 
 class NestedMergeTestCase(unittest.TestCase):
     def setUp(self):
@@ -71,6 +548,23 @@ class NestedMergeTestCase(unittest.TestCase):
             {'a': 2}
         ]))
 
+    def test_nested_merge_groups_list_values(self):
+        output = database.nested_merge(['a', 'b'], [], [
+            {'a': [1, 2], 'b': 2, '_count': 1},
+            {'a': [1, 2], 'b': 1, '_count': 2},
+            {'a': [2], 'b': 1, '_count': 4},
+        ])
+
+        assert_that(output, is_([
+            {'a': [1, 2], '_count': 3, '_group_count': 2, '_subgroup': [
+                {'b': 1, '_count': 2},
+                {'b': 2, '_count': 1},
+            ]},
+            {'a': [2], '_count': 4, '_group_count': 1, '_subgroup': [
+                {'b': 1, '_count': 4},
+            ]},
+        ]))
+
     def test_nested_merge_collect_default(self):
         stub_dictionaries = [
             {'a': 1, 'b': [2], 'c': 3},
@@ -141,6 +635,9 @@ class TestApplyCollectionMethod(unittest.TestCase):
         self.assertRaises(InvalidOperationError,
                           apply_collection_method, ['average', 'this'], "mean")
 
+    def test_booleans_are_summed_as_numbers(self):
+        assert_that(apply_collection_method([1, True, False], "sum"), is_(2))
+
 
 class TestRepository(unittest.TestCase):
     def setUp(self):
@@ -158,6 +655,17 @@ class TestRepository(unittest.TestCase):
             "_updated_at": d_tz(2013, 4, 9, 13, 32, 5)
         })
 
+    @patch('backdrop.core.timeutils.now')
+    def test_save_all_adds_timestamps_to_every_document(self, now):
+        now.return_value = d_tz(2013, 4, 9, 13, 32, 5)
+
+        self.repo.save_all([{"name": "Gummo"}, {"name": "Zeppo"}])
+
+        self.mongo.save_all.assert_called_once_with([
+            {"name": "Gummo", "_updated_at": d_tz(2013, 4, 9, 13, 32, 5)},
+            {"name": "Zeppo", "_updated_at": d_tz(2013, 4, 9, 13, 32, 5)},
+        ])
+
     # =========================
     # Tests for repository.find
     # =========================
@@ -218,3 +726,50 @@ class TestRepository(unittest.TestCase):
             self.repo.find,
             Query.create(), ["a_key", "blah"]
         )
+
+    def test_group_with_the_aggregate_engine(self):
+        repo = Repository(self.mongo, group_engine="aggregate")
+        self.mongo.aggregate_group.return_value = [
+            {"_id": {"k0": "guitar"}, "_count": 2, "f0_sum": 5},
+        ]
+
+        results = repo.group("plays", Query.create(), collect=[("age", "sum")])
+
+        self.mongo.aggregate_group.assert_called_once_with(
+            ["plays"], {}, [("age", "sum")], None, None)
+        assert_that(results, is_([
+            {"plays": "guitar", "_count": 2, "age:sum": 5},
+        ]))
+        assert_that(self.mongo.group.called, is_(False))
+
+    def test_aggregate_engine_sorts_and_limits_in_the_database(self):
+        repo = Repository(self.mongo, group_engine="aggregate")
+        self.mongo.aggregate_group.return_value = [
+            {"_id": {"k0": "drums"}, "_count": 1},
+            {"_id": {"k0": "guitar"}, "_count": 3},
+        ]
+
+        results = repo.group("plays", Query.create(),
+                             sort=["plays", "descending"], limit=2)
+
+        self.mongo.aggregate_group.assert_called_once_with(
+            ["plays"], {}, [], ["plays", "descending"], 2)
+        assert_that([group["plays"] for group in results],
+                    is_(["drums", "guitar"]))
+
+    def test_aggregate_engine_sorts_sets_in_python(self):
+        repo = Repository(self.mongo, group_engine="aggregate")
+        self.mongo.aggregate_group.return_value = [
+            {"_id": {"k0": "drums"}, "_count": 1, "f0_set": ["b"]},
+            {"_id": {"k0": "guitar"}, "_count": 3, "f0_set": ["a"]},
+        ]
+
+        results = repo.group("plays", Query.create(),
+                             sort=["name:set", "ascending"], limit=1,
+                             collect=[("name", "set")])
+
+        self.mongo.aggregate_group.assert_called_once_with(
+            ["plays"], {}, [("name", "set")])
+        assert_that(results, is_([
+            {"plays": "guitar", "_count": 3, "name:set": ["a"]},
+        ]))
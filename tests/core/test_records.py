@@ -3,8 +3,9 @@ import datetime
 
 from hamcrest import *
 
-from backdrop.core.errors import ParseError
-from backdrop.core.records import Record, parse
+from backdrop.core.errors import ParseError, ValidationError
+from backdrop.core.records import Record, parse, parse_all, parse_valid
+from backdrop.core.staging import StagingArea
 from tests.support.test_helpers import d_tz
 
 
@@ -17,8 +18,75 @@ class TestParse(unittest.TestCase):
     def test_validation_error_is_raised_if_cannot_parse(self):
         self.assertRaises(ParseError, parse, {"_timestamp": "foobar"})
 
+    def test_records_must_be_objects(self):
+        self.assertRaises(ValidationError, parse, "foobar")
+
+
+class TestParseAll(unittest.TestCase):
+    def test_all_records_are_parsed(self):
+        records = parse_all([{"foo": "bar"}, {"foo": "zap"}])
+
+        assert_that(records, is_([Record({"foo": "bar"}),
+                                  Record({"foo": "zap"})]))
+
+    def test_period_starts_match_those_of_single_records(self):
+        data = [{"_timestamp": "2013-04-09T10:00:00+00:00"},
+                {"foo": "bar"},
+                {"_timestamp": "2013-05-01T00:00:00+00:00"}]
+
+        records = parse_all([dict(datum) for datum in data])
+
+        assert_that(records, is_([parse(datum) for datum in data]))
+        assert_that(records[2].meta, is_({
+            "_week_start_at": d_tz(2013, 4, 29),
+            "_month_start_at": d_tz(2013, 5, 1)
+        }))
+
+    def test_error_names_the_index_of_the_bad_record(self):
+        try:
+            parse_all([{"foo": "bar"}, {"_id": "f o o"}])
+            self.fail("expected a ValidationError")
+        except ValidationError as e:
+            assert_that(str(e), starts_with("record at index 1:"))
+
+    def test_error_index_includes_the_offset(self):
+        try:
+            parse_all([{"_timestamp": "foobar"}], offset=1000)
+            self.fail("expected a ParseError")
+        except ParseError as e:
+            assert_that(str(e), starts_with("record at index 1000:"))
+
+
+class TestParseValid(unittest.TestCase):
+    def test_valid_records_are_parsed_and_invalid_ones_reported(self):
+        records, rejected = parse_valid([
+            (10, {"foo": "bar"}),
+            (11, {"_id": "f o o"}),
+            (12, "foobar"),
+            (13, {"_timestamp": "2013-04-09T10:00:00+00:00"}),
+        ])
+
+        assert_that(records, is_([
+            Record({"foo": "bar"}),
+            Record({"_timestamp": d_tz(2013, 4, 9, 10)})
+        ]))
+        assert_that(rejected, is_([
+            {"index": 11, "message": "_id is not a valid id"},
+            {"index": 12, "message": "record must be an object"},
+        ]))
+
 
 class TestRecord(unittest.TestCase):
+    def test_records_are_rebuilt_from_the_staging_area(self):
+        [record] = parse_all([{"_timestamp": "2013-02-02T00:00:00+01:00",
+                               "name": "Groucho", "age": 2 ** 40}])
+
+        with StagingArea() as staged:
+            staged.add([record.to_staged()])
+            [document] = list(staged)
+
+        assert_that(Record.from_staged(document), is_(record))
+
     def test_creation(self):
         incoming_data = {'foo': 'bar', 'zap': 'pow'}
         some_record = Record(incoming_data)
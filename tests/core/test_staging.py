@@ -0,0 +1,30 @@
+import unittest
+
+from hamcrest import *
+
+from backdrop.core.staging import StagingArea
+from tests.support.test_helpers import d_tz
+
+
+class TestStagingArea(unittest.TestCase):
+    def test_documents_are_read_back_in_order(self):
+        with StagingArea() as staged:
+            staged.add([{"name": "Groucho"}, {"name": "Harpo"}])
+            staged.add(iter([{"name": "Chico"}]))
+
+            assert_that(list(staged), is_([
+                {"name": "Groucho"}, {"name": "Harpo"}, {"name": "Chico"}
+            ]))
+            assert_that(staged.count, is_(3))
+
+    def test_datetimes_are_read_back_in_utc(self):
+        with StagingArea() as staged:
+            staged.add([{"_timestamp": d_tz(2013, 4, 1, 12)}])
+
+            assert_that(list(staged), is_([
+                {"_timestamp": d_tz(2013, 4, 1, 12)}
+            ]))
+
+    def test_an_empty_staging_area_has_no_documents(self):
+        with StagingArea() as staged:
+            assert_that(list(staged), is_([]))
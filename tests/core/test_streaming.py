@@ -0,0 +1,205 @@
+from StringIO import StringIO
+import gzip
+import unittest
+import zlib
+
+from hamcrest import *
+
+from backdrop.core.errors import ParseError, PayloadTooLarge
+from backdrop.core.streaming import chunks, iter_json, iter_ndjson, \
+    DecompressingReader
+
+
+def parse(text, read_size=3):
+    return list(iter_json(StringIO(text), read_size=read_size))
+
+
+def parse_stream(stream, **kwargs):
+    return list(iter_json(stream, **kwargs))
+
+
+class TestIterJson(unittest.TestCase):
+    def test_items_of_an_array_are_yielded(self):
+        assert_that(parse('[{"a": 1}, {"b": "two"}]'),
+                    is_([{"a": 1}, {"b": "two"}]))
+
+    def test_a_single_object_is_yielded_on_its_own(self):
+        assert_that(parse('{"a": 1}'), is_([{"a": 1}]))
+
+    def test_an_empty_array_yields_nothing(self):
+        assert_that(parse(' [ ] '), is_([]))
+
+    def test_whitespace_between_items_is_ignored(self):
+        assert_that(parse('\n[\n  {"a": 1} ,\n  {"a": 2}\n]\n'),
+                    is_([{"a": 1}, {"a": 2}]))
+
+    def test_numbers_split_across_reads_are_decoded_whole(self):
+        assert_that(parse('[12345, 6789]', read_size=2), is_([12345, 6789]))
+
+    def test_fractions_split_at_their_point_are_decoded_whole(self):
+        assert_that(parse('[\n -0.5,\n 1e5\n]', read_size=1),
+                    is_([-0.5, 1e5]))
+
+    def test_utf8_split_across_reads_is_decoded(self):
+        assert_that(parse('[{"city": "citt\xc3\xa0"}]', read_size=1),
+                    is_([{"city": u"citt\xe0"}]))
+
+    def test_items_are_yielded_before_the_end_of_the_stream(self):
+        items = iter_json(StringIO('[{"a": 1}, {"a": 2}, broken'),
+                          read_size=4)
+
+        assert_that(next(items), is_({"a": 1}))
+        assert_that(next(items), is_({"a": 2}))
+        self.assertRaises(ParseError, next, items)
+
+    def test_invalid_json_raises_parse_error(self):
+        self.assertRaises(ParseError, parse, 'foobar')
+
+    def test_empty_body_raises_parse_error(self):
+        self.assertRaises(ParseError, parse, '')
+
+    def test_missing_comma_raises_parse_error(self):
+        self.assertRaises(ParseError, parse, '[{"a": 1} {"a": 2}]')
+
+    def test_unterminated_array_raises_parse_error(self):
+        self.assertRaises(ParseError, parse, '[{"a": 1}')
+
+    def test_trailing_data_raises_parse_error(self):
+        self.assertRaises(ParseError, parse, '[{"a": 1}] []')
+
+    def test_malformed_items_are_rejected_without_reading_on(self):
+        stream = StringIO('[{"a": x' + ' ' * 100000 + '}]')
+
+        self.assertRaises(ParseError, parse_stream, stream, read_size=1024)
+
+        assert_that(stream.tell(), is_(1024))
+
+    def test_literals_split_across_reads_are_decoded_whole(self):
+        assert_that(parse('[{"a": false}, {"b": null}]', read_size=9),
+                    is_([{"a": False}, {"b": None}]))
+
+    def test_long_strings_split_across_reads_are_decoded_whole(self):
+        assert_that(parse('[{"a": "%s"}]' % ("x" * 1000), read_size=10),
+                    is_([{"a": "x" * 1000}]))
+
+    def test_items_larger_than_the_limit_raise_payload_too_large(self):
+        self.assertRaises(PayloadTooLarge, parse_stream,
+                          StringIO('[{"a": "%s"}]' % ("x" * 1000)),
+                          read_size=10, max_item_size=100)
+
+
+class TestIterNdjson(unittest.TestCase):
+    def parse(self, text, read_size=3):
+        return list(iter_ndjson(StringIO(text), read_size=read_size))
+
+    def test_each_line_is_yielded(self):
+        assert_that(self.parse('{"a": 1}\n{"b": "two"}\n'),
+                    is_([{"a": 1}, {"b": "two"}]))
+
+    def test_the_last_line_does_not_need_a_newline(self):
+        assert_that(self.parse('{"a": 1}\n{"a": 2}'),
+                    is_([{"a": 1}, {"a": 2}]))
+
+    def test_blank_lines_are_skipped(self):
+        assert_that(self.parse('\n{"a": 1}\r\n  \n{"a": 2}\n\n'),
+                    is_([{"a": 1}, {"a": 2}]))
+
+    def test_utf8_split_across_reads_is_decoded(self):
+        assert_that(self.parse('{"city": "citt\xc3\xa0"}', read_size=1),
+                    is_([{"city": u"citt\xe0"}]))
+
+    def test_invalid_line_raises_parse_error_naming_the_line(self):
+        lines = iter_ndjson(StringIO('{"a": 1}\n{"a": \n'))
+
+        assert_that(next(lines), is_({"a": 1}))
+        try:
+            next(lines)
+            self.fail("expected a ParseError")
+        except ParseError as e:
+            assert_that(str(e), is_("line 2 is not valid JSON"))
+
+    def test_lines_longer_than_the_limit_raise_parse_error(self):
+        lines = iter_ndjson(StringIO('{"a": 1}\n{"a": "%s"}\n' % ("x" * 1000)),
+                            read_size=10, max_item_size=100)
+
+        assert_that(next(lines), is_({"a": 1}))
+        self.assertRaises(ParseError, next, lines)
+
+    def test_a_long_line_is_refused_before_it_is_all_read(self):
+        stream = StringIO('{"a": "%s"}' % ("x" * 1000))
+
+        self.assertRaises(ParseError, list,
+                          iter_ndjson(stream, read_size=10,
+                                      max_item_size=100))
+        assert_that(stream.tell(), less_than(200))
+
+    def test_lines_up_to_the_limit_are_parsed(self):
+        line = '{"a": "%s"}' % ("x" * 90)
+
+        assert_that(list(iter_ndjson(StringIO(line + "\n" + line),
+                                     read_size=7, max_item_size=len(line))),
+                    is_([{"a": "x" * 90}] * 2))
+
+
+class TestChunks(unittest.TestCase):
+    def test_items_are_split_into_chunks(self):
+        assert_that(list(chunks(iter(range(5)), 2)),
+                    is_([[0, 1], [2, 3], [4]]))
+
+    def test_no_items_gives_no_chunks(self):
+        assert_that(list(chunks([], 2)), is_([]))
+
+
+def gzipped(data):
+    compressed = StringIO()
+    gzip_file = gzip.GzipFile(fileobj=compressed, mode='wb')
+    gzip_file.write(data)
+    gzip_file.close()
+    return compressed.getvalue()
+
+
+def read_all(reader, size=5):
+    data = ''
+    while True:
+        chunk = reader.read(size)
+        if not chunk:
+            return data
+        data += chunk
+
+
+class TestDecompressingReader(unittest.TestCase):
+    def test_gzip_data_is_decompressed(self):
+        reader = DecompressingReader(
+            StringIO(gzipped('[{"a": 1}]' * 10)), 'gzip', 1000, read_size=7)
+
+        assert_that(read_all(reader), is_('[{"a": 1}]' * 10))
+
+    def test_deflate_data_is_decompressed(self):
+        reader = DecompressingReader(
+            StringIO(zlib.compress('[{"a": 1}]')), 'deflate', 1000)
+
+        assert_that(read_all(reader), is_('[{"a": 1}]'))
+
+    def test_deflate_data_without_a_header_is_decompressed(self):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        data = compressor.compress('[{"a": 1}]') + compressor.flush()
+        reader = DecompressingReader(StringIO(data), 'deflate', 1000)
+
+        assert_that(read_all(reader), is_('[{"a": 1}]'))
+
+    def test_reads_are_no_bigger_than_the_size_asked_for(self):
+        reader = DecompressingReader(
+            StringIO(gzipped('x' * 10000)), 'gzip', 100000)
+
+        assert_that(len(reader.read(100)), is_(100))
+
+    def test_decompressing_too_much_raises_payload_too_large(self):
+        reader = DecompressingReader(
+            StringIO(gzipped('x' * 10000)), 'gzip', 1000)
+
+        self.assertRaises(PayloadTooLarge, read_all, reader, 100)
+
+    def test_invalid_data_raises_parse_error(self):
+        reader = DecompressingReader(StringIO('not gzip'), 'gzip', 1000)
+
+        self.assertRaises(ParseError, read_all, reader)
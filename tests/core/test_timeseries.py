@@ -1,7 +1,10 @@
 from unittest import TestCase
 import datetime
-from hamcrest import assert_that, is_, contains
-from backdrop.core.timeseries import timeseries, WEEK, MONTH
+import threading
+from dateutil.relativedelta import relativedelta, MO
+from hamcrest import assert_that, is_, contains, same_instance
+import pytz
+from backdrop.core.timeseries import timeseries, WEEK, MONTH, Week, Month
 from tests.support.test_helpers import d, d_tz
 
 
@@ -83,6 +86,65 @@ class TestWeek_start(TestCase):
 
         assert_that(start, is_(datetime.datetime(2013, 4, 8)))
 
+    def test_that_it_matches_relativedelta_for_every_day(self):
+        day = datetime.datetime(2012, 12, 20, 13, 30, tzinfo=pytz.UTC)
+        for _ in range(60):
+            expected = day.replace(hour=0, minute=0) + \
+                relativedelta(weekday=MO(-1))
+
+            assert_that(WEEK.start(day), is_(expected))
+            assert_that(WEEK.start(day).tzinfo, is_(pytz.UTC))
+            day += datetime.timedelta(days=1)
+
+    def test_that_it_keeps_the_timezone_of_each_timestamp(self):
+        naive = datetime.datetime(2013, 4, 9)
+        aware = d_tz(2013, 4, 9)
+
+        assert_that(WEEK.start(naive).tzinfo, is_(None))
+        assert_that(WEEK.start(aware).tzinfo, is_(pytz.UTC))
+
+    def test_that_it_only_remembers_the_most_recent_days(self):
+        week = Week(cache_size=2)
+        first = week.start(d_tz(2013, 4, 9, 10))
+        week.start(d_tz(2013, 4, 10))
+        week.start(d_tz(2013, 4, 11))
+
+        assert_that(week.start(d_tz(2013, 4, 9, 12)),
+                    is_(d_tz(2013, 4, 8)))
+        assert_that(len(week._starts._items), is_(2))
+
+    def test_that_threads_can_share_the_cache(self):
+        week = Week(cache_size=4)
+        days = [d_tz(2013, 4, 1) + datetime.timedelta(days=i)
+                for i in range(28)]
+        errors = []
+
+        def start_all():
+            try:
+                for _ in range(50):
+                    for day in days:
+                        assert week.start(day) == WEEK.start(day)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=start_all) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_that(errors, is_([]))
+        assert_that(len(week._starts._items), is_(4))
+
+    def test_that_start_all_returns_the_start_of_each_timestamp(self):
+        starts = WEEK.start_all([d_tz(2013, 4, 9, 10),
+                                 d_tz(2013, 4, 16),
+                                 d_tz(2013, 4, 9, 23)])
+
+        assert_that(starts, is_([d_tz(2013, 4, 8),
+                                 d_tz(2013, 4, 15),
+                                 d_tz(2013, 4, 8)]))
+        assert_that(starts[0], same_instance(starts[2]))
+
 
 class TestWeek_end(TestCase):
     def test_that_it_returns_next_monday_for_midweek(self):
@@ -167,6 +229,11 @@ class TestMonth_start(TestCase):
 
         assert_that(start, is_(some_datetime))
 
+    def test_that_start_all_returns_the_start_of_each_timestamp(self):
+        starts = Month().start_all([d_tz(2013, 4, 9), d_tz(2013, 5, 31, 23)])
+
+        assert_that(starts, is_([d_tz(2013, 4, 1), d_tz(2013, 5, 1)]))
+
 
 class TestMonth_end(object):
     def test_that_it_returns_the_end_of_the_current_month(self):
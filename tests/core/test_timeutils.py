@@ -1,7 +1,9 @@
 import unittest
-from hamcrest import assert_that, equal_to
+from dateutil import parser
+from hamcrest import assert_that, equal_to, is_
 import pytz
-from backdrop.core.timeutils import parse_time_as_utc
+from backdrop.core.timeutils import parse_time_as_utc, \
+    parse_iso8601_as_utc, parse_time
 from tests.support.test_helpers import d_tz, d
 
 
@@ -26,3 +28,54 @@ class ParseTimeAsUTCTestCase(unittest.TestCase):
     def test_datetime_with_no_timezone_is_given_utc(self):
         assert_that(parse_time_as_utc(d(2012, 12, 12, 12)),
                     equal_to(d_tz(2012, 12, 12, 12)))
+
+
+class ParseISO8601AsUTCTestCase(unittest.TestCase):
+    def assert_same_as_dateutil(self, time_string):
+        assert_that(parse_iso8601_as_utc(time_string),
+                    equal_to(parser.parse(time_string).astimezone(pytz.UTC)))
+
+    def test_strict_format_is_parsed_like_dateutil(self):
+        self.assert_same_as_dateutil("2012-12-12T12:12:12+00:00")
+        self.assert_same_as_dateutil("2012-12-12T12:12:12Z")
+        self.assert_same_as_dateutil("2012-12-12T12:12:12+0530")
+        self.assert_same_as_dateutil("2012-12-12T00:12:12+01:00")
+        self.assert_same_as_dateutil("2012-12-31T23:12:12-02:30")
+
+    def test_result_is_in_utc(self):
+        assert_that(parse_iso8601_as_utc("2012-12-12T12:12:12-01:00").tzinfo,
+                    is_(pytz.UTC))
+
+    def test_other_formats_are_not_parsed(self):
+        assert_that(parse_iso8601_as_utc("2012-12-12"), is_(None))
+        assert_that(parse_iso8601_as_utc("2012-12-12T12:12:12.5Z"),
+                    is_(None))
+        assert_that(parse_iso8601_as_utc("2012-12-12T12:12:12+00:00 x"),
+                    is_(None))
+        assert_that(parse_iso8601_as_utc(12.0), is_(None))
+
+    def test_times_that_do_not_exist_raise_value_error(self):
+        self.assertRaises(ValueError,
+                          parse_iso8601_as_utc, "2013-02-29T00:00:00Z")
+        self.assertRaises(ValueError,
+                          parse_iso8601_as_utc, "2013-02-01T24:00:00Z")
+        self.assertRaises(ValueError,
+                          parse_iso8601_as_utc, "2013-02-01T00:00:00+24:00")
+
+    def test_other_formats_fall_back_to_dateutil(self):
+        assert_that(parse_time_as_utc("2012-12-12"),
+                    equal_to(d_tz(2012, 12, 12)))
+        assert_that(parse_time_as_utc("2012-12-12T12:12:12.000+00:00"),
+                    equal_to(d_tz(2012, 12, 12, 12, 12, 12)))
+
+
+class ParseTimeTestCase(unittest.TestCase):
+    def test_time_keeps_its_utc_offset(self):
+        time = parse_time("2013-01-07T00:00:00+01:00")
+
+        assert_that(time.weekday(), is_(0))
+        assert_that(time, equal_to(d_tz(2013, 1, 6, 23)))
+
+    def test_other_formats_fall_back_to_dateutil(self):
+        assert_that(parse_time("2013-01-07 00:00:00+00:00"),
+                    equal_to(d_tz(2013, 1, 7)))
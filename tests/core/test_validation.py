@@ -5,7 +5,8 @@ from hamcrest import *
 from hamcrest import assert_that, is_
 
 from backdrop.core.validation import value_is_valid_id,\
-    value_is_valid, key_is_valid, value_is_valid_datetime_string, key_is_reserved, validate_record_data
+    value_is_valid, key_is_valid, value_is_valid_datetime_string, key_is_reserved, validate_record_data, \
+    RecordValidator, validate_all_record_data
 from tests.support.validity_matcher import is_invalid_with_message, is_valid
 
 valid_string = 'validstring'
@@ -189,3 +190,47 @@ class ValidDateObjectTestCase(unittest.TestCase):
         assert_that(
             validate_record_data(some_good_data).is_valid,
             is_(True))
+
+
+class TestRecordValidator(unittest.TestCase):
+    def setUp(self):
+        self.validator = RecordValidator(max_known_keys=2)
+
+    def test_known_keys_still_have_their_values_checked(self):
+        assert_that(self.validator.validate({'foo': 'bar'}), is_valid())
+        assert_that(self.validator.validate({'foo': tuple()}),
+                    is_invalid_with_message("foo has an invalid value"))
+
+    def test_invalid_keys_are_not_remembered(self):
+        self.validator.validate({'foo-bar': 'bar'})
+
+        assert_that(self.validator.validate({'foo-bar': 'bar'}),
+                    is_invalid_with_message("foo-bar is not a valid key"))
+
+    def test_keys_are_still_validated_once_the_cache_is_full(self):
+        self.validator.validate({'aaa': 1, 'bbb': 2, 'ccc': 3})
+
+        assert_that(self.validator.validate({'_unknown': 1}),
+                    is_invalid_with_message(
+                        "_unknown is not a recognised internal field"))
+
+    def test_values_of_other_types_are_checked_by_instance(self):
+        class MyString(unicode):
+            pass
+
+        assert_that(self.validator.validate({'foo': MyString(u'bar')}),
+                    is_valid())
+        assert_that(self.validator.validate({'foo': 2 ** 64}),
+                    is_invalid_with_message("foo has an invalid value"))
+
+    def test_validate_all_gives_a_result_per_record(self):
+        results = list(validate_all_record_data([
+            {'foo': 'bar'},
+            {'_id': 'invalid id'},
+            {'_timestamp': valid_timestamp}
+        ]))
+
+        assert_that(results[0], is_valid())
+        assert_that(results[1],
+                    is_invalid_with_message("_id is not a valid id"))
+        assert_that(results[2], is_valid())
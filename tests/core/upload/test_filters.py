@@ -0,0 +1,157 @@
+import unittest
+
+from hamcrest import assert_that, contains, is_
+
+from backdrop.core.upload import create_parser
+from backdrop.core.upload.filters import first_sheet_filter, \
+    infer_column_types
+from tests.support.test_helpers import d_tz
+
+
+class InferColumnTypesTestCase(unittest.TestCase):
+    def test_numeric_columns_are_converted(self):
+        rows = infer_column_types([
+            [u"name", u"count", u"ratio"],
+            [u"a", u"1", u"0.5"],
+            [u"b", u"-20", u"3"],
+        ])
+
+        assert_that(list(rows), contains(
+            [u"name", u"count", u"ratio"],
+            [u"a", 1, 0.5],
+            [u"b", -20, 3.0],
+        ))
+
+    def test_bool_and_timestamp_columns_are_converted(self):
+        rows = infer_column_types([
+            [u"flag", u"when"],
+            [u"True", u"2013-01-01T00:00:00Z"],
+            [u"false", u"2013-01-02T01:00:00+01:00"],
+        ])
+
+        assert_that(list(rows), contains(
+            [u"flag", u"when"],
+            [True, d_tz(2013, 1, 1)],
+            [False, d_tz(2013, 1, 2)],
+        ))
+
+    def test_columns_with_mixed_values_are_left_as_strings(self):
+        rows = infer_column_types([
+            [u"code"],
+            [u"12"],
+            [u"12a"],
+        ])
+
+        assert_that(list(rows), contains([u"code"], [u"12"], [u"12a"]))
+
+    def test_columns_with_leading_zeros_are_left_as_strings(self):
+        rows = infer_column_types([
+            [u"postcode", u"ratio", u"zero"],
+            [u"01234", u"01.5", u"0"],
+            [u"12345", u"2.5", u"0.5"],
+        ])
+
+        assert_that(list(rows), contains(
+            [u"postcode", u"ratio", u"zero"],
+            [u"01234", u"01.5", 0.0],
+            [u"12345", u"2.5", 0.5],
+        ))
+
+    def test_columns_with_integers_beyond_64_bits_are_left_as_strings(self):
+        rows = infer_column_types([
+            [u"id", u"largest"],
+            [u"9223372036854775808", u"9223372036854775807"],
+            [u"1", u"-9223372036854775808"],
+        ])
+
+        assert_that(list(rows), contains(
+            [u"id", u"largest"],
+            [u"9223372036854775808", 9223372036854775807],
+            [u"1", -9223372036854775808],
+        ))
+
+    def test_codes_after_the_sample_are_not_converted(self):
+        rows = infer_column_types([
+            [u"count"],
+            [u"1"],
+            [u"007"],
+            [u"99999999999999999999"],
+        ], sample_size=1)
+
+        assert_that(list(rows), contains(
+            [u"count"], [1], [u"007"], [u"99999999999999999999"]))
+
+    def test_underscore_columns_are_left_alone(self):
+        rows = infer_column_types([
+            [u"_timestamp", u"_id"],
+            [u"2013-01-01T00:00:00Z", u"1"],
+        ])
+
+        assert_that(list(rows), contains(
+            [u"_timestamp", u"_id"],
+            [u"2013-01-01T00:00:00Z", u"1"],
+        ))
+
+    def test_type_is_decided_from_the_sample(self):
+        rows = infer_column_types([
+            [u"count"],
+            [u"1"],
+            [u"2"],
+            [u"three"],
+        ], sample_size=2)
+
+        assert_that(list(rows), contains(
+            [u"count"], [1], [2], [u"three"]))
+
+    def test_blank_values_are_left_blank(self):
+        rows = infer_column_types([
+            [u"count", u"name"],
+            [u"", u"a"],
+            [u"2", u""],
+        ])
+
+        assert_that(list(rows), contains(
+            [u"count", u"name"], [u"", u"a"], [2, u""]))
+
+    def test_rows_of_the_wrong_length_are_left_for_make_dicts(self):
+        rows = infer_column_types([
+            [u"count"],
+            [u"1", u"2"],
+        ])
+
+        assert_that(list(rows), contains([u"count"], [u"1", u"2"]))
+
+    def test_csv_uploads_can_infer_column_types(self):
+        parser = create_parser("csv", [
+            first_sheet_filter,
+            "backdrop.core.upload.filters.infer_column_types"])
+
+        records = parser(iter(["name,count\n", "a,1\n", "b,2\n"]))
+
+        assert_that(list(records), contains(
+            {u"name": u"a", u"count": 1},
+            {u"name": u"b", u"count": 2},
+        ))
+
+
+class FirstSheetFilterTestCase(unittest.TestCase):
+    def test_yields_the_rows_of_the_first_sheet(self):
+        assert_that(list(first_sheet_filter(iter([[["a"]], [["b"]]]))),
+                    is_([["a"]]))
+
+    def test_sheets_are_closed_once_the_first_sheet_is_read(self):
+        closed = []
+
+        def sheets():
+            try:
+                yield iter([["a"]])
+                yield iter([["b"]])
+            finally:
+                closed.append(True)
+
+        rows = first_sheet_filter(sheets())
+        assert_that(next(rows), is_(["a"]))
+        assert_that(closed, is_([]))
+        assert_that(list(rows), is_([]))
+
+        assert_that(closed, is_([True]))
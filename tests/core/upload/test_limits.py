@@ -0,0 +1,67 @@
+import unittest
+from StringIO import StringIO
+
+from hamcrest import assert_that, contains, contains_string, is_
+
+from backdrop.core.errors import ParseError, ValidationError
+from backdrop.core.upload.filters import first_sheet_filter
+from backdrop.core.upload.limits import parse_with_limits
+
+
+def reject_sheets(sheets):
+    raise ValidationError("missing header")
+
+
+def parse_forever(rows):
+    while True:
+        pass
+
+
+def use_memory(rows):
+    return [["data"], ["x" * (512 * 1024 * 1024)]]
+
+
+class ParseWithLimitsTestCase(unittest.TestCase):
+    def test_records_are_parsed_in_a_child_process(self):
+        records = parse_with_limits(
+            "csv", ["backdrop.core.upload.filters.first_sheet_filter"],
+            StringIO("line,length\na,1\nbb,2\n"))
+
+        assert_that(list(records), contains(
+            {"line": "a", "length": "1"},
+            {"line": "bb", "length": "2"},
+        ))
+
+    def test_filters_can_be_given_as_functions(self):
+        records = parse_with_limits("csv", [first_sheet_filter],
+                                    StringIO("a\n1\n"))
+
+        assert_that(list(records), contains({"a": "1"}))
+
+    def test_parse_errors_are_raised_in_the_parent(self):
+        try:
+            parse_with_limits("csv", [first_sheet_filter],
+                              StringIO("a,b\n1,2\n1,2,3\n"))
+            self.fail("expected a ParseError")
+        except ParseError as e:
+            assert_that(str(e), contains_string("more values than columns"))
+
+    def test_validation_errors_are_raised_in_the_parent(self):
+        self.assertRaises(ValidationError, parse_with_limits,
+                          "csv", [reject_sheets], StringIO(""))
+
+    def test_parsing_that_takes_too_long_is_stopped(self):
+        try:
+            parse_with_limits("csv", [first_sheet_filter, parse_forever],
+                              StringIO("a\n"), time_limit=0.5)
+            self.fail("expected a ParseError")
+        except ParseError as e:
+            assert_that(str(e), contains_string("too long"))
+
+    def test_parsing_that_uses_too_much_memory_is_stopped(self):
+        try:
+            parse_with_limits("csv", [first_sheet_filter, use_memory],
+                              StringIO("a\n"), memory_limit=64 * 1024 * 1024)
+            self.fail("expected a ParseError")
+        except ParseError as e:
+            assert_that(str(e), contains_string("memory"))
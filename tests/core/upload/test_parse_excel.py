@@ -1,7 +1,11 @@
 import unittest
-from hamcrest import assert_that, only_contains, contains
+import xlrd
+from hamcrest import assert_that, only_contains, contains, equal_to, \
+    has_item
+from mock import patch
 from backdrop.core.errors import ParseError
 
+from backdrop.core.upload.filters import first_sheet_filter
 from backdrop.core.upload.parse_excel import parse_excel
 from tests.support.test_helpers import fixture_path, d_tz
 
@@ -52,3 +56,71 @@ class ParseExcelTestCase(unittest.TestCase):
                 ["First", 0],
                 ["Second", 1]
             )))
+
+    def test_parse_xls_only_loads_the_sheets_that_are_read(self):
+        loaded = []
+        get_sheet = xlrd.book.Book.get_sheet
+
+        def recording_get_sheet(book, index, *args, **kwargs):
+            loaded.append(index)
+            return get_sheet(book, index, *args, **kwargs)
+
+        with patch.object(xlrd.book.Book, 'get_sheet', autospec=True,
+                          side_effect=recording_get_sheet):
+            for index, sheet in enumerate(
+                    self._parse_excel("LPA_MI_EXAMPLE.xls")):
+                if index == 1:
+                    list(sheet)
+
+        assert_that(loaded, equal_to([1]))
+
+    def test_parse_xls_unloads_sheets_once_read(self):
+        with patch.object(xlrd.book.Book, 'unload_sheet',
+                          autospec=True) as unload_sheet:
+            for sheet in self._parse_excel("LPA_MI_EXAMPLE.xls"):
+                list(sheet)
+
+        assert_that([call[0][1] for call in unload_sheet.call_args_list],
+                    equal_to([0, 1, 2]))
+
+    def test_parse_xls_unloads_a_sheet_when_the_next_is_asked_for(self):
+        with patch.object(xlrd.book.Book, 'unload_sheet',
+                          autospec=True) as unload_sheet:
+            sheets = self._parse_excel("LPA_MI_EXAMPLE.xls")
+            list(next(sheets))
+            assert_that(unload_sheet.called, equal_to(False))
+            next(sheets)
+
+            assert_that([call[0][1] for call in unload_sheet.call_args_list],
+                        equal_to([0]))
+            sheets.close()
+
+    def test_parse_xls_releases_the_book_once_its_sheets_are_read(self):
+        with patch.object(xlrd.book.Book, 'release_resources',
+                          autospec=True) as release_resources:
+            for sheet in self._parse_excel("LPA_MI_EXAMPLE.xls"):
+                list(sheet)
+
+        assert_that(release_resources.call_count, equal_to(1))
+
+    def test_parse_xls_releases_the_book_when_reading_a_sheet_fails(self):
+        with patch.object(xlrd.book.Book, 'release_resources',
+                          autospec=True) as release_resources, \
+                patch.object(xlrd.sheet.Sheet, 'row',
+                             side_effect=xlrd.XLRDError):
+            sheets = self._parse_excel("LPA_MI_EXAMPLE.xls")
+            self.assertRaises(xlrd.XLRDError, list, next(sheets))
+            sheets.close()
+
+        assert_that(release_resources.call_count, equal_to(1))
+
+    def test_parse_xls_keeps_the_book_until_the_first_sheet_is_read(self):
+        with patch.object(xlrd.book.Book, 'release_resources',
+                          autospec=True) as release_resources:
+            sheet = first_sheet_filter(
+                self._parse_excel("LPA_MI_EXAMPLE.xls"))
+            assert_that(release_resources.call_count, equal_to(0))
+            rows = list(sheet)
+
+        assert_that(rows[0], has_item("_timestamp"))
+        assert_that(release_resources.call_count, equal_to(1))
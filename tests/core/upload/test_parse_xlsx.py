@@ -0,0 +1,112 @@
+import unittest
+import zipfile
+from StringIO import StringIO
+
+import xlrd
+from hamcrest import assert_that, contains, equal_to
+from mock import patch
+
+from backdrop.core.upload.parse_excel import parse_excel, _extract_rows
+from backdrop.core.upload.parse_xlsx import parse_xlsx, _Workbook
+from tests.support.test_helpers import fixture_path
+
+WORKBOOK = """<?xml version="1.0" encoding="UTF-8"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+  <sheets>%s</sheets>
+</workbook>"""
+
+RELATIONSHIPS = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships
+    xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+  %s
+</Relationships>"""
+
+SHEET = """<?xml version="1.0" encoding="UTF-8"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+  <sheetData>%s</sheetData>
+</worksheet>"""
+
+
+def xlsx(*sheets):
+    stream = StringIO()
+    archive = zipfile.ZipFile(stream, 'w')
+    archive.writestr('xl/workbook.xml', WORKBOOK % "".join(
+        '<sheet name="Sheet%d" sheetId="%d" r:id="rId%d"/>' % (i, i, i)
+        for i in range(1, len(sheets) + 1)))
+    archive.writestr('xl/_rels/workbook.xml.rels', RELATIONSHIPS % "".join(
+        '<Relationship Id="rId%d" Target="worksheets/sheet%d.xml" Type="'
+        'http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships/worksheet"/>' % (i, i)
+        for i in range(1, len(sheets) + 1)))
+    for i, sheet in enumerate(sheets):
+        archive.writestr('xl/worksheets/sheet%d.xml' % (i + 1), SHEET % sheet)
+    archive.close()
+    stream.seek(0)
+    return stream
+
+
+def parsed_by_xlrd(stream):
+    book = xlrd.open_workbook(file_contents=stream.getvalue())
+    return [list(_extract_rows(sheet, book)) for sheet in book.sheets()]
+
+
+def parsed(stream):
+    if hasattr(stream, 'seek'):
+        stream.seek(0)
+    return [list(sheet) for sheet in parse_excel(stream)]
+
+
+class ParseXlsxTestCase(unittest.TestCase):
+    def test_values_match_xlrd_for_fixtures(self):
+        for name in ["data.xlsx", "dates.xlsx", "multiple_sheets.xlsx"]:
+            stream = StringIO(open(fixture_path(name)).read())
+            expected = parsed_by_xlrd(stream)
+            assert_that(parsed(stream), equal_to(expected))
+
+    def test_sparse_rows_are_padded_as_xlrd_pads_them(self):
+        stream = xlsx(
+            '<row r="2"><c r="B2" t="inlineStr"><is><t>b</t></is></c></row>'
+            '<row r="4"><c r="A4"><v>1</v></c><c r="D4" t="b"><v>1</v></c>'
+            '</row>'
+            '<row r="5"><c r="A5" s="0"/></row>')
+
+        assert_that(parsed(stream), equal_to(parsed_by_xlrd(stream)))
+        assert_that(parsed(stream), contains(contains(
+            ['', '', '', ''],
+            ['', 'b', '', ''],
+            ['', '', '', ''],
+            [1.0, '', '', 1],
+        )))
+
+    def test_rows_without_references_follow_on(self):
+        stream = xlsx(
+            '<row><c t="inlineStr"><is><t>a</t></is></c>'
+            '<c t="inlineStr"><is><t>b</t></is></c></row>'
+            '<row><c><v>2</v></c></row>')
+
+        assert_that(parsed(stream), contains(contains(
+            ['a', 'b'],
+            [2.0, ''],
+        )))
+
+    def test_only_the_sheets_asked_for_are_read(self):
+        stream = xlsx('<row><c><v>1</v></c></row>',
+                      '<row><c><v>2</v></c></row>')
+
+        with patch.object(_Workbook, '_rows',
+                          autospec=True, side_effect=_Workbook._rows) as rows:
+            first_sheet = next(parse_xlsx(stream, None))
+            assert_that(list(first_sheet), contains([1.0]))
+
+        read = set(call[0][1] for call in rows.call_args_list)
+        assert_that(read, equal_to(set(['xl/worksheets/sheet1.xml'])))
+
+    def test_unseekable_streams_are_read_into_memory(self):
+        class Unseekable(object):
+            def __init__(self, stream):
+                self.read = stream.read
+
+        stream = xlsx('<row><c><v>1</v></c></row>')
+
+        assert_that(parsed(Unseekable(stream)), contains(contains([1.0])))
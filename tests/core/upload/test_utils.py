@@ -1,7 +1,8 @@
 import unittest
-from hamcrest import only_contains, assert_that
+import itertools
+from hamcrest import only_contains, assert_that, is_, contains
 from backdrop.core.errors import ParseError
-from backdrop.core.upload.utils import make_dicts
+from backdrop.core.upload.utils import make_dicts, RowWindow
 
 
 class TestMakeRecords(unittest.TestCase):
@@ -70,3 +71,61 @@ class TestMakeRecords(unittest.TestCase):
             {"name": "val1", "size": 123},
             {"name": "val2", "size": 456},
         ))
+
+    def test_keeps_rows_that_start_with_a_number(self):
+        rows = [
+            ["size", "name"],
+            [123, ""],
+            [0, "val2"]
+        ]
+
+        records = list(make_dicts(rows))
+
+        assert_that(records, only_contains(
+            {"name": "", "size": 123},
+            {"name": "val2", "size": 0},
+        ))
+
+
+class TestRowWindow(unittest.TestCase):
+    def rows(self):
+        for index in itertools.count():
+            self.read = index
+            yield [index, index * 10]
+
+    def test_reads_only_as_far_as_the_row_asked_for(self):
+        window = RowWindow(self.rows())
+
+        assert_that(window.cell(3, 1), is_(30))
+        assert_that(self.read, is_(3))
+
+    def test_kept_rows_can_be_read_again(self):
+        window = RowWindow(self.rows(), keep=[1])
+
+        window.row(5)
+
+        assert_that(window.row(1), is_([1, 10]))
+
+    def test_rows_that_were_not_kept_cannot_be_read_again(self):
+        window = RowWindow(self.rows())
+
+        window.row(5)
+
+        self.assertRaises(ValueError, window.row, 2)
+
+    def test_rows_past_the_end_of_the_sheet_are_index_errors(self):
+        window = RowWindow([["a"]])
+
+        self.assertRaises(IndexError, window.row, 1)
+
+    def test_rows_from_yields_the_rest_of_the_sheet(self):
+        window = RowWindow([[0], [1], [2], [3]], keep=[0])
+
+        window.row(0)
+
+        assert_that(list(window.rows_from(2)), contains([2], [3]))
+
+    def test_rows_from_past_the_end_yields_nothing(self):
+        window = RowWindow([[0]])
+
+        assert_that(list(window.rows_from(3)), is_([]))
@@ -1,10 +1,16 @@
+import json
+import shutil
+import tempfile
 import unittest
+from StringIO import StringIO
 from flask import session, request
 from hamcrest import *
 from mock import patch
 from werkzeug.urls import url_decode
+from backdrop.core.errors import ValidationError
 from backdrop.write import api
 from backdrop.write.permissions import Permissions
+from backdrop.write.upload_jobs import UploadJobs
 from tests.support.test_helpers import has_status
 
 
@@ -106,8 +112,157 @@ class TestSignonIntegration(unittest.TestCase):
         response = self.client.get('/test/upload')
         assert_that(response, has_status(200))
 
+    @patch("backdrop.core.bucket.Bucket.parse_and_store_in_chunks")
+    def test_upload_over_the_bucket_size_limit_is_rejected(self, store):
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+
+        with patch.dict(self.app.config,
+                        {"BUCKET_MAX_UPLOAD_SIZE": {"test": 100}}):
+            response = self.client.post('/test/upload', data={
+                "file": (StringIO("a,b\n" * 50), "data.csv")})
+
+        assert_that(response, has_status(400))
+        assert_that(store.called, is_(False))
+
+    @patch("backdrop.core.bucket.Bucket.parse_and_store_in_chunks")
+    def test_bucket_size_limit_overrides_the_default(self, store):
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+
+        with patch.dict(self.app.config, {
+                "MAX_UPLOAD_SIZE": 100,
+                "BUCKET_MAX_UPLOAD_SIZE": {"test": 10000}}):
+            response = self.client.post('/test/upload', data={
+                "file": (StringIO("a,b\n" * 50), "data.csv")})
+
+        assert_that(response, has_status(200))
+        assert_that(store.called, is_(True))
+
+    @patch("backdrop.write.admin_ui.create_parser")
+    @patch("backdrop.core.bucket.Bucket.parse_and_store_in_chunks")
+    def test_uploads_are_spooled_to_disk(self, store, create_parser):
+        file_descriptors = []
+        create_parser.return_value = \
+            lambda stream: file_descriptors.append(stream.fileno())
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+
+        self.client.post('/test/upload', data={
+            "file": (StringIO("a,b\n1,2\n"), "data.csv")})
+
+        assert_that(file_descriptors, contains(instance_of(int)))
+
+    @patch("backdrop.core.bucket.Bucket.parse_and_store_in_chunks")
+    def test_uploads_can_be_parsed_with_limits(self, store):
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+        stored = []
+        store.side_effect = lambda data, *args, **kwargs: stored.extend(data)
+
+        with patch.dict(self.app.config, {
+                "PARSE_UPLOADS_WITH_LIMITS": True,
+                "UPLOAD_PARSE_TIME_LIMIT": 10}):
+            response = self.client.post('/test/upload', data={
+                "file": (StringIO("a,b\n1,2\n"), "data.csv")})
+
+        assert_that(response, has_status(200))
+        assert_that(stored, contains({"a": "1", "b": "2"}))
+
+    @patch("backdrop.core.bucket.Bucket.parse_and_store_in_chunks")
+    def test_dry_run_upload_checks_without_storing(self, store):
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+
+        response = self.client.post('/test/upload', data={
+            "file": (StringIO("_id,name\nf o o,x\nok,y\n"), "data.csv"),
+            "dry_run": "true"})
+
+        assert_that(response, has_status(200))
+        assert_that(response.data, contains_string(
+            "Your upload has 1 invalid records"))
+        assert_that(response.data, contains_string("Record 0:"))
+        assert_that(store.called, is_(False))
+
+    def test_background_upload_redirects_to_the_job(self):
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+        jobs = self.given_background_uploads_for("test")
+
+        response = self.client.post('/test/upload', data={
+            "file": (StringIO("a,b\n1,2\n"), "data.csv")})
+
+        [job_id] = [name.split('.')[1] for name in jobs.pending()]
+        assert_that(response, has_status(302))
+        assert_that(response.headers['Location'], ends_with(
+            '/test/upload/jobs/%s' % job_id))
+
+    def test_job_page_shows_progress_of_a_running_job(self):
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+        jobs = self.given_background_uploads_for("test")
+        job_id = jobs.submit("test", "data.csv", StringIO(""))
+
+        response = self.client.get('/test/upload/jobs/%s' % job_id)
+
+        assert_that(response, has_status(200))
+        assert_that(response.data, contains_string("Your upload is queued"))
+
+    def test_job_page_shows_the_error_of_a_failed_job(self):
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+        jobs = self.given_background_uploads_for("test")
+        job_id = jobs.submit("test", "data.csv", StringIO("a,b\n"))
+
+        def process(bucket_name, stream, progress, already_stored):
+            raise ValidationError("bad row")
+        jobs.run_next(process)
+
+        response = self.client.get('/test/upload/jobs/%s' % job_id)
+
+        assert_that(response.data, contains_string(
+            "There was an error with your upload"))
+        assert_that(response.data, contains_string("bad row"))
+
+    def test_job_status_as_json(self):
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+        jobs = self.given_background_uploads_for("test")
+        job_id = jobs.submit("test", "data.csv", StringIO(""))
+
+        response = self.client.get(
+            '/test/upload/jobs/%s' % job_id,
+            headers=[('Accept', 'application/json')])
+
+        assert_that(json.loads(response.data)["job"], has_entries({
+            "job_id": job_id,
+            "state": "queued",
+        }))
+
+    def test_job_of_another_bucket_is_not_found(self):
+        self.given_bucket_permissions("bob@example.com", ["test"])
+        self.given_user_is_signed_in_as(email="bob@example.com")
+        jobs = self.given_background_uploads_for("test")
+        job_id = jobs.submit("other", "data.csv", StringIO(""))
+
+        response = self.client.get('/test/upload/jobs/%s' % job_id)
+
+        assert_that(response, has_status(404))
+
     # utility methods
 
+    def given_background_uploads_for(self, bucket):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        jobs = UploadJobs(path)
+        for patcher in [
+                patch.object(self.app, "upload_jobs", jobs),
+                patch.dict(self.app.config,
+                           {"BACKGROUND_UPLOAD_BUCKETS": [bucket]})]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return jobs
+
     def given_user_is_signed_in_as(self, name="testuser", email="testuser@example.com"):
         with self.client.session_transaction() as session:
             session["user"] = {
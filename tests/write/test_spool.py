@@ -0,0 +1,101 @@
+import errno
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from hamcrest import *
+from mock import patch
+
+from backdrop.write.spool import Spool, parse_name
+
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.spool = Spool(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def given_pending_item(self, bucket_name="foo"):
+        item_id, name = self.spool._new_item(bucket_name)
+        open(os.path.join(self.path, "pending", name), "w").close()
+        return name
+
+    def given_item_claimed_by(self, pid, name):
+        claimed_dir = os.path.join(self.path, "claimed", str(pid))
+        if not os.path.exists(claimed_dir):
+            os.makedirs(claimed_dir)
+        os.rename(os.path.join(self.path, "pending", name),
+                  os.path.join(claimed_dir, name))
+        return claimed_dir
+
+    def test_new_items_are_named_after_their_bucket(self):
+        item_id, name = self.spool._new_item("foo")
+
+        assert_that(parse_name(name)[1:], is_((item_id, "foo")))
+
+    def test_claimed_items_are_no_longer_pending(self):
+        name = self.given_pending_item()
+
+        assert_that(self.spool._claim([name]), is_([name]))
+        assert_that(self.spool._claim([name]), is_([]))
+        assert_that(self.spool.pending(), is_([]))
+
+    def test_released_items_are_pending_again(self):
+        stored, released = self.given_pending_item(), \
+            self.given_pending_item()
+        self.spool._claim([stored, released])
+        os.remove(self.spool._claimed_path(stored))
+
+        self.spool._release([stored, released])
+
+        assert_that(self.spool.pending(), is_([released]))
+
+    @patch("backdrop.write.spool.is_running")
+    def test_recover_requeues_items_of_dead_processes(self, is_running):
+        is_running.return_value = False
+        name = self.given_pending_item()
+        dead_dir = self.given_item_claimed_by(999999, name)
+
+        assert_that(self.spool.recover(), is_([name]))
+
+        assert_that(self.spool.pending(), is_([name]))
+        assert_that(os.path.exists(dead_dir), is_(False))
+
+    @patch("backdrop.write.spool.is_running")
+    def test_recover_skips_items_another_process_recovered(self,
+                                                           is_running):
+        is_running.return_value = False
+        name = self.given_pending_item()
+        dead_dir = self.given_item_claimed_by(999999, name)
+        rename = os.rename
+
+        def recovered_first(source, destination):
+            # the other process moves the item and removes the directory
+            rename(source, destination)
+            os.rmdir(dead_dir)
+            raise OSError(errno.ENOENT, "No such file or directory")
+
+        with patch("os.rename", side_effect=recovered_first):
+            assert_that(self.spool.recover(), is_([]))
+
+        assert_that(self.spool.pending(), is_([name]))
+        assert_that(os.path.exists(dead_dir), is_(False))
+
+    def test_statuses_expire(self):
+        item_id, _ = self.spool._new_item("foo")
+        self.spool._set_status(item_id, {"state": "queued"})
+        status_path = os.path.join(self.path, "status", item_id)
+        os.utime(status_path, (time.time() - 100, time.time() - 100))
+
+        self.spool.expire_statuses(ttl=200)
+        assert_that(self.spool.status(item_id), is_({"state": "queued"}))
+
+        self.spool.expire_statuses(ttl=50)
+        assert_that(self.spool.status(item_id), is_(None))
+
+    def test_status_rejects_ids_that_are_not_ids(self):
+        assert_that(self.spool.status("../pending"), is_(None))
@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from hamcrest import *
+from mock import Mock, patch
+
+from backdrop.core.errors import ParseError
+from backdrop.write.upload_jobs import UploadJobs, UploadWorker
+
+
+class TestUploadJobs(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.jobs = UploadJobs(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_submit_returns_a_queued_job(self):
+        job_id = self.jobs.submit("foo", "data.csv", StringIO("a,b\n1,2\n"))
+
+        assert_that(self.jobs.status(job_id), has_entries({
+            "bucket": "foo",
+            "filename": "data.csv",
+            "state": "queued",
+            "rows_parsed": 0,
+            "rows_stored": 0,
+        }))
+        assert_that(self.jobs.pending(), has_length(1))
+
+    def test_status_of_unknown_job_is_none(self):
+        assert_that(self.jobs.status("0" * 32), is_(None))
+
+    def test_status_rejects_job_ids_that_are_not_ids(self):
+        assert_that(self.jobs.status("../pending"), is_(None))
+
+    def test_run_next_without_jobs_does_nothing(self):
+        process = Mock()
+
+        assert_that(self.jobs.run_next(process), is_(False))
+        assert_that(process.called, is_(False))
+
+    def test_run_next_processes_the_uploaded_file(self):
+        contents = []
+
+        def process(bucket_name, stream, progress, already_stored):
+            contents.append((bucket_name, stream.read()))
+            progress(1, 1)
+
+        job_id = self.jobs.submit("foo", "data.csv", StringIO("a,b\n1,2\n"))
+
+        assert_that(self.jobs.run_next(process), is_(True))
+
+        assert_that(contents, is_([("foo", "a,b\n1,2\n")]))
+        assert_that(self.jobs.status(job_id), has_entries({
+            "state": "stored",
+            "rows_parsed": 1,
+            "rows_stored": 1,
+            "elapsed": greater_than_or_equal_to(0),
+        }))
+        assert_that(self.jobs.pending(), is_([]))
+        assert_that(os.listdir(os.path.join(self.path, "claimed",
+                                            str(os.getpid()))), is_([]))
+
+    def test_write_counts_are_kept_with_the_job(self):
+        def process(bucket_name, stream, progress, already_stored):
+            return {"inserted": 1, "updated": 0, "unchanged": 2}
+
+        job_id = self.jobs.submit("foo", "data.csv", StringIO(""))
+        self.jobs.run_next(process)
+
+        assert_that(self.jobs.status(job_id), has_entry("counts", {
+            "inserted": 1, "updated": 0, "unchanged": 2}))
+
+    def test_progress_is_visible_while_a_job_runs(self):
+        statuses = []
+
+        def process(bucket_name, stream, progress, already_stored):
+            progress(10, 0)
+            statuses.append(self.jobs.status(job_id))
+
+        job_id = self.jobs.submit("foo", "data.csv", StringIO(""))
+        self.jobs.run_next(process)
+
+        assert_that(statuses, contains(has_entries({
+            "state": "running",
+            "rows_parsed": 10,
+            "rows_stored": 0,
+        })))
+
+    def test_invalid_uploads_fail_with_the_error(self):
+        def process(bucket_name, stream, progress, already_stored):
+            raise ParseError("bad file")
+
+        job_id = self.jobs.submit("foo", "data.csv", StringIO(""))
+        self.jobs.run_next(process)
+
+        assert_that(self.jobs.status(job_id), has_entries({
+            "state": "failed",
+            "message": "bad file",
+        }))
+
+    def test_unexpected_errors_fail_without_the_details(self):
+        def process(bucket_name, stream, progress, already_stored):
+            raise ValueError("something internal")
+
+        job_id = self.jobs.submit("foo", "data.csv", StringIO(""))
+        self.jobs.run_next(process)
+
+        assert_that(self.jobs.status(job_id), has_entries({
+            "state": "failed",
+            "message": "the upload could not be stored",
+        }))
+
+    @patch("backdrop.write.spool.is_running")
+    def test_recover_requeues_jobs_of_dead_workers(self, is_running):
+        is_running.return_value = False
+        job_id = self.jobs.submit("foo", "data.csv", StringIO(""))
+        dead_dir = os.path.join(self.path, "claimed", "999999")
+        os.makedirs(dead_dir)
+        for name in self.jobs.pending():
+            os.rename(os.path.join(self.path, "pending", name),
+                      os.path.join(dead_dir, name))
+
+        self.jobs.recover()
+
+        assert_that(self.jobs.pending(), has_length(1))
+        assert_that(self.jobs.status(job_id), has_entry("state", "queued"))
+        assert_that(os.path.exists(dead_dir), is_(False))
+
+    @patch("backdrop.write.spool.is_running")
+    def test_recovered_jobs_resume_after_the_rows_they_stored(self,
+                                                              is_running):
+        is_running.return_value = False
+        resumed_from = []
+
+        def interrupted(bucket_name, stream, progress, already_stored):
+            progress(10, 4)
+            raise SystemExit
+
+        def process(bucket_name, stream, progress, already_stored):
+            resumed_from.append(already_stored)
+
+        job_id = self.jobs.submit("foo", "data.csv", StringIO(""))
+        with patch("os.getpid", return_value=999999):
+            self.assertRaises(SystemExit, self.jobs.run_next, interrupted)
+        self.jobs.recover()
+        self.jobs.run_next(process)
+
+        assert_that(resumed_from, is_([4]))
+        assert_that(self.jobs.status(job_id), has_entry("state", "stored"))
+
+
+class TestUploadWorker(unittest.TestCase):
+    def test_worker_keeps_running_when_recovery_fails(self):
+        jobs = Mock()
+        jobs.recover.side_effect = [OSError("busy"), []]
+        jobs.run_next.side_effect = [False, SystemExit]
+        worker = UploadWorker(jobs, Mock(), interval=0)
+
+        self.assertRaises(SystemExit, worker.run)
+
+        assert_that(jobs.recover.call_count, is_(2))
@@ -0,0 +1,268 @@
+import errno
+import fcntl
+import os
+import shutil
+import tempfile
+import unittest
+
+from hamcrest import *
+from bson import ObjectId
+from mock import Mock, patch
+from pymongo.errors import AutoReconnect
+
+from backdrop.write.write_queue import WriteQueue, Drainer
+from tests.support.test_helpers import d_tz
+
+
+class TestWriteQueue(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.queue = WriteQueue(self.path)
+        self.repository = Mock()
+        self.db = Mock()
+        self.db.get_repository.return_value = self.repository
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_put_returns_a_queued_batch(self):
+        batch_id = self.queue.put("foo", [{"name": "Groucho"}])
+
+        assert_that(self.queue.status(batch_id), has_entries({
+            "bucket": "foo",
+            "state": "queued",
+            "records": 1
+        }))
+        assert_that(self.queue.pending(), has_length(1))
+
+    def test_put_queues_nothing_if_producing_documents_fails(self):
+        def documents():
+            yield {"name": "Groucho"}
+            raise ValueError("bad record")
+
+        self.assertRaises(ValueError, self.queue.put, "foo", documents())
+
+        assert_that(self.queue.pending(), is_([]))
+        assert_that(os.listdir(os.path.join(self.path, "tmp")), is_([]))
+
+    def test_status_of_unknown_batch_is_none(self):
+        assert_that(self.queue.status("0" * 32), is_(None))
+
+    def test_status_rejects_batch_ids_that_are_not_ids(self):
+        assert_that(self.queue.status("../pending"), is_(None))
+
+    def test_drain_stores_documents(self):
+        batch_id = self.queue.put("foo", [
+            {"name": "Groucho", "_timestamp": d_tz(2013, 4, 1)}])
+
+        assert_that(self.queue.drain(self.db), is_(1))
+
+        self.db.get_repository.assert_called_once_with("foo")
+        [documents], _ = self.repository.save_all.call_args
+        assert_that(documents, contains(has_entries({
+            "name": "Groucho", "_timestamp": d_tz(2013, 4, 1)})))
+        assert_that(self.queue.status(batch_id),
+                    has_entry("state", "stored"))
+        assert_that(self.queue.pending(), is_([]))
+
+    def test_drain_groups_batches_by_bucket_in_queue_order(self):
+        self.queue.put("foo", [{"_id": "a", "value": 1}])
+        self.queue.put("bar", [{"_id": "a", "value": 2}])
+        self.queue.put("foo", [{"_id": "a", "value": 3}])
+
+        self.queue.drain(self.db)
+
+        assert_that(self.repository.save_all.call_args_list, has_length(2))
+        first_call = self.repository.save_all.call_args_list[0]
+        assert_that(first_call[0][0], is_([
+            {"_id": "a", "value": 1},
+            {"_id": "a", "value": 3}
+        ]))
+
+    def test_drain_requeues_batches_when_database_is_unavailable(self):
+        batch_id = self.queue.put("foo", [{"name": "Groucho"}])
+        self.repository.save_all.side_effect = AutoReconnect
+
+        assert_that(self.queue.drain(self.db), is_(0))
+
+        assert_that(self.queue.pending(), has_length(1))
+        assert_that(self.queue.status(batch_id),
+                    has_entry("state", "queued"))
+
+    def test_put_gives_documents_without_an_id_one(self):
+        self.queue.put("foo", [{"_id": "a"}, {"name": "Groucho"}])
+
+        self.queue.drain(self.db)
+
+        [documents], _ = self.repository.save_all.call_args
+        assert_that(documents[0]["_id"], is_("a"))
+        assert_that(documents[1]["_id"], instance_of(ObjectId))
+
+    def test_requeued_batches_are_stored_with_the_same_ids(self):
+        self.queue.put("foo", [{"name": "Groucho"}, {"name": "Harpo"}])
+        self.repository.save_all.side_effect = [AutoReconnect(), None]
+
+        self.queue.drain(self.db)
+        self.queue.drain(self.db)
+
+        first, second = [call[0][0] for call
+                         in self.repository.save_all.call_args_list]
+        assert_that([document["_id"] for document in second],
+                    is_([document["_id"] for document in first]))
+
+    def test_drain_requeues_every_bucket_claimed_in_the_pass(self):
+        foo_batch = self.queue.put("foo", [{"name": "Groucho"}])
+        bar_batch = self.queue.put("bar", [{"name": "Harpo"}])
+        self.repository.save_all.side_effect = AutoReconnect
+
+        assert_that(self.queue.drain(self.db), is_(0))
+
+        assert_that(self.queue.pending(), has_length(2))
+        assert_that(os.listdir(os.path.join(self.path, "claimed",
+                                            str(os.getpid()))), is_([]))
+        for batch_id in [foo_batch, bar_batch]:
+            assert_that(self.queue.status(batch_id),
+                        has_entry("state", "queued"))
+
+    def test_drain_requeues_later_buckets_after_a_stored_bucket(self):
+        self.queue.put("foo", [{"name": "Groucho"}])
+        self.queue.put("bar", [{"name": "Harpo"}])
+        self.repository.save_all.side_effect = [None, AutoReconnect()]
+
+        self.queue.drain(self.db)
+
+        assert_that([name.split(".")[2] for name in self.queue.pending()],
+                    is_(["bar"]))
+
+    def test_drain_leaves_buckets_locked_by_another_process(self):
+        self.queue.put("foo", [{"name": "Groucho"}])
+        self.queue.put("bar", [{"name": "Harpo"}])
+        with open(os.path.join(self.path, "locks", "foo"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+            assert_that(self.queue.drain(self.db), is_(1))
+
+        self.db.get_repository.assert_called_once_with("bar")
+        assert_that([name.split(".")[2] for name in self.queue.pending()],
+                    is_(["foo"]))
+
+    def test_drain_unlocks_buckets_once_stored(self):
+        self.queue.put("foo", [{"name": "Groucho"}])
+        self.repository.save_all.side_effect = [AutoReconnect(), None]
+
+        self.queue.drain(self.db)
+
+        assert_that(self.queue.drain(self.db), is_(1))
+        assert_that(self.queue.pending(), is_([]))
+
+    def test_drain_marks_batch_failed_on_other_errors(self):
+        batch_id = self.queue.put("foo", [{"name": "Groucho"}])
+        self.repository.save_all.side_effect = ValueError("broken")
+
+        self.queue.drain(self.db)
+
+        assert_that(self.queue.status(batch_id), has_entries({
+            "state": "failed",
+            "message": "broken"
+        }))
+        assert_that(self.queue.pending(), is_([]))
+
+    @patch("backdrop.write.write_queue.statsd")
+    def test_drain_reports_queue_depth_and_lag(self, statsd):
+        self.queue.put("foo", [{"name": "Groucho"}])
+
+        self.queue.drain(self.db)
+
+        statsd.gauge.assert_called_with("write_queue.depth", 0, bucket="foo")
+        assert_that(statsd.timing.call_args[0][0], is_("write_queue.lag"))
+
+    @patch("backdrop.write.write_queue.statsd")
+    def test_drain_reports_age_of_oldest_batch_and_records_replayed(
+            self, statsd):
+        self.queue.put("foo", [{"name": "Groucho"}, {"name": "Harpo"}])
+        self.queue.put("bar", [{"name": "Chico"}])
+
+        self.queue.drain(self.db, max_batches=1)
+
+        statsd.incr.assert_any_call("write_queue.replayed", 2, bucket="foo")
+        statsd.gauge.assert_any_call("write_queue.oldest_age", 0,
+                                     bucket="foo")
+        bar_oldest_age = [c[0][1] for c in statsd.gauge.call_args_list
+                          if c[0][0] == "write_queue.oldest_age"
+                          and c[1]["bucket"] == "bar"]
+        assert_that(bar_oldest_age, contains(greater_than(0)))
+
+    def test_has_pending_only_for_buckets_with_queued_batches(self):
+        self.queue.put("foo", [{"name": "Groucho"}])
+
+        assert_that(self.queue.has_pending("foo"), is_(True))
+        assert_that(self.queue.has_pending("bar"), is_(False))
+
+    def test_has_pending_while_a_batch_is_being_stored(self):
+        self.queue.put("foo", [{"name": "Groucho"}])
+        has_pending = []
+        self.repository.save_all.side_effect = \
+            lambda documents: has_pending.append(self.queue.has_pending("foo"))
+
+        self.queue.drain(self.db)
+
+        assert_that(has_pending, is_([True]))
+        assert_that(self.queue.has_pending("foo"), is_(False))
+
+    def test_has_pending_only_lists_pending_batches(self):
+        self.queue.put("foo", [{"name": "Groucho"}])
+        self.queue._claim(self.queue.pending())
+
+        with patch("os.listdir", side_effect=self.listdir_pending_only):
+            assert_that(self.queue.has_pending("foo"), is_(False))
+
+    def listdir_pending_only(self, path, listdir=os.listdir):
+        if path != os.path.join(self.path, "pending"):
+            raise OSError(errno.ENOENT, "removed by recover")
+        return listdir(path)
+
+    def test_stats_of_an_empty_queue(self):
+        assert_that(self.queue.stats(), is_({
+            "batches": 0,
+            "bytes": 0,
+            "oldest_age": 0,
+            "replay_rate": 0.0
+        }))
+
+    def test_stats_report_queued_and_stored_batches(self):
+        self.queue.put("foo", [{"name": "Groucho"}] * 30)
+        self.queue.drain(self.db)
+        self.queue.put("foo", [{"name": "Harpo"}])
+
+        stats = self.queue.stats()
+
+        assert_that(stats["batches"], is_(1))
+        assert_that(stats["bytes"], greater_than(0))
+        assert_that(stats["oldest_age"], greater_than_or_equal_to(0))
+        assert_that(stats["replay_rate"], is_(0.5))
+
+    def test_recover_requeues_batches_of_dead_drainers(self):
+        self.queue.put("foo", [{"name": "Groucho"}])
+        name = self.queue.pending()[0]
+        dead_dir = os.path.join(self.path, "claimed", "999999999")
+        os.makedirs(dead_dir)
+        os.rename(os.path.join(self.path, "pending", name),
+                  os.path.join(dead_dir, name))
+
+        self.queue.recover()
+
+        assert_that(self.queue.pending(), is_([name]))
+        assert_that(os.path.exists(dead_dir), is_(False))
+
+
+class TestDrainer(unittest.TestCase):
+    def test_drainer_keeps_running_when_recovery_fails(self):
+        queue = Mock()
+        queue.recover.side_effect = [OSError("busy"), None]
+        queue.pending.return_value = []
+        queue.drain.side_effect = [0, SystemExit]
+        drainer = Drainer(queue, Mock(), interval=0)
+
+        self.assertRaises(SystemExit, drainer.run)
+
+        assert_that(queue.recover.call_count, is_(2))